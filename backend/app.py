@@ -5,20 +5,44 @@ from backend.routes.groups import groups
 from backend.routes.expenses import expenses
 from backend.routes.notifications import notifications
 from backend.routes.debts import debts
-import logging
-logging.basicConfig(level=logging.DEBUG)
+from backend.routes.stats import stats
+from backend.routes.metrics import metrics
+from backend.routes.jobs import jobs
+from backend.database_config import init_app as init_db
+from backend.utils.pagination import NEXT_CURSOR_HEADER
+from backend.utils.outbox import init_app as init_outbox
+from backend.utils.jobs import init_app as init_jobs
+from backend.utils.instrumentation import init_app as init_instrumentation
+from backend.utils.compression import init_app as init_compression
+from backend.utils.json_provider import init_app as init_json
+from backend.utils.structured_logging import REQUEST_ID_HEADER, configure_logging
+from backend.utils.structured_logging import init_app as init_logging
+
+configure_logging()
 
 app = Flask(__name__)
 
 # Allow CORS for specific methods and headers
 CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}},
-     supports_credentials=True)
+     supports_credentials=True, expose_headers=[NEXT_CURSOR_HEADER, REQUEST_ID_HEADER])
+
+init_json(app)
+init_logging(app)
+init_instrumentation(app)
+# Registered after instrumentation so it runs first and is timed with the request
+init_compression(app)
+init_db(app)
+init_outbox(app)
+init_jobs(app)
 
 app.register_blueprint(users)
 app.register_blueprint(groups)
 app.register_blueprint(expenses)
 app.register_blueprint(notifications)
 app.register_blueprint(debts)
+app.register_blueprint(stats)
+app.register_blueprint(metrics)
+app.register_blueprint(jobs)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5005)
@@ -0,0 +1,106 @@
+"""
+JSON encoder benchmark.
+
+Serializes synthetic debt rows (Decimal amounts, datetime columns, as the
+dictionary cursor returns them) with Flask's default provider, after the
+per-row float conversion routes used to do, and with RowJSONProvider on
+each available backend and Decimal mode.
+
+    python -m backend.benchmarks.bench_json --rows 100000 --repeat 5
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from backend.utils.json_provider import RowJSONProvider, orjson
+
+
+def synthetic_rows(count, seed):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    return [{
+        'DebtID': debt_id,
+        'FromUserID': rng.randint(1, 500),
+        'ToUserID': rng.randint(1, 500),
+        'Amount': Decimal(rng.randint(1, 50000)) / 100,
+        'Status': rng.choice(('pending', 'paid')),
+        'GroupID': rng.randint(1, 50),
+        'CreatedDate': start + timedelta(seconds=rng.randint(0, 10 ** 7)),
+        'FromUserName': f'User {debt_id % 500}',
+        'ToUserName': f'User {(debt_id * 7) % 500}',
+    } for debt_id in range(1, count + 1)]
+
+
+def default_encoder(app):
+    provider = DefaultJSONProvider(app)
+
+    def encode(rows):
+        # What groups.py did before the provider serialized Decimal itself
+        for row in rows:
+            row['Amount'] = float(row['Amount'])
+        return provider.dumps(rows).encode('utf-8')
+    return encode
+
+
+def row_encoder(app, **kwargs):
+    provider = RowJSONProvider(app, **kwargs)
+    return lambda rows: provider.dumps_bytes(rows)
+
+
+def streamed_encoder(app, **kwargs):
+    provider = RowJSONProvider(app, **kwargs)
+    return lambda rows: b''.join(provider.iter_array(rows))
+
+
+def encoders(app):
+    yield 'flask default + float loop', default_encoder(app)
+    backends = [False, True] if orjson is not None else [False]
+    for use_orjson in backends:
+        name = 'orjson' if use_orjson else 'stdlib'
+        yield f'{name} string', row_encoder(app, decimal_mode='string', use_orjson=use_orjson)
+        yield f'{name} cents', row_encoder(app, decimal_mode='cents', use_orjson=use_orjson)
+        yield f'{name} string streamed', streamed_encoder(app, decimal_mode='string', use_orjson=use_orjson)
+
+
+def run(rows, repeat, seed):
+    app = Flask(__name__)
+    results = []
+    for name, encode in encoders(app):
+        timings = []
+        for _ in range(repeat):
+            # Fresh rows each time: the float loop mutates them in place
+            payload = synthetic_rows(rows, seed)
+            started = time.perf_counter()
+            body = encode(payload)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results.append({
+            'encoder': name,
+            'rows': rows,
+            'bytes': len(body),
+            'bestMs': round(timings[0], 3),
+            'medianMs': round(timings[len(timings) // 2], 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    results = run(args.rows, args.repeat, args.seed)
+    baseline = results[0]['medianMs']
+    for result in results:
+        print(f"{result['encoder']:<28} {result['rows']} rows, {result['bytes']:>9} bytes: "
+              f"median {result['medianMs']} ms (best {result['bestMs']} ms), "
+              f"{baseline / result['medianMs']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,495 @@
+"""
+Endpoint benchmark.
+
+Drives the blueprint routes against a database filled by
+backend.benchmarks.seed, either in process through the Flask test client
+or over HTTP through a real WSGI server (werkzeug's threaded server, or any
+server already running the app via --url, e.g. gunicorn). Reports p50/p95/
+p99 latency, throughput and queries per request for each route, and writes
+JSON that `compare` can diff between commits.
+
+    python -m backend.benchmarks.seed --database saldo_bench --reset
+    python -m backend.benchmarks.bench_routes run --database saldo_bench \
+        --mode both --requests 200 --output head.json
+    python -m backend.benchmarks.bench_routes compare base.json head.json
+
+Queries per request is the change in the server's global Questions counter
+over a route's requests, so run against an otherwise idle MySQL server.
+Routes that write consume seeded rows (debts to pay or delete, groups to
+delete), so reseed between runs that should be compared. The SSE stream is
+left out: it never completes.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+BENCH_NEW_PASSWORD = 'Bench.pass2'
+PAGE = 'limit=100'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(route, mode, latencies, errors, wall_seconds, queries):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'route': route,
+        'mode': mode,
+        'requests': count,
+        'errors': errors,
+        'p50Ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95Ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'meanMs': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        'throughput': round(count / wall_seconds, 1) if wall_seconds else 0.0,
+        'queriesPerRequest': round(queries / count, 2) if count and queries is not None else None,
+    }
+
+
+class BenchContext:
+    """Picks IDs out of the seeded database for the request builders."""
+
+    def __init__(self, connection, per_route, rng):
+        self.db = connection
+        self.rng = rng
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT MAX(UserID) FROM users")
+            self.max_user_id = cursor.fetchone()[0] or 0
+            cursor.execute("SELECT MAX(GroupID) FROM groupsaldo")
+            max_group_id = cursor.fetchone()[0] or 0
+
+            # The highest group IDs are kept for DELETE /groups/<id>
+            self.deletable_groups = list(range(max_group_id, max(max_group_id - per_route, 0), -1))
+            self.last_group_id = max_group_id - len(self.deletable_groups)
+
+            cursor.execute("""
+                SELECT GroupID, UserID FROM groupmembers
+                WHERE GroupID <= %s
+            """, (self.last_group_id,))
+            self.members = {}
+            for group_id, user_id in cursor.fetchall():
+                self.members.setdefault(group_id, []).append(user_id)
+            self.group_ids = sorted(group_id for group_id, ids in self.members.items() if len(ids) >= 2)
+
+            cursor.execute("""
+                SELECT DebtID, GroupID FROM debts
+                WHERE Status <> 'paid' AND GroupID <= %s
+                ORDER BY DebtID DESC
+                LIMIT %s
+            """, (self.last_group_id, per_route * 4))
+            self.open_debts = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT NotificationID FROM notifications
+                WHERE IsRead = 0
+                ORDER BY NotificationID DESC
+                LIMIT %s
+            """, (per_route,))
+            self.unread = [row[0] for row in cursor.fetchall()]
+
+            cursor.execute("SELECT MAX(ExpenseID) FROM expenses")
+            self.max_expense_id = cursor.fetchone()[0] or 1
+        finally:
+            cursor.close()
+
+    def user(self):
+        return self.rng.randint(1, self.max_user_id)
+
+    def group(self):
+        return self.rng.choice(self.group_ids)
+
+    def pair(self, group_id):
+        return self.rng.sample(self.members[group_id], 2)
+
+    def take_debt(self):
+        return self.open_debts.pop()
+
+    def take_group(self):
+        return self.deletable_groups.pop()
+
+    def take_unread(self):
+        return self.unread.pop()
+
+    def new_user(self):
+        """Inserts a user with no groups or debts, so it can be deleted."""
+        from backend.benchmarks.seed import BENCH_PASSWORD
+        cursor = self.db.cursor()
+        try:
+            cursor.execute("SELECT Password FROM users WHERE UserID = 1")
+            password = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO users (Name, Email, Password, Currency)
+                VALUES ('Bench Disposable', %s, %s, 'USD')
+            """, (f'disposable-{uuid.uuid4().hex}@example.com', password))
+            self.db.commit()
+            return cursor.lastrowid, BENCH_PASSWORD
+        finally:
+            cursor.close()
+
+
+def _token(user_id):
+    from backend.utils.auth import generate_token
+    return generate_token(user_id)
+
+
+def _login(ctx):
+    from backend.benchmarks.seed import BENCH_PASSWORD, bench_email
+    return 'POST', '/users/login', {'json': {'email': bench_email(ctx.user()), 'password': BENCH_PASSWORD}}
+
+
+def _register(ctx):
+    email = f'reg-{uuid.uuid4().hex}@example.com'
+    return 'POST', '/users/register', {'json': {
+        'name': 'Bench Register', 'email': email, 'password': 'Bench.pass1', 'phone': '5550000000'}}
+
+
+def _add_user(ctx):
+    email = f'add-{uuid.uuid4().hex}@example.com'
+    return 'POST', '/users', {'json': {'name': 'Bench Add', 'email': email, 'password': 'Bench.pass1'}}
+
+
+def _update_password(ctx):
+    user_id, password = ctx.new_user()
+    return 'PUT', f'/users/{user_id}/password', {'json': {
+        'currentPassword': password, 'newPassword': BENCH_NEW_PASSWORD}}
+
+
+def _change_password(ctx):
+    user_id, password = ctx.new_user()
+    return 'PUT', '/users/profile/password', {
+        'headers': {'User-ID': str(user_id)},
+        'json': {'currentPassword': password, 'newPassword': BENCH_NEW_PASSWORD}}
+
+
+def _create_group(ctx):
+    members = ctx.rng.sample(range(1, ctx.max_user_id + 1), 4)
+    return 'POST', '/groups', {
+        'headers': {'User-ID': str(members[0])},
+        'json': {'GroupName': 'Bench new group', 'Members': members[1:]}}
+
+
+def _group_debt(ctx):
+    group_id = ctx.group()
+    from_user_id, to_user_id = ctx.pair(group_id)
+    return 'POST', f'/groups/{group_id}/debts', {'json': {
+        'fromUserId': from_user_id, 'toUserId': to_user_id,
+        'amount': ctx.rng.randint(100, 10000) / 100, 'description': 'Bench'}}
+
+
+def _split(ctx):
+    group_id = ctx.group()
+    members = ctx.members[group_id]
+    return 'POST', f'/groups/{group_id}/expenses/split', {'json': {
+        'paidByUserId': members[0], 'amount': ctx.rng.randint(1000, 50000) / 100,
+        'description': 'Bench split', 'split': {'mode': 'equal', 'userIds': members}}}
+
+
+def _delete_group_debt(ctx):
+    debt_id, group_id = ctx.take_debt()
+    return 'DELETE', f'/groups/{group_id}/debts/{debt_id}', {}
+
+
+def _mark_paid(ctx):
+    debt_id, group_id = ctx.take_debt()
+    return 'PUT', f'/groups/{group_id}/debts/{debt_id}/mark-paid', {}
+
+
+def _get(path_builder, headers=None):
+    def build(ctx):
+        return 'GET', path_builder(ctx), {'headers': headers(ctx)} if headers else {}
+    return build
+
+
+def _as_user(ctx):
+    return {'User-ID': str(ctx.user())}
+
+
+# (route, request builder); builders run before timing starts
+SCENARIOS = [
+    ('GET /users', _get(lambda ctx: f'/users?{PAGE}')),
+    ('GET /users/<id>', lambda ctx: ('GET', f'/users/{ctx.user()}', {
+        'headers': {'Authorization': f'Bearer {_token(ctx.user())}'}})),
+    ('GET /users/search', _get(lambda ctx: f"/users/search?term={ctx.rng.choice(['ah', 'meh', 'ze', 'yil', 'bench1'])}",
+                               _as_user)),
+    ('GET /users/profile', _get(lambda ctx: '/users/profile', _as_user)),
+    ('POST /users/login', _login),
+    ('POST /users/logout', lambda ctx: ('POST', '/users/logout', {
+        'headers': {'Authorization': f'Bearer {_token(ctx.user())}'}})),
+    ('POST /users/register', _register),
+    ('POST /users', _add_user),
+    ('PUT /users/<id>/password', _update_password),
+    ('PUT /users/profile/password', _change_password),
+    ('DELETE /users/<id>', lambda ctx: ('DELETE', f'/users/{ctx.new_user()[0]}', {})),
+    ('GET /groups', _get(lambda ctx: '/groups', _as_user)),
+    ('POST /groups', _create_group),
+    ('GET /groups/<id>', _get(lambda ctx: f'/groups/{ctx.group()}')),
+    ('GET /groups/<id>/members', _get(lambda ctx: f'/groups/{ctx.group()}/members')),
+    ('GET /groups/<id>/debts', _get(lambda ctx: f'/groups/{ctx.group()}/debts?{PAGE}')),
+    ('GET /groups/<id>/overview', _get(lambda ctx: f'/groups/{ctx.group()}/overview?{PAGE}')),
+    ('GET /groups/<id>/settlement', _get(lambda ctx: f'/groups/{ctx.group()}/settlement')),
+    ('GET /groups/<id>/export', _get(lambda ctx: f'/groups/{ctx.group()}/export?format=ndjson')),
+    ('POST /groups/<id>/debts', _group_debt),
+    ('POST /groups/<id>/expenses/split', _split),
+    ('PUT /groups/<id>/debts/<id>/mark-paid', _mark_paid),
+    ('DELETE /groups/<id>/debts/<id>', _delete_group_debt),
+    ('DELETE /groups/<id>', lambda ctx: ('DELETE', f'/groups/{ctx.take_group()}', {})),
+    ('GET /debts', _get(lambda ctx: f'/debts?{PAGE}')),
+    ('GET /debts/<id>', _get(lambda ctx: f'/debts/{ctx.open_debts[-1][0]}')),
+    ('PUT /debts/<id>', lambda ctx: ('PUT', f'/debts/{ctx.take_debt()[0]}', {'json': {'status': 'paid'}})),
+    ('DELETE /debts/<id>', lambda ctx: ('DELETE', f'/debts/{ctx.take_debt()[0]}', {})),
+    ('GET /', _get(lambda ctx: f'/?{PAGE}')),
+    ('GET /expenses/<id>', _get(lambda ctx: f'/expenses/{ctx.rng.randint(1, ctx.max_expense_id)}')),
+    ('POST /expenses', lambda ctx: ('POST', '/expenses', {'json': {
+        'group_id': ctx.group(), 'user_id': ctx.user(), 'amount': 12.5, 'description': 'Bench'}})),
+    ('GET /notifications', _get(lambda ctx: f'/notifications?userId={ctx.user()}&{PAGE}')),
+    ('GET /notifications/unread-count', _get(lambda ctx: f'/notifications/unread-count?userId={ctx.user()}')),
+    ('POST /notifications/mark-read', lambda ctx: ('POST', '/notifications/mark-read', {
+        'json': {'notificationId': ctx.take_unread()}})),
+    ('GET /stats', _get(lambda ctx: '/stats', _as_user)),
+]
+
+
+class FlaskDriver:
+    mode = 'flask'
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None, json=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, json=json)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class WsgiDriver:
+    mode = 'wsgi'
+
+    def __init__(self, app=None, url=None):
+        import requests
+        self._requests = requests
+        self._local = threading.local()
+        self._server = None
+        if url is None:
+            from werkzeug.serving import make_server
+            self._server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=self._server.serve_forever, name='bench-wsgi', daemon=True).start()
+            url = f'http://127.0.0.1:{self._server.server_port}'
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, headers=None, json=None):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(method, self.url + path, headers=headers, json=json)
+        response.content
+        return response.status_code
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def questions(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        return int(cursor.fetchone()[1])
+    finally:
+        cursor.close()
+
+
+def run_scenario(driver, ctx, route, build, requests, concurrency, counter):
+    try:
+        prepared = [build(ctx) for _ in range(requests)]
+    except IndexError:
+        # Ran out of seeded rows to consume
+        return None
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(chunk):
+        local_latencies = []
+        local_errors = 0
+        for method, path, kwargs in chunk:
+            started = time.perf_counter()
+            try:
+                status = driver.request(method, path, **kwargs)
+            except Exception:
+                status = 599
+            local_latencies.append(time.perf_counter() - started)
+            if status >= 500:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    chunks = [prepared[i::concurrency] for i in range(concurrency)]
+    before = questions(counter)
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks if chunk]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    # The second SHOW STATUS counts itself
+    queries = questions(counter) - before - 1
+
+    return summarize(route, driver.mode, latencies, errors[0], wall, queries)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    # Settings the app reads at import time
+    os.environ['DB_NAME'] = args.database
+    os.environ.setdefault('OUTBOX_WORKER', 'off')
+    os.environ.setdefault('JOBS_WORKER', 'off')
+    os.environ.setdefault('LOGIN_ATTEMPTS_PER_EMAIL', '1000000')
+    os.environ.setdefault('LOGIN_ATTEMPTS_PER_IP', '1000000')
+
+    import mysql.connector
+    from backend.app import app
+    from backend.database_config import DB_CONFIG
+
+    counter = mysql.connector.connect(**dict(DB_CONFIG, database=args.database))
+    counter.autocommit = True
+    rng = random.Random(args.seed)
+
+    modes = ['flask', 'wsgi'] if args.mode == 'both' else [args.mode]
+    selected = [(route, build) for route, build in SCENARIOS
+                if not args.routes or any(term in route for term in args.routes)]
+
+    results = []
+    for mode in modes:
+        driver = FlaskDriver(app) if mode == 'flask' else WsgiDriver(app, args.url)
+        ctx = BenchContext(counter, args.requests + args.warmup, rng)
+        try:
+            for route, build in selected:
+                # Untimed warm-up fills caches and the connection pool
+                run_scenario(driver, ctx, route, build, args.warmup, 1, counter)
+                result = run_scenario(driver, ctx, route, build, args.requests, args.concurrency, counter)
+                if result is None:
+                    print(f'{route:<40} skipped: seeded rows used up, reseed or lower --requests')
+                    continue
+                results.append(result)
+                print(f"{mode:<5} {route:<40} p50 {result['p50Ms']:>8.2f} ms  p95 {result['p95Ms']:>8.2f} ms  "
+                      f"p99 {result['p99Ms']:>8.2f} ms  {result['throughput']:>7.1f} req/s  "
+                      f"{result['queriesPerRequest']} q/req  {result['errors']} errors")
+        finally:
+            driver.close()
+    counter.close()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'createdAt': datetime.now(timezone.utc).isoformat(),
+            'database': args.database,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'url': args.url,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def compare(base, head, tolerance, query_tolerance):
+    """Returns (rows, regressions) comparing p95 latency and queries per request."""
+    base_results = {(r['route'], r['mode']): r for r in base['results']}
+    rows = []
+    regressions = []
+    for result in head['results']:
+        key = (result['route'], result['mode'])
+        before = base_results.get(key)
+        if before is None:
+            continue
+        p95_change = (result['p95Ms'] - before['p95Ms']) / before['p95Ms'] if before['p95Ms'] else 0.0
+        query_change = ((result['queriesPerRequest'] or 0) - (before['queriesPerRequest'] or 0))
+        row = (key, before['p95Ms'], result['p95Ms'], p95_change,
+               before['queriesPerRequest'], result['queriesPerRequest'])
+        rows.append(row)
+        if p95_change > tolerance or query_change > query_tolerance:
+            regressions.append(row)
+    return rows, regressions
+
+
+def run_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    rows, regressions = compare(base, head, args.tolerance, args.query_tolerance)
+    for (route, mode), base_p95, head_p95, change, base_q, head_q in rows:
+        flag = '  REGRESSION' if (route, mode) in {row[0] for row in regressions} else ''
+        print(f'{mode:<5} {route:<40} p95 {base_p95:>8.2f} -> {head_p95:>8.2f} ms ({change:+.0%})  '
+              f'q/req {base_q} -> {head_q}{flag}')
+    print(f"{len(regressions)} regressions ({base['meta'].get('commit')} -> {head['meta'].get('commit')})")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='benchmark the routes')
+    run_parser.add_argument('--database', default='saldo_bench')
+    run_parser.add_argument('--mode', choices=['flask', 'wsgi', 'both'], default='both')
+    run_parser.add_argument('--url', help='benchmark a server that is already running (wsgi mode)')
+    run_parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    run_parser.add_argument('--warmup', type=int, default=10)
+    run_parser.add_argument('--concurrency', type=int, default=1)
+    run_parser.add_argument('--routes', nargs='*', help='only routes containing one of these')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--output', help='write JSON results here')
+
+    compare_parser = commands.add_parser('compare', help='diff two JSON result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--tolerance', type=float, default=0.15,
+                                help='allowed relative p95 increase')
+    compare_parser.add_argument('--query-tolerance', type=float, default=0.5,
+                                help='allowed increase in queries per request')
+
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else run_compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
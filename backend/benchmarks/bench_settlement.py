@@ -0,0 +1,60 @@
+"""
+Settlement engine benchmark.
+
+    python -m backend.benchmarks.bench_settlement --members 200 --debts 5000
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+from backend.utils.settlement import net_balances, settle
+
+
+def synthetic_debts(members, debts, seed):
+    rng = random.Random(seed)
+    user_ids = list(range(1, members + 1))
+    rows = []
+    for _ in range(debts):
+        from_user_id, to_user_id = rng.sample(user_ids, 2)
+        rows.append((from_user_id, to_user_id, Decimal(rng.randint(1, 50000)) / 100))
+    return rows
+
+
+def run(members, debts, repeat, seed):
+    rows = synthetic_debts(members, debts, seed)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        balances = net_balances(rows)
+        transfers = settle(balances)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    return {
+        'members': members,
+        'debts': debts,
+        'transfers': len(transfers),
+        'pairwiseRelations': len({(f, t) for f, t, _ in rows}),
+        'bestMs': round(timings[0], 3),
+        'medianMs': round(timings[len(timings) // 2], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--debts', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    for debts in args.debts:
+        result = run(args.members, debts, args.repeat, args.seed)
+        print(f"{result['debts']:>7} debts / {result['members']} members: "
+              f"{result['pairwiseRelations']} pairwise relations -> "
+              f"{result['transfers']} transfers, "
+              f"median {result['medianMs']} ms (best {result['bestMs']} ms)")
+
+
+if __name__ == '__main__':
+    main()
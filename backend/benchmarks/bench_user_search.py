@@ -0,0 +1,86 @@
+"""
+User search index benchmark.
+
+Builds the prefix index over synthetic users and compares query latency
+with a linear '%term%' scan, which is what LIKE does on every keystroke.
+
+    python -m backend.benchmarks.bench_user_search --users 1000000
+"""
+import argparse
+import random
+import time
+import resource
+from backend.utils.user_search import UserSearchIndex, normalize
+
+FIRST_NAMES = ['Ahmet', 'Mehmet', 'Ayse', 'Fatma', 'Zeynep', 'Emre', 'Can', 'Elif',
+               'Burak', 'Deniz', 'Ece', 'Kerem', 'Selin', 'Mert', 'Ozan', 'Irem']
+LAST_NAMES = ['Yilmaz', 'Kaya', 'Demir', 'Sahin', 'Celik', 'Yildiz', 'Ozturk',
+              'Aydin', 'Arslan', 'Dogan', 'Kilic', 'Aslan', 'Cetin', 'Kara']
+DOMAINS = ['gmail.com', 'hotmail.com', 'outlook.com', 'itu.edu.tr', 'yahoo.com']
+TERMS = ['ah', 'meh', 'zeynep', 'yilmaz', 'ayse.k', 'gmail', 'ozturk12', 'sel']
+
+
+def synthetic_users(count, seed):
+    rng = random.Random(seed)
+    for user_id in range(1, count + 1):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        email = f'{first}.{last}{user_id}@{rng.choice(DOMAINS)}'.lower()
+        yield user_id, f'{first} {last}', email
+
+
+def linear_scan(users, term, limit):
+    term = normalize(term)
+    hits = []
+    for user_id, name, email in users:
+        if term in name.lower() or term in email:
+            hits.append(user_id)
+            if len(hits) == limit:
+                break
+    return hits
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    users = list(synthetic_users(args.users, args.seed))
+    index = UserSearchIndex()
+
+    started = time.perf_counter()
+    index.bulk_load(users)
+    build_seconds = time.perf_counter() - started
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f'{args.users} users: built in {build_seconds:.2f}s, '
+          f'process max RSS {max_rss:.0f} MiB')
+
+    adds = []
+    for offset in range(1, 21):
+        started = time.perf_counter()
+        index.add(args.users + offset, 'Yeni Kullanici', f'yeni{offset}@example.com')
+        adds.append((time.perf_counter() - started) * 1000)
+    adds.sort()
+    print(f'incremental add: median {adds[len(adds) // 2]:.2f} ms')
+
+    for term in TERMS:
+        indexed = timed(lambda: index.search(term, limit=10), args.repeat)
+        scanned = timed(lambda: linear_scan(users, term, 10 ** 9), 1)
+        print(f'{term!r:>12}: index {indexed:8.3f} ms   full scan {scanned:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
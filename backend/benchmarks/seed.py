@@ -0,0 +1,164 @@
+"""
+Synthetic data for the endpoint benchmarks.
+
+Creates (or recreates) a database, migrates it and fills it with users,
+groups, memberships, debts, expenses and notifications at the requested
+scale, then rebuilds the derived tables (balance ledger, dashboard stats,
+notification state) so it looks like a database the app has been writing.
+
+    python -m backend.benchmarks.seed --database saldo_bench --reset \
+        --users 10000 --groups 2000 --members-per-group 6 \
+        --debts 200000 --notifications 100000
+
+Every user's password is BENCH_PASSWORD and their email bench<UserID>@example.com.
+"""
+import argparse
+import random
+import time
+import mysql.connector
+from backend.database_config import DB_CONFIG
+from backend.migrations import upgrade
+from backend.utils import ledger, user_stats
+from backend.utils.hashing import HashingService
+from backend.benchmarks.bench_user_search import FIRST_NAMES, LAST_NAMES
+
+BENCH_PASSWORD = 'Bench-pass1'
+BATCH_SIZE = 5000
+
+
+def bench_email(user_id):
+    return f'bench{user_id}@example.com'
+
+
+def connect(database):
+    return mysql.connector.connect(**dict(DB_CONFIG, database=database))
+
+
+def create_database(database, reset):
+    config = dict(DB_CONFIG)
+    config.pop('database')
+    connection = mysql.connector.connect(**config)
+    cursor = connection.cursor()
+    try:
+        if reset:
+            cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def insert_batches(connection, query, rows):
+    cursor = connection.cursor()
+    try:
+        for start in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(query, rows[start:start + BATCH_SIZE])
+            connection.commit()
+    finally:
+        cursor.close()
+
+
+def seed(connection, users, groups, members_per_group, debts, notifications, seed=17):
+    rng = random.Random(seed)
+    # One hash for everyone; hashing a million passwords is not what we measure
+    password = HashingService(workers=0).hash_password(BENCH_PASSWORD)
+
+    insert_batches(connection, """
+        INSERT INTO users (UserID, Name, Email, Phone, Password, Currency)
+        VALUES (%s, %s, %s, %s, %s, 'USD')
+    """, [
+        (user_id, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+         bench_email(user_id), f'555{user_id:07d}', password)
+        for user_id in range(1, users + 1)
+    ])
+
+    insert_batches(connection, """
+        INSERT INTO groupsaldo (GroupID, GroupName) VALUES (%s, %s)
+    """, [(group_id, f'Bench group {group_id}') for group_id in range(1, groups + 1)])
+
+    members = {
+        group_id: rng.sample(range(1, users + 1), min(members_per_group, users))
+        for group_id in range(1, groups + 1)
+    }
+    insert_batches(connection, """
+        INSERT INTO groupmembers (GroupID, UserID) VALUES (%s, %s)
+    """, [(group_id, user_id) for group_id, ids in members.items() for user_id in ids])
+
+    debt_rows = []
+    for _ in range(debts):
+        group_id = rng.randint(1, groups)
+        from_user_id, to_user_id = rng.sample(members[group_id], 2)
+        debt_rows.append((
+            from_user_id, to_user_id, rng.randint(100, 50000) / 100,
+            'paid' if rng.random() < 0.4 else 'pending', group_id,
+            'Bench debt', rng.randint(0, 400)
+        ))
+    insert_batches(connection, """
+        INSERT INTO debts (FromUserID, ToUserID, Amount, Status, GroupID, Description, CreatedDate)
+        VALUES (%s, %s, %s, %s, %s, %s, NOW() - INTERVAL %s DAY)
+    """, debt_rows)
+
+    insert_batches(connection, """
+        INSERT INTO expenses (GroupID, UserID, Amount, Description, Date)
+        VALUES (%s, %s, %s, 'Bench expense', CURDATE() - INTERVAL %s DAY)
+    """, [
+        (group_id, rng.choice(ids), rng.randint(100, 50000) / 100, rng.randint(0, 400))
+        for group_id, ids in members.items()
+        for _ in range(max(1, debts // max(groups, 1) // 10))
+    ])
+
+    insert_batches(connection, """
+        INSERT INTO notifications (UserID, Title, Message, Type, IsRead, RelatedID, CreatedDate)
+        VALUES (%s, 'New Debt Added', 'Someone owes you', 'debt', %s, %s, NOW() - INTERVAL %s MINUTE)
+    """, [
+        (rng.randint(1, users), int(rng.random() < 0.7), rng.randint(1, max(debts, 1)),
+         rng.randint(0, 60 * 24 * 90))
+        for _ in range(notifications)
+    ])
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM notification_state")
+        cursor.execute("""
+            INSERT INTO notification_state (UserID, Version, UnreadCount, LastChanged)
+            SELECT UserID, COUNT(*), SUM(IsRead = 0), UTC_TIMESTAMP()
+            FROM notifications
+            GROUP BY UserID
+        """)
+        connection.commit()
+    finally:
+        cursor.close()
+
+    ledger.rebuild(connection)
+    user_stats.rebuild(connection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='saldo_bench')
+    parser.add_argument('--reset', action='store_true', help='drop the database first')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--groups', type=int, default=400)
+    parser.add_argument('--members-per-group', type=int, default=6)
+    parser.add_argument('--debts', type=int, default=20000)
+    parser.add_argument('--notifications', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=17)
+    args = parser.parse_args()
+    if args.members_per_group < 2 or args.users < args.members_per_group:
+        parser.error('need at least 2 members per group and enough users to fill them')
+
+    started = time.perf_counter()
+    create_database(args.database, args.reset)
+    connection = connect(args.database)
+    try:
+        upgrade(connection)
+        seed(connection, args.users, args.groups, args.members_per_group,
+             args.debts, args.notifications, args.seed)
+    finally:
+        connection.close()
+    print(f'Seeded {args.database} in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
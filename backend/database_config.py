@@ -1,16 +1,69 @@
+import logging
+import os
+import threading
+import time
 import mysql.connector
 from mysql.connector import Error
+from flask import g, has_app_context
+from .utils.db_pool import ConnectionPool
+from .utils.instrumentation import instrument_cursor, record_pool_wait
 
-def get_db_connection():
+logger = logging.getLogger(__name__)
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'finance_tracker'),
+    'user': os.environ.get('DB_USER', 'saldo_user'),
+    'password': os.environ.get('DB_PASSWORD', '5-hx6zy9'),
+    'port': int(os.environ.get('DB_PORT', 3306)),
+}
+
+POOL_CONFIG = {
+    'size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('DB_POOL_MAX_OVERFLOW', 5)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    'recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+    'pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def connect():
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            database='finance_tracker',             
-            user='saldo_user',
-            password='5-hx6zy9',
-            port=3306
-        )
-        return connection
+        return mysql.connector.connect(**DB_CONFIG)
     except Error as e:
-        print(f"Error connecting to MySQL Database: {e}")
-        raise e
\ No newline at end of file
+        logger.error("Error connecting to MySQL Database: %s", e)
+        raise e
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(connect, cursor_wrapper=instrument_cursor, **POOL_CONFIG)
+    return _pool
+
+
+def get_db_connection():
+    # Inside a request the connection is shared by the whole request and
+    # handed back to the pool in teardown; close() on it is a no-op.
+    if has_app_context():
+        if 'db' not in g:
+            started = time.perf_counter()
+            g.db = get_pool().checkout(scoped=True)
+            record_pool_wait(time.perf_counter() - started)
+        return g.db
+    return get_pool().checkout()
+
+
+def release_db_connection(exception=None):
+    connection = g.pop('db', None)
+    if connection is not None:
+        connection.release()
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db_connection)
@@ -0,0 +1,143 @@
+"""
+Versioned schema migrations.
+
+Each migration is a module in this package named vNNNN_<name>.py with an
+upgrade(cursor) function. schema_migrations records the versions applied to
+a database; upgrade() runs the missing ones in order, committing after each.
+Migrations are written to be safe on databases that were set up by hand
+from tables.sql: they check information_schema before creating anything.
+
+    python -m backend.migrations status
+    python -m backend.migrations upgrade [--to VERSION]
+"""
+import importlib
+import pkgutil
+import re
+
+_MODULE_NAME = re.compile(r'^v(\d{4})_(\w+)$')
+
+CREATE_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        Version INT PRIMARY KEY,
+        Name VARCHAR(100) NOT NULL,
+        AppliedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+class Migration:
+    def __init__(self, version, name, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    def upgrade(self, cursor):
+        self.module.upgrade(cursor)
+
+
+def discover():
+    """All migrations in this package, ordered by version."""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(info.name)
+        if match:
+            module = importlib.import_module(f'{__name__}.{info.name}')
+            migrations.append(Migration(int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f'Duplicate migration versions: {versions}')
+    return migrations
+
+
+def applied_versions(cursor):
+    cursor.execute(CREATE_VERSION_TABLE)
+    cursor.execute("SELECT Version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending(cursor, target=None):
+    applied = applied_versions(cursor)
+    return [
+        migration for migration in discover()
+        if migration.version not in applied
+        and (target is None or migration.version <= target)
+    ]
+
+
+def upgrade(connection, target=None, log=print):
+    """Applies pending migrations up to target; returns the versions applied."""
+    cursor = connection.cursor()
+    done = []
+    try:
+        for migration in pending(cursor, target):
+            log(f'Applying {migration.version:04d} {migration.name}')
+            migration.upgrade(cursor)
+            cursor.execute("""
+                INSERT INTO schema_migrations (Version, Name)
+                VALUES (%s, %s)
+            """, (migration.version, migration.name))
+            # MySQL DDL commits implicitly; this commits data changes and the version row
+            connection.commit()
+            done.append(migration.version)
+        return done
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# Helpers for migrations
+
+def table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    return cursor.fetchone()[0] > 0
+
+
+def column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def index_columns(cursor, table):
+    """{index name: [columns in order]} for a table."""
+    cursor.execute("""
+        SELECT INDEX_NAME, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    indexes = {}
+    for name, column in cursor.fetchall():
+        indexes.setdefault(name, []).append(column.lower())
+    return indexes
+
+
+def ensure_index(cursor, table, name, columns):
+    """
+    Creates the index unless one with that name exists or another index
+    already starts with the same columns (a primary key or the implicit
+    index InnoDB adds for a foreign key counts). Returns True if created.
+    """
+    wanted = [column.lower() for column in columns]
+    for index_name, indexed in index_columns(cursor, table).items():
+        if index_name == name or indexed[:len(wanted)] == wanted:
+            return False
+    cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+    return True
+
+
+def foreign_key_exists(cursor, table, name):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLE_CONSTRAINTS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        AND CONSTRAINT_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+    """, (table, name))
+    return cursor.fetchone()[0] > 0
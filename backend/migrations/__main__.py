@@ -0,0 +1,34 @@
+import argparse
+import sys
+from backend.database_config import get_db_connection
+from backend.migrations import discover, applied_versions, upgrade
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create or upgrade the database schema')
+    parser.add_argument('command', choices=['status', 'upgrade'])
+    parser.add_argument('--to', type=int, help='stop after this version')
+    args = parser.parse_args(argv)
+
+    connection = get_db_connection()
+    try:
+        if args.command == 'upgrade':
+            done = upgrade(connection, args.to)
+            print(f'{len(done)} migrations applied')
+            return 0
+
+        cursor = connection.cursor()
+        try:
+            applied = applied_versions(cursor)
+        finally:
+            cursor.close()
+        for migration in discover():
+            state = 'applied' if migration.version in applied else 'pending'
+            print(f'{migration.version:04d} {migration.name:<30} {state}')
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
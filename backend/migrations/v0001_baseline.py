@@ -0,0 +1,157 @@
+"""
+Baseline: the schema from tables.sql as it stood when migrations were added.
+
+Tables that already exist are left alone, so this also adopts databases that
+were set up by hand from an older tables.sql; anything those may be missing
+is added by later migrations.
+"""
+from . import table_exists, ensure_index
+
+TABLES = [
+    ('users', """
+        CREATE TABLE users (
+            UserID INT AUTO_INCREMENT PRIMARY KEY,
+            Name VARCHAR(100) NOT NULL,
+            Email VARCHAR(255) UNIQUE NOT NULL,
+            Phone VARCHAR(15),
+            Password VARCHAR(255) NOT NULL,
+            Currency VARCHAR(3)
+        )
+    """),
+    ('notifications', """
+        CREATE TABLE notifications (
+            NotificationID INT AUTO_INCREMENT PRIMARY KEY,
+            UserID INT NOT NULL,
+            Title VARCHAR(100) NOT NULL,
+            Message TEXT NOT NULL,
+            Type VARCHAR(20) NOT NULL,
+            IsRead TINYINT(1) DEFAULT 0,
+            CreatedDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            RelatedID INT,
+            FOREIGN KEY (UserID) REFERENCES users(UserID)
+        )
+    """),
+    ('groupsaldo', """
+        CREATE TABLE groupsaldo (
+            GroupID INT AUTO_INCREMENT PRIMARY KEY,
+            GroupName VARCHAR(100) NOT NULL,
+            CreatedDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+    ('groupmembers', """
+        CREATE TABLE groupmembers (
+            GroupID INT NOT NULL,
+            UserID INT NOT NULL,
+            PRIMARY KEY (GroupID, UserID),
+            FOREIGN KEY (GroupID) REFERENCES groupsaldo(GroupID),
+            FOREIGN KEY (UserID) REFERENCES users(UserID)
+        )
+    """),
+    ('expenses', """
+        CREATE TABLE expenses (
+            ExpenseID INT AUTO_INCREMENT PRIMARY KEY,
+            GroupID INT NOT NULL,
+            UserID INT NOT NULL,
+            Amount DECIMAL(10,2) NOT NULL,
+            Description VARCHAR(255) NOT NULL,
+            Date DATE NOT NULL,
+            FOREIGN KEY (GroupID) REFERENCES groupsaldo(GroupID),
+            FOREIGN KEY (UserID) REFERENCES users(UserID)
+        )
+    """),
+    ('debts', """
+        CREATE TABLE debts (
+            DebtID INT AUTO_INCREMENT PRIMARY KEY,
+            FromUserID INT NOT NULL,
+            ToUserID INT NOT NULL,
+            Amount DECIMAL(10,2) NOT NULL,
+            Status VARCHAR(20) NOT NULL,
+            GroupID INT NOT NULL,
+            Description TEXT,
+            CreatedDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (FromUserID) REFERENCES users(UserID),
+            FOREIGN KEY (ToUserID) REFERENCES users(UserID),
+            FOREIGN KEY (GroupID) REFERENCES groupsaldo(GroupID)
+        )
+    """),
+    ('balance_ledger', """
+        CREATE TABLE balance_ledger (
+            GroupID INT NOT NULL,
+            UserID INT NOT NULL,
+            CounterpartyID INT NOT NULL,
+            DebtCount INT NOT NULL DEFAULT 0,
+            OpenCount INT NOT NULL DEFAULT 0,
+            TotalAmount DECIMAL(14,2) NOT NULL DEFAULT 0,
+            Balance DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (GroupID, UserID, CounterpartyID),
+            INDEX idx_ledger_user (UserID)
+        )
+    """),
+    ('user_stats_daily', """
+        CREATE TABLE user_stats_daily (
+            UserID INT NOT NULL,
+            Day DATE NOT NULL,
+            GroupID INT NOT NULL,
+            DebtCount INT NOT NULL DEFAULT 0,
+            OpenCount INT NOT NULL DEFAULT 0,
+            OwedAmount DECIMAL(14,2) NOT NULL DEFAULT 0,
+            OwingAmount DECIMAL(14,2) NOT NULL DEFAULT 0,
+            OpenOwed DECIMAL(14,2) NOT NULL DEFAULT 0,
+            OpenOwing DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (UserID, Day, GroupID),
+            INDEX idx_stats_daily_group (GroupID)
+        )
+    """),
+    ('user_stats', """
+        CREATE TABLE user_stats (
+            UserID INT PRIMARY KEY,
+            AsOf DATE NOT NULL,
+            Summary JSON NOT NULL,
+            FOREIGN KEY (UserID) REFERENCES users(UserID)
+        )
+    """),
+    ('notification_outbox', """
+        CREATE TABLE notification_outbox (
+            OutboxID BIGINT AUTO_INCREMENT PRIMARY KEY,
+            EventType VARCHAR(20) NOT NULL,
+            Payload JSON NOT NULL,
+            CreatedDate TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3)
+        )
+    """),
+    ('notification_state', """
+        CREATE TABLE notification_state (
+            UserID INT PRIMARY KEY,
+            Version INT UNSIGNED NOT NULL DEFAULT 0,
+            UnreadCount INT NOT NULL DEFAULT 0,
+            LastChanged TIMESTAMP NULL,
+            FOREIGN KEY (UserID) REFERENCES users(UserID)
+        )
+    """),
+]
+
+INDEXES = [
+    ('users', 'idx_user_email', ['Email']),
+    ('notifications', 'idx_notifications_user', ['UserID', 'IsRead']),
+    ('expenses', 'idx_expense_date', ['Date']),
+    ('debts', 'idx_debt_status', ['Status']),
+]
+
+
+def upgrade(cursor):
+    created = set()
+    for name, ddl in TABLES:
+        if not table_exists(cursor, name):
+            cursor.execute(ddl)
+            created.add(name)
+
+    if 'notification_state' in created:
+        # Seed for databases that already have notifications
+        cursor.execute("""
+            INSERT INTO notification_state (UserID, Version, UnreadCount, LastChanged)
+            SELECT UserID, COUNT(*), SUM(IsRead = 0), UTC_TIMESTAMP()
+            FROM notifications
+            GROUP BY UserID
+        """)
+
+    for table, name, columns in INDEXES:
+        ensure_index(cursor, table, name, columns)
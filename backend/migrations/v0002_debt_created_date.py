@@ -0,0 +1,11 @@
+"""debts.CreatedDate, which the dashboard windows are based on."""
+from . import column_exists
+
+
+def upgrade(cursor):
+    if not column_exists(cursor, 'debts', 'CreatedDate'):
+        # Existing debts get the migration time; there is no better date for them
+        cursor.execute("""
+            ALTER TABLE debts
+            ADD COLUMN CreatedDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        """)
@@ -0,0 +1,28 @@
+"""
+Indexes behind the per-request queries in backend/routes.
+
+Most of these are already covered by a primary key or by the index InnoDB
+creates for a foreign key; ensure_index() skips those, so this only adds
+what a given database is actually missing.
+"""
+from . import ensure_index
+
+INDEXES = [
+    # Group lists and stats by user
+    ('groupmembers', 'idx_groupmembers_user', ['UserID']),
+    # Member lists and membership checks
+    ('groupmembers', 'idx_groupmembers_group_user', ['GroupID', 'UserID']),
+    # Group debt pages: WHERE GroupID = ? AND DebtID < ? ORDER BY DebtID DESC
+    ('debts', 'idx_debts_group', ['GroupID', 'DebtID']),
+    ('debts', 'idx_debts_from', ['FromUserID']),
+    ('debts', 'idx_debts_to', ['ToUserID']),
+    # Notification pages: WHERE UserID = ? ORDER BY CreatedDate DESC, NotificationID DESC
+    ('notifications', 'idx_notifications_user_created', ['UserID', 'CreatedDate']),
+    # Login and registration lookups
+    ('users', 'idx_user_email', ['Email']),
+]
+
+
+def upgrade(cursor):
+    for table, name, columns in INDEXES:
+        ensure_index(cursor, table, name, columns)
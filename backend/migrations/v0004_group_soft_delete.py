@@ -0,0 +1,34 @@
+"""
+groupsaldo.DeletedAt for soft-deleted groups, the background_jobs table
+that purges them, and the index the purge uses to find a debt's
+notifications.
+"""
+from . import column_exists, ensure_index, table_exists
+
+
+def upgrade(cursor):
+    if not column_exists(cursor, 'groupsaldo', 'DeletedAt'):
+        cursor.execute("""
+            ALTER TABLE groupsaldo
+            ADD COLUMN DeletedAt TIMESTAMP NULL DEFAULT NULL
+        """)
+
+    if not table_exists(cursor, 'background_jobs'):
+        cursor.execute("""
+            CREATE TABLE background_jobs (
+                JobID BIGINT AUTO_INCREMENT PRIMARY KEY,
+                Kind VARCHAR(50) NOT NULL,
+                Payload JSON NOT NULL,
+                Progress JSON NULL,
+                Status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+                Attempts INT NOT NULL DEFAULT 0,
+                LastError TEXT NULL,
+                LeaseOwner VARCHAR(100) NULL,
+                LeaseUntil DATETIME NULL,
+                CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_background_jobs_claim (Status, LeaseUntil)
+            )
+        """)
+
+    ensure_index(cursor, 'notifications', 'idx_notifications_related', ['RelatedID'])
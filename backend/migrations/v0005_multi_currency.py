@@ -0,0 +1,51 @@
+"""
+Multi-currency debts: the fx_rates table, debts.Currency, and Currency in
+the keys of balance_ledger and user_stats_daily so amounts in different
+currencies are never added up before conversion.
+
+Debts written before this migration had no currency; they, and the ledger
+and stats rows built from them, are taken to be in FX_BASE_CURRENCY, which
+is also seeded as the one rate every database has.
+"""
+from . import column_exists, index_columns, table_exists
+from ..utils.fx import FX_BASE_CURRENCY
+
+# table: primary key with Currency added
+KEYED_TABLES = {
+    'balance_ledger': ['GroupID', 'UserID', 'CounterpartyID', 'Currency'],
+    'user_stats_daily': ['UserID', 'Day', 'GroupID', 'Currency'],
+}
+
+
+def upgrade(cursor):
+    if not table_exists(cursor, 'fx_rates'):
+        cursor.execute("""
+            CREATE TABLE fx_rates (
+                Currency CHAR(3) PRIMARY KEY,
+                Rate DECIMAL(20,10) NOT NULL,
+                UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """)
+    cursor.execute("""
+        INSERT IGNORE INTO fx_rates (Currency, Rate)
+        VALUES (%s, 1)
+    """, (FX_BASE_CURRENCY,))
+
+    if not column_exists(cursor, 'debts', 'Currency'):
+        cursor.execute(f"""
+            ALTER TABLE debts
+            ADD COLUMN Currency CHAR(3) NOT NULL DEFAULT '{FX_BASE_CURRENCY}' AFTER Amount
+        """)
+
+    for table, key in KEYED_TABLES.items():
+        if not column_exists(cursor, table, 'Currency'):
+            cursor.execute(f"""
+                ALTER TABLE {table}
+                ADD COLUMN Currency CHAR(3) NOT NULL DEFAULT '{FX_BASE_CURRENCY}' AFTER {key[2]}
+            """)
+        if [c.lower() for c in index_columns(cursor, table).get('PRIMARY', [])] != [c.lower() for c in key]:
+            cursor.execute(f"""
+                ALTER TABLE {table}
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY ({', '.join(key)})
+            """)
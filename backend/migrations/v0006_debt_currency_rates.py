@@ -0,0 +1,29 @@
+"""
+Every debt currency must have a row in fx_rates. to_base_sql() falls back
+to a lookup in fx_rates for currencies the rate cache has not seen; without
+a row that lookup is NULL and the debt silently drops out of every SUM().
+The foreign key keeps such debts from being written and rates from being
+deleted while debts use them.
+"""
+from . import foreign_key_exists
+
+
+def upgrade(cursor):
+    cursor.execute("""
+        SELECT DISTINCT d.Currency
+        FROM debts d
+        LEFT JOIN fx_rates r ON r.Currency = d.Currency
+        WHERE r.Currency IS NULL
+    """)
+    missing = sorted(row[0] for row in cursor.fetchall())
+    if missing:
+        raise RuntimeError(
+            f"Debts use currencies with no exchange rate: {', '.join(missing)}. "
+            f"Load them first with python -m backend.utils.fx load <file>")
+
+    if not foreign_key_exists(cursor, 'debts', 'fk_debts_currency'):
+        cursor.execute("""
+            ALTER TABLE debts
+            ADD CONSTRAINT fk_debts_currency
+            FOREIGN KEY (Currency) REFERENCES fx_rates(Currency)
+        """)
@@ -0,0 +1,24 @@
+"""
+Token revocation that survives restarts and reaches every worker:
+users.TokensValidAfter (tokens issued before it are rejected, set on a
+password change) and revoked_tokens (single tokens revoked on logout, kept
+until they would have expired anyway).
+"""
+from . import column_exists, table_exists
+
+
+def upgrade(cursor):
+    if not column_exists(cursor, 'users', 'TokensValidAfter'):
+        cursor.execute("""
+            ALTER TABLE users
+            ADD COLUMN TokensValidAfter DOUBLE NULL DEFAULT NULL
+        """)
+
+    if not table_exists(cursor, 'revoked_tokens'):
+        cursor.execute("""
+            CREATE TABLE revoked_tokens (
+                Digest CHAR(64) PRIMARY KEY,
+                ExpiresAt DOUBLE NOT NULL,
+                INDEX idx_revoked_tokens_expires (ExpiresAt)
+            )
+        """)
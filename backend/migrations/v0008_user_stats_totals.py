@@ -0,0 +1,14 @@
+"""
+user_stats.Totals: the unrounded running totals behind each summary, so a
+debt write adds its delta to them instead of re-reading (and locking) every
+daily row of the users involved.
+"""
+from . import column_exists
+
+
+def upgrade(cursor):
+    if not column_exists(cursor, 'user_stats', 'Totals'):
+        cursor.execute("""
+            ALTER TABLE user_stats
+            ADD COLUMN Totals JSON NULL
+        """)
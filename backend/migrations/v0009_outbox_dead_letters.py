@@ -0,0 +1,23 @@
+"""
+notification_outbox.Attempts, Status and LastError: an event that keeps
+failing is charged an attempt each time and set aside as 'dead' after
+OUTBOX_MAX_ATTEMPTS, instead of failing every batch it is claimed in.
+The claim reads pending events in OutboxID order, hence the index.
+"""
+from . import column_exists, ensure_index
+
+COLUMNS = {
+    'Attempts': "INT NOT NULL DEFAULT 0",
+    'Status': "VARCHAR(10) NOT NULL DEFAULT 'pending'",
+    'LastError': "TEXT NULL",
+}
+
+
+def upgrade(cursor):
+    for column, definition in COLUMNS.items():
+        if not column_exists(cursor, 'notification_outbox', column):
+            cursor.execute(f"""
+                ALTER TABLE notification_outbox
+                ADD COLUMN {column} {definition}
+            """)
+    ensure_index(cursor, 'notification_outbox', 'idx_outbox_status', ['Status', 'OutboxID'])
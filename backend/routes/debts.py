@@ -1,53 +1,71 @@
+import logging
 from flask import Blueprint, request, jsonify
 from ..database_config import get_db_connection
 from mysql.connector import Error
+from ..utils.ledger import record_debt_change, fetch_debts_for_update
+from ..utils.user_stats import record_stats_change
+from ..utils.pagination import page_args, paginate, paged_response, PaginationError
+from ..utils.outbox import DEBT_ADDED, debt_event, enqueue, wake_worker
+from ..utils.fx import FxError, choose_currency, preferred_currency, rate_cache
+from .groups import live_group, live_group_filter
+
+logger = logging.getLogger(__name__)
 
 debts = Blueprint('debts', __name__)
 
 @debts.route('/groups/<int:group_id>/debts', methods=['POST'])
 def create_debt(group_id):
     data = request.json
+    if data.get('fromUserId') and str(data['fromUserId']) == str(data.get('toUserId')):
+        return jsonify({'error': 'A user cannot owe themselves'}), 400
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
+        if not live_group(cursor, group_id, lock=True):
+            return jsonify({'error': 'Group not found'}), 404
+
+        logger.debug("Creating debt", extra={'groupId': group_id, 'debt': data})
 
-        print(f"Creating debt with data: {data}")  # Debug log
+        # Varsayılan para birimi: alacaklının tercih ettiği
+        currency = data.get('currency')
+        preferred = None if currency else preferred_currency(cursor, data['toUserId'])
+        currency = choose_currency(rate_cache.rates(cursor), currency, preferred)
 
         # Borç oluştur
         cursor.execute("""
-            INSERT INTO debts (GroupID, FromUserID, ToUserID, Amount, Description, Status)
-            VALUES (%s, %s, %s, %s, %s, 'pending')
-        """, (group_id, data['fromUserId'], data['toUserId'], data['amount'], data['description']))
+            INSERT INTO debts (GroupID, FromUserID, ToUserID, Amount, Currency, Description, Status)
+            VALUES (%s, %s, %s, %s, %s, %s, 'pending')
+        """, (group_id, data['fromUserId'], data['toUserId'], data['amount'], currency, data['description']))
         
         debt_id = cursor.lastrowid
-        print(f"Created debt with ID: {debt_id}")  # Debug log
-
-        # Borç alan kişinin adını al
-        cursor.execute("SELECT Name FROM users WHERE UserID = %s", (data['fromUserId'],))
-        from_user = cursor.fetchone()
-        from_user_name = from_user[0] if from_user else 'Someone'
-        print(f"From user name: {from_user_name}")  # Debug log
-
-        # Notifikasyon oluştur
-        notification_data = (
-            data['toUserId'],
-            'New Debt Added',
-            f"{from_user_name} owes you ${data['amount']}",
-            debt_id
-        )
-        print(f"Creating notification with data: {notification_data}")  # Debug log
-
-        cursor.execute("""
-            INSERT INTO notifications (UserID, Title, Message, Type, RelatedID, IsRead, CreatedDate)
-            VALUES (%s, %s, %s, 'debt', %s, FALSE, NOW())
-        """, notification_data)
+        logger.debug("Created debt %s", debt_id, extra={'groupId': group_id})
+
+        new_debts = [{
+            'GroupID': group_id,
+            'FromUserID': int(data['fromUserId']),
+            'ToUserID': int(data['toUserId']),
+            'Amount': data['amount'],
+            'Currency': currency,
+            'Status': 'pending'
+        }]
+        record_debt_change(cursor, after=new_debts)
+        record_stats_change(cursor, after=new_debts)
+
+        # Notifikasyon outbox üzerinden oluşturulur
+        notification_event = debt_event(
+            debt_id, data['fromUserId'], data['toUserId'], data['amount'], currency)
+        logger.debug("Queueing notification event", extra={'event': notification_event})
+        enqueue(cursor, DEBT_ADDED, [notification_event])
 
         connection.commit()
-        print("Transaction committed successfully")  # Debug log
+        wake_worker()
+        logger.debug("Debt %s committed", debt_id)
         return jsonify({'message': 'Debt created successfully'}), 201
 
+    except FxError as e:
+        return jsonify({'error': str(e)}), 400
     except Error as e:
-        print(f"Error creating debt: {e}")
+        logger.exception("Error creating debt in group %s", group_id)
         return jsonify({'error': str(e)}), 500
     finally:
         if 'cursor' in locals():
@@ -57,13 +75,24 @@ def create_debt(group_id):
 
 @debts.route('/debts', methods=['GET'])
 def list_debts():
+    try:
+        after, limit = page_args(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
         
-        cursor.execute("SELECT * FROM debts")
-        debts = cursor.fetchall()
-        return jsonify(debts), 200
+        cursor.execute(f"""
+            SELECT * FROM debts
+            WHERE DebtID > %s AND {live_group_filter('debts')}
+            ORDER BY DebtID
+            LIMIT %s
+        """, (after[0] if after else 0, limit + 1))
+        debts, next_cursor = paginate(
+            cursor.fetchall(), limit, lambda debt: [debt['DebtID']])
+        return paged_response(jsonify(debts), next_cursor), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -78,7 +107,10 @@ def get_debt(debt_id):
     cursor = connection.cursor()
 
     try:
-        cursor.execute("SELECT * FROM Debts WHERE DebtID = :debt_id", {'debt_id': debt_id})
+        cursor.execute(f"""
+            SELECT * FROM debts
+            WHERE DebtID = %s AND {live_group_filter('debts')}
+        """, (debt_id,))
         row = cursor.fetchone()
         if not row:
             return jsonify({'error': 'Debt not found!'}), 404
@@ -105,15 +137,21 @@ def update_debt_status(debt_id):
     cursor = connection.cursor()
 
     try:
+        previous = fetch_debts_for_update(
+            cursor, f"DebtID = %s AND {live_group_filter('debts')}", (debt_id,))
+        if not previous:
+            return jsonify({'error': 'Debt not found!'}), 404
+
         cursor.execute("""
             UPDATE Debts
-            SET Status = :status
-            WHERE DebtID = :debt_id
-        """, {'status': status, 'debt_id': debt_id})
-        connection.commit()
+            SET Status = %s
+            WHERE DebtID = %s
+        """, (status, debt_id))
 
-        if cursor.rowcount == 0:
-            return jsonify({'error': 'Debt not found!'}), 404
+        updated = [dict(previous[0], Status=status)]
+        record_debt_change(cursor, before=previous, after=updated)
+        record_stats_change(cursor, before=previous, after=updated)
+        connection.commit()
     except Exception as e:
         connection.rollback()
         return jsonify({'error': f'Failed to update debt: {str(e)}'}), 500
@@ -129,14 +167,19 @@ def delete_debt(debt_id):
     cursor = connection.cursor()
 
     try:
+        removed = fetch_debts_for_update(
+            cursor, f"DebtID = %s AND {live_group_filter('debts')}", (debt_id,))
+        if not removed:
+            return jsonify({'error': 'Debt not found!'}), 404
+
         cursor.execute("""
             DELETE FROM Debts
-            WHERE DebtID = :debt_id
-        """, {'debt_id': debt_id})
-        connection.commit()
+            WHERE DebtID = %s
+        """, (debt_id,))
 
-        if cursor.rowcount == 0:
-            return jsonify({'error': 'Debt not found!'}), 404
+        record_debt_change(cursor, before=removed)
+        record_stats_change(cursor, before=removed)
+        connection.commit()
     except Exception as e:
         connection.rollback()
         return jsonify({'error': f'Failed to delete debt: {str(e)}'}), 500
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from ..database_config import get_db_connection
 from mysql.connector import Error
+from ..utils.pagination import page_args, paginate, paged_response, PaginationError
+from .groups import live_group, live_group_filter
 
 expenses = Blueprint('expenses', __name__)
 
@@ -10,6 +12,8 @@ def add_expense():
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        if not live_group(cursor, data['group_id'], lock=True):
+            return jsonify({'error': 'Group not found'}), 404
         
         cursor.execute("""
             INSERT INTO expenses (GroupID, UserID, Amount, Description, Date)
@@ -32,7 +36,10 @@ def get_expense(expense_id):
     cursor = connection.cursor()
 
     try:
-        cursor.execute("SELECT ExpenseID, GroupID, UserID, Amount, Description, ExpenseDate FROM Expenses WHERE ExpenseID = :expense_id", {'expense_id': expense_id})
+        cursor.execute(f"""
+            SELECT ExpenseID, GroupID, UserID, Amount, Description, ExpenseDate FROM Expenses
+            WHERE ExpenseID = %s AND {live_group_filter('Expenses')}
+        """, (expense_id,))
         row = cursor.fetchone()
         if not row:
             return jsonify({'error': 'Expense not found!'}), 404
@@ -50,18 +57,30 @@ def get_expense(expense_id):
 
 @expenses.route('/', methods=['GET'])
 def list_expenses():
+    try:
+        after, limit = page_args(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
     connection = get_db_connection()
     cursor = connection.cursor()
 
     try:
-        cursor.execute("SELECT * FROM Expenses")
+        cursor.execute(f"""
+            SELECT * FROM Expenses
+            WHERE ExpenseID > %s AND {live_group_filter('Expenses')}
+            ORDER BY ExpenseID
+            LIMIT %s
+        """, (after[0] if after else 0, limit + 1))
         rows = cursor.fetchall()
         columns = [col[0] for col in cursor.description]
-        result = [dict(zip(columns, row)) for row in rows]
+        result, next_cursor = paginate(
+            [dict(zip(columns, row)) for row in rows], limit,
+            lambda expense: [expense['ExpenseID']])
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve expenses: {str(e)}'}), 500
     finally:
         cursor.close()
         connection.close()
 
-    return jsonify(result), 200
+    return paged_response(jsonify(result), next_cursor), 200
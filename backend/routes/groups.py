@@ -1,23 +1,115 @@
-from flask import Blueprint, request, jsonify
-from ..database_config import get_db_connection
+import logging
+from flask import Blueprint, Response, request, jsonify
+from ..database_config import get_db_connection, get_pool
 from mysql.connector import Error
 from datetime import datetime
+from ..utils.expense_split import to_amount, split_shares
+from ..utils.settlement import group_settlement, to_cents, zero_sum
+from ..utils.fx import FxError, choose_currency, preferred_currency, rate_cache, to_base_sql
+from ..utils.ledger import record_debt_change, fetch_debts_for_update
+from ..utils.user_stats import record_stats_change, refresh_user_stats
+from ..utils.pagination import page_args, paginate, paged_response, PaginationError
+from ..utils.export import EXPORT_FORMATS, EXPORT_QUERIES, open_export, stream_rows, close_export
+from ..utils.outbox import DEBT_ADDED, DEBT_PAID, debt_event, enqueue, wake_worker
+from ..utils.cache import get_cache
+from ..utils.jobs import enqueue_job, wake_worker as wake_jobs
+from ..utils.group_purge import PURGE_GROUP
+from ..utils.membership import (
+    MembershipError, parse_user_ids, unknown_user_ids, add_members, remove_members
+)
+
+logger = logging.getLogger(__name__)
+
+# Cache key families
+GROUP_DETAILS = 'group'
+GROUP_MEMBERS = 'group_members'
+USER_GROUPS = 'user_groups'
 
 groups = Blueprint('groups', __name__)
 
+def report_currency(cursor, rates):
+    """?currency= if given, else the requesting user's preferred currency."""
+    requested = request.args.get('currency')
+    user_id = request.headers.get('User-ID', '')
+    preferred = None
+    if not requested and user_id.isdigit():
+        preferred = preferred_currency(cursor, user_id)
+    return choose_currency(rates, requested, preferred)
+
+def invalidate_group_cache(group_ids=(), user_ids=()):
+    """Drops cached group details/members and per-user group lists after a write."""
+    get_cache().invalidate(
+        *[(family, group_id) for group_id in group_ids for family in (GROUP_DETAILS, GROUP_MEMBERS)],
+        *[(USER_GROUPS, user_id) for user_id in user_ids]
+    )
+
+def _fetch(query, params, one=False):
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchone() if one else cursor.fetchall()
+    finally:
+        cursor.close()
+
+def cached_group(group_id):
+    return get_cache().get_or_load(GROUP_DETAILS, group_id, lambda: _fetch("""
+        SELECT * FROM groupsaldo 
+        WHERE GroupID = %s AND DeletedAt IS NULL
+    """, (group_id,), one=True))
+
+def live_group(cursor, group_id, lock=False):
+    """
+    Whether the group exists and is not deleted, read from the database: the
+    cache is per worker, so it can still hold a group another worker deleted.
+    Write paths pass lock=True; the shared lock holds off a concurrent DELETE
+    until the write commits, so the purge job always sees it.
+    """
+    cursor.execute(f"""
+        SELECT GroupID FROM groupsaldo
+        WHERE GroupID = %s AND DeletedAt IS NULL
+        {'FOR SHARE' if lock else ''}
+    """, (group_id,))
+    return cursor.fetchone() is not None
+
+def live_group_filter(table):
+    """WHERE condition that keeps only rows of `table` whose group is not deleted."""
+    return f"""EXISTS (
+        SELECT 1 FROM groupsaldo g
+        WHERE g.GroupID = {table}.GroupID AND g.DeletedAt IS NULL
+    )"""
+
+def cached_group_members(group_id):
+    return get_cache().get_or_load(GROUP_MEMBERS, group_id, lambda: _fetch("""
+        SELECT u.UserID, u.Name, u.Email
+        FROM Users u
+        JOIN groupmembers gm ON u.UserID = gm.UserID
+        WHERE gm.GroupID = %s
+    """, (group_id,)))
+
 @groups.route('/groups', methods=['POST'])
 def create_group():
     data = request.json
     group_name = data.get('GroupName')
-    members = data.get('Members', [])
     creator_id = request.headers.get('User-ID')
 
     if not group_name:
         return jsonify({'error': 'Group name is required!'}), 400
+    if not creator_id:
+        return jsonify({'error': 'User ID is required'}), 400
+
+    try:
+        member_ids = parse_user_ids([creator_id, *parse_user_ids(data.get('Members', []))])
+    except MembershipError as e:
+        return jsonify({'error': str(e)}), 400
 
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+
+        unknown = unknown_user_ids(cursor, member_ids)
+        if unknown:
+            return jsonify({'error': 'Unknown users', 'userIds': unknown}), 400
         
         cursor.execute("""
             INSERT INTO groupsaldo (GroupName, CreatedDate)
@@ -26,18 +118,11 @@ def create_group():
         
         group_id = cursor.lastrowid
 
-        cursor.execute("""
-            INSERT INTO groupmembers (GroupID, UserID)
-            VALUES (%s, %s)
-        """, (group_id, creator_id))
-
-        for member_id in members:
-            cursor.execute("""
-                INSERT INTO groupmembers (GroupID, UserID)
-                VALUES (%s, %s)
-            """, (group_id, member_id))
+        add_members(cursor, group_id, member_ids)
+        refresh_user_stats(cursor, member_ids)
         
         connection.commit()
+        invalidate_group_cache([group_id], member_ids)
         return jsonify({
             'message': 'Group created successfully',
             'group_id': group_id
@@ -61,51 +146,56 @@ def get_user_groups():
         return jsonify({'error': 'User ID is required'}), 400
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("""
+        groups = get_cache().get_or_load(USER_GROUPS, user_id, lambda: _fetch("""
             SELECT g.* 
             FROM groupsaldo g
             JOIN groupmembers gm ON g.GroupID = gm.GroupID
-            WHERE gm.UserID = %s
+            WHERE gm.UserID = %s AND g.DeletedAt IS NULL
             ORDER BY g.CreatedDate DESC
-        """, (user_id,))
-        
-        groups = cursor.fetchall()
+        """, (user_id,)))
         return jsonify(groups), 200
 
     except Error as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'connection' in locals():
-            connection.close()
 
 @groups.route('/groups/<int:group_id>', methods=['DELETE'])
 def delete_group(group_id):
+    """
+    Soft-deletes the group: it disappears from every read at once, and a
+    background job purges its debts, expenses and memberships in chunks.
+    """
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
 
         cursor.execute("""
-            DELETE FROM debts 
-            WHERE GroupID = %s
+            UPDATE groupsaldo SET DeletedAt = NOW()
+            WHERE GroupID = %s AND DeletedAt IS NULL
         """, (group_id,))
+        if cursor.rowcount == 0:
+            connection.rollback()
+            return jsonify({'error': 'Group not found'}), 404
 
         cursor.execute("""
-            DELETE FROM groupmembers 
+            SELECT UserID FROM groupmembers 
             WHERE GroupID = %s
         """, (group_id,))
+        member_ids = [row[0] for row in cursor.fetchall()]
 
         cursor.execute("""
-            DELETE FROM groupsaldo 
+            SELECT DISTINCT UserID FROM user_stats_daily 
             WHERE GroupID = %s
         """, (group_id,))
+        stats_user_ids = {row[0] for row in cursor.fetchall()} | set(member_ids)
+
+        # Summaries skip deleted groups; the daily rows go with the purge
+        refresh_user_stats(cursor, stats_user_ids)
+        job_id = enqueue_job(cursor, PURGE_GROUP, {'groupId': group_id})
 
         connection.commit()
-        return jsonify({'message': 'Group deleted successfully'}), 200
+        invalidate_group_cache([group_id], member_ids)
+        wake_jobs()
+        return jsonify({'message': 'Group deleted successfully', 'jobId': job_id}), 202
 
     except Error as e:
         if 'connection' in locals():
@@ -120,15 +210,7 @@ def delete_group(group_id):
 @groups.route('/groups/<int:group_id>', methods=['GET'])
 def get_group_details(group_id):
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT * FROM groupsaldo 
-            WHERE GroupID = %s
-        """, (group_id,))
-        
-        group = cursor.fetchone()
+        group = cached_group(group_id)
         
         if not group:
             return jsonify({'error': 'Group not found'}), 404
@@ -137,29 +219,56 @@ def get_group_details(group_id):
 
     except Error as e:
         return jsonify({'error': str(e)}), 500
+
+@groups.route('/groups/<int:group_id>/members', methods=['GET'])
+def get_group_members(group_id):
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        if not live_group(cursor, group_id):
+            return jsonify({'error': 'Group not found'}), 404
+
+        members = cached_group_members(group_id)
+        return jsonify(members), 200
+
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'connection' in locals():
             connection.close()
 
-@groups.route('/groups/<int:group_id>/members', methods=['GET'])
-def get_group_members(group_id):
+def _change_members(group_id, apply, result_key, check_users=False):
+    """Body of POST/DELETE /groups/<id>/members; apply() returns how many rows changed."""
+    try:
+        user_ids = parse_user_ids((request.json or {}).get('Members'))
+    except MembershipError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT u.UserID, u.Name, u.Email
-            FROM Users u
-            JOIN groupmembers gm ON u.UserID = gm.UserID
-            WHERE gm.GroupID = %s
-        """, (group_id,))
-        
-        members = cursor.fetchall()
-        return jsonify(members), 200
+        if not live_group(cursor, group_id, lock=True):
+            return jsonify({'error': 'Group not found'}), 404
+
+        if check_users:
+            unknown = unknown_user_ids(cursor, user_ids)
+            if unknown:
+                return jsonify({'error': 'Unknown users', 'userIds': unknown}), 400
+
+        changed = apply(cursor, group_id, user_ids)
+        if changed:
+            refresh_user_stats(cursor, user_ids)
+
+        connection.commit()
+        if changed:
+            invalidate_group_cache([group_id], user_ids)
+        return jsonify({result_key: changed}), 200
 
     except Error as e:
+        if 'connection' in locals():
+            connection.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
         if 'cursor' in locals():
@@ -167,11 +276,26 @@ def get_group_members(group_id):
         if 'connection' in locals():
             connection.close()
 
+@groups.route('/groups/<int:group_id>/members', methods=['POST'])
+def add_group_members(group_id):
+    return _change_members(group_id, add_members, 'added', check_users=True)
+
+@groups.route('/groups/<int:group_id>/members', methods=['DELETE'])
+def remove_group_members(group_id):
+    return _change_members(group_id, remove_members, 'removed')
+
 @groups.route('/groups/<int:group_id>/debts', methods=['GET'])
 def get_group_debts(group_id):
+    try:
+        after, limit = page_args(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        if not live_group(cursor, group_id):
+            return jsonify({'error': 'Group not found'}), 404
         
         cursor.execute("""
             SELECT 
@@ -179,6 +303,7 @@ def get_group_debts(group_id):
                 debts.FromUserID,
                 debts.ToUserID,
                 debts.Amount,
+                debts.Currency,
                 debts.Status,
                 debts.GroupID,
                 u1.Name as FromUserName,
@@ -187,19 +312,18 @@ def get_group_debts(group_id):
             JOIN Users u1 ON debts.FromUserID = u1.UserID
             JOIN Users u2 ON debts.ToUserID = u2.UserID
             WHERE debts.GroupID = %s
+            AND debts.DebtID < %s
             ORDER BY debts.DebtID DESC
-        """, (group_id,))
+            LIMIT %s
+        """, (group_id, after[0] if after else 2 ** 31, limit + 1))
         
-        debts = cursor.fetchall()
-        
-        for debt in debts:
-            if debt.get('Amount'):
-                debt['Amount'] = float(debt['Amount'])
-            
-        return jsonify(debts), 200
+        debts, next_cursor = paginate(
+            cursor.fetchall(), limit, lambda debt: [debt['DebtID']])
+
+        return paged_response(jsonify(debts), next_cursor), 200
 
     except Error as e:
-        print(f"Database error: {str(e)}")
+        logger.exception("Error listing debts of group %s", group_id)
         return jsonify({'error': str(e)}), 500
     finally:
         if 'cursor' in locals():
@@ -207,6 +331,161 @@ def get_group_debts(group_id):
         if 'connection' in locals():
             connection.close()
 
+@groups.route('/groups/<int:group_id>/overview', methods=['GET'])
+def get_group_overview(group_id):
+    """
+    Group, members, a page of debts and per-member net balances in one
+    response. Debts carry user IDs only; names come from members (plus
+    otherUsers for anyone no longer in the group).
+    """
+    try:
+        after, limit = page_args(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        group = cached_group(group_id)
+
+        if not group:
+            return jsonify({'error': 'Group not found'}), 404
+
+        members = cached_group_members(group_id)
+
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        rates = rate_cache.rates(cursor)
+        currency = report_currency(cursor, rates)
+
+        cursor.execute("""
+            SELECT DebtID, FromUserID, ToUserID, Amount, Currency, Status, GroupID
+            FROM debts
+            WHERE GroupID = %s
+            AND DebtID < %s
+            ORDER BY DebtID DESC
+            LIMIT %s
+        """, (group_id, after[0] if after else 2 ** 31, limit + 1))
+        debts, next_cursor = paginate(
+            cursor.fetchall(), limit, lambda debt: [debt['DebtID']])
+
+        # Net balance, plus what each member is owed and owes net per counterparty
+        balance, balance_params = to_base_sql('l.Balance', 'l.Currency', rates)
+        rate = rates[currency]
+        cursor.execute(f"""
+            SELECT t.UserID,
+                   ROUND(SUM(t.Balance) * %s, 2) AS Balance,
+                   ROUND(SUM(GREATEST(t.Balance, 0)) * %s, 2) AS Receives,
+                   ROUND(SUM(GREATEST(-t.Balance, 0)) * %s, 2) AS Owes
+            FROM (
+                SELECT l.UserID, {balance} AS Balance
+                FROM balance_ledger l
+                WHERE l.GroupID = %s
+            ) t
+            GROUP BY t.UserID
+        """, [rate, rate, rate] + balance_params + [group_id])
+        rows = cursor.fetchall()
+        balances = {member['UserID']: 0 for member in members}
+        balances.update({row['UserID']: to_cents(row['Balance'] or 0) for row in rows})
+        zero_sum(balances)
+        totals = {row['UserID']: row for row in rows}
+
+        member_ids = {member['UserID'] for member in members}
+        other_ids = sorted(
+            ({debt['FromUserID'] for debt in debts} | {debt['ToUserID'] for debt in debts}
+             | set(balances)) - member_ids)
+        other_users = []
+        if other_ids:
+            cursor.execute(f"""
+                SELECT UserID, Name FROM users
+                WHERE UserID IN ({', '.join(['%s'] * len(other_ids))})
+            """, other_ids)
+            other_users = cursor.fetchall()
+
+        return paged_response(jsonify({
+            'group': group,
+            'members': members,
+            'otherUsers': other_users,
+            'debts': debts,
+            'currency': currency,
+            'balances': [
+                {
+                    'userId': user_id,
+                    'balance': cents / 100,
+                    'receives': to_cents(totals.get(user_id, {}).get('Receives') or 0) / 100,
+                    'owes': to_cents(totals.get(user_id, {}).get('Owes') or 0) / 100
+                }
+                for user_id, cents in balances.items()
+            ]
+        }), next_cursor), 200
+
+    except FxError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@groups.route('/groups/<int:group_id>/settlement', methods=['GET'])
+def get_group_settlement(group_id):
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        if not live_group(cursor, group_id):
+            return jsonify({'error': 'Group not found'}), 404
+        rates = rate_cache.rates(cursor)
+
+        return jsonify(group_settlement(cursor, group_id, rates, report_currency(cursor, rates))), 200
+
+    except FxError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@groups.route('/groups/<int:group_id>/export', methods=['GET'])
+def export_group(group_id):
+    fmt = request.args.get('format', 'ndjson')
+    records = request.args.get('records', 'debts')
+
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    if records not in EXPORT_QUERIES:
+        return jsonify({'error': 'records must be debts or expenses'}), 400
+
+    # The stream outlives the view, so it gets its own connection instead of
+    # the request-scoped one; close_export hands it back when the body is done.
+    try:
+        connection = get_pool().checkout()
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+    try:
+        cursor = connection.cursor(buffered=True)
+        cursor.execute("SELECT GroupID FROM groupsaldo WHERE GroupID = %s AND DeletedAt IS NULL", (group_id,))
+        found = cursor.fetchone()
+        cursor.close()
+        if not found:
+            connection.close()
+            return jsonify({'error': 'Group not found'}), 404
+
+        cursor = open_export(connection, records, group_id)
+    except Error as e:
+        connection.close()
+        return jsonify({'error': str(e)}), 500
+
+    response = Response(stream_rows(cursor, fmt), mimetype=EXPORT_FORMATS[fmt])
+    response.call_on_close(lambda: close_export(cursor, connection))
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename=group-{group_id}-{records}.{fmt}')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @groups.route('/groups/<int:group_id>/debts', methods=['POST'])
 def add_group_debt(group_id):
     data = request.json
@@ -218,50 +497,168 @@ def add_group_debt(group_id):
 
     if not all([from_user_id, to_user_id, amount]):
         return jsonify({'error': 'Missing required fields'}), 400
+    if str(from_user_id) == str(to_user_id):
+        return jsonify({'error': 'A user cannot owe themselves'}), 400
 
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        if not live_group(cursor, group_id, lock=True):
+            return jsonify({'error': 'Group not found'}), 404
 
         cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM groupmembers 
-            WHERE GroupID = %s AND UserID IN (%s, %s)
+            SELECT gm.UserID, u.Currency
+            FROM groupmembers gm
+            JOIN users u ON u.UserID = gm.UserID
+            WHERE gm.GroupID = %s AND gm.UserID IN (%s, %s)
         """, (group_id, from_user_id, to_user_id))
+        currencies = {row['UserID']: row['Currency'] for row in cursor.fetchall()}
         
-        if cursor.fetchone()['count'] != 2:
+        if len(currencies) != 2:
             return jsonify({'error': 'Users must be members of the group'}), 400
 
+        # Defaults to the currency of the member who is owed
+        currency = choose_currency(
+            rate_cache.rates(cursor), data.get('currency'), currencies.get(int(to_user_id)))
+
         cursor.execute("""
             INSERT INTO debts 
-            (FromUserID, ToUserID, Amount, Description, Status, GroupID)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (from_user_id, to_user_id, amount, description, status, group_id))
+            (FromUserID, ToUserID, Amount, Currency, Description, Status, GroupID)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (from_user_id, to_user_id, amount, currency, description, status, group_id))
         
         debt_id = cursor.lastrowid
 
+        new_debts = [{
+            'GroupID': group_id,
+            'FromUserID': int(from_user_id),
+            'ToUserID': int(to_user_id),
+            'Amount': amount,
+            'Currency': currency,
+            'Status': status
+        }]
+        record_debt_change(cursor, after=new_debts)
+        record_stats_change(cursor, after=new_debts)
+
+        enqueue(cursor, DEBT_ADDED, [
+            debt_event(debt_id, from_user_id, to_user_id, amount, currency)
+        ])
+        
+        connection.commit()
+        wake_worker()
+        return jsonify({'message': 'Debt added successfully', 'debtId': debt_id}), 201
+
+    except FxError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        logger.exception("Error adding debt to group %s", group_id)
+        if 'connection' in locals():
+            connection.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
+
+@groups.route('/groups/<int:group_id>/expenses/split', methods=['POST'])
+def split_group_expense(group_id):
+    data = request.json or {}
+    payer_id = data.get('paidByUserId')
+    description = data.get('description', '')
+    split = data.get('split') or {}
+
+    if not payer_id or data.get('amount') is None:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    try:
+        payer_id = int(payer_id)
+        total = to_amount(data.get('amount'))
+        if total <= 0:
+            return jsonify({'error': 'Amount must be greater than zero'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        if not live_group(cursor, group_id, lock=True):
+            return jsonify({'error': 'Group not found'}), 404
+
+        # Membership check and name lookup for every participant in one query
         cursor.execute("""
-            SELECT Name FROM users WHERE UserID = %s
-        """, (from_user_id,))
-        from_user = cursor.fetchone()
-        from_user_name = from_user['Name'] if from_user else 'Someone'
+            SELECT u.UserID, u.Name, u.Currency
+            FROM groupmembers gm
+            JOIN users u ON u.UserID = gm.UserID
+            WHERE gm.GroupID = %s
+        """, (group_id,))
+        members = cursor.fetchall()
+        names = {row['UserID']: row['Name'] for row in members}
+        currencies = {row['UserID']: row['Currency'] for row in members}
+
+        try:
+            shares = split_shares(total, split, list(names))
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        if payer_id not in names or any(user_id not in names for user_id, _ in shares):
+            return jsonify({'error': 'Users must be members of the group'}), 400
+
+        owed = [(user_id, amount) for user_id, amount in shares
+                if user_id != payer_id and amount > 0]
+        if not owed:
+            return jsonify({'error': 'Nobody owes anything for this expense'}), 400
 
+        # Defaults to the payer's currency
+        currency = choose_currency(
+            rate_cache.rates(cursor), data.get('currency'), currencies[payer_id])
+
+        cursor.executemany("""
+            INSERT INTO debts 
+            (FromUserID, ToUserID, Amount, Currency, Description, Status, GroupID)
+            VALUES (%s, %s, %s, %s, %s, 'pending', %s)
+        """, [(user_id, payer_id, amount, currency, description, group_id)
+              for user_id, amount in owed])
+
+        # IDs of a multi-row INSERT need not be consecutive, so read them back. The
+        # lowest is lastrowid, rows of other writers that commit later are not in
+        # this transaction's snapshot, and each debtor appears once
         cursor.execute("""
-            INSERT INTO notifications 
-            (UserID, Title, Message, Type, RelatedID) 
-            VALUES (%s, %s, %s, 'debt', %s)
-        """, (
-            to_user_id,
-            "New Debt Added",
-            f"{from_user_name} owes you ${amount}",
-            debt_id
-        ))
-        
+            SELECT DebtID, FromUserID FROM debts
+            WHERE DebtID >= %s AND GroupID = %s AND ToUserID = %s
+            ORDER BY DebtID
+        """, (cursor.lastrowid, group_id, payer_id))
+        inserted = {row['FromUserID']: row['DebtID'] for row in cursor.fetchall()}
+        debt_ids = [inserted[user_id] for user_id, _ in owed]
+
+        new_debts = [{
+            'GroupID': group_id,
+            'FromUserID': user_id,
+            'ToUserID': payer_id,
+            'Amount': amount,
+            'Currency': currency,
+            'Status': 'pending'
+        } for user_id, amount in owed]
+        record_debt_change(cursor, after=new_debts)
+        record_stats_change(cursor, after=new_debts)
+
+        enqueue(cursor, DEBT_ADDED, [
+            debt_event(debt_id, user_id, payer_id, amount, currency)
+            for (user_id, amount), debt_id in zip(owed, debt_ids)
+        ])
+
         connection.commit()
-        return jsonify({'message': 'Debt added successfully', 'debtId': debt_id}), 201
+        wake_worker()
+        return jsonify({
+            'message': 'Expense split successfully',
+            'debtIds': debt_ids,
+            'currency': currency
+        }), 201
 
+    except FxError as e:
+        return jsonify({'error': str(e)}), 400
     except Error as e:
-        print(f"Error adding debt: {str(e)}")
+        logger.exception("Error splitting expense in group %s", group_id)
         if 'connection' in locals():
             connection.rollback()
         return jsonify({'error': str(e)}), 500
@@ -276,11 +673,18 @@ def delete_debt(group_id, debt_id):
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        if not live_group(cursor, group_id, lock=True):
+            return jsonify({'error': 'Group not found'}), 404
+
+        removed = fetch_debts_for_update(cursor, "DebtID = %s", (debt_id,))
         
         cursor.execute("""
             DELETE FROM debts 
             WHERE DebtID = %s
         """, (debt_id,))
+
+        record_debt_change(cursor, before=removed)
+        record_stats_change(cursor, before=removed)
         
         connection.commit()
         return jsonify({'message': 'Debt deleted successfully'}), 200
@@ -300,40 +704,32 @@ def mark_debt_paid(group_id, debt_id):
     try:
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
+        if not live_group(cursor, group_id, lock=True):
+            return jsonify({'error': 'Group not found'}), 404
+
+        previous = fetch_debts_for_update(
+            cursor, "DebtID = %s AND GroupID = %s", (debt_id, group_id))
         
+        if not previous:
+            return jsonify({'error': 'Debt not found'}), 404
+
         cursor.execute("""
             UPDATE debts 
             SET Status = 'paid' 
             WHERE DebtID = %s AND GroupID = %s
         """, (debt_id, group_id))
-        
-        if cursor.rowcount == 0:
-            return jsonify({'error': 'Debt not found'}), 404
+
+        updated = [dict(previous[0], Status='paid')]
+        record_debt_change(cursor, before=previous, after=updated)
+        record_stats_change(cursor, before=previous, after=updated)
+
+        debt = previous[0]
+        enqueue(cursor, DEBT_PAID, [
+            debt_event(debt_id, debt['FromUserID'], debt['ToUserID'], debt['Amount'], debt['Currency'])
+        ])
             
         connection.commit()
-        
-        cursor.execute("""
-            SELECT d.*, u1.Name as FromUserName, u2.Name as ToUserName
-            FROM debts d
-            JOIN users u1 ON d.FromUserID = u1.UserID
-            JOIN users u2 ON d.ToUserID = u2.UserID
-            WHERE d.DebtID = %s
-        """, (debt_id,))
-        
-        debt = cursor.fetchone()
-        
-        cursor.execute("""
-            INSERT INTO notifications 
-            (UserID, Title, Message, Type, RelatedID)
-            VALUES (%s, %s, %s, 'payment', %s)
-        """, (
-            debt['ToUserID'],
-            "Debt Paid",
-            f"{debt['FromUserName']} paid their debt of ${debt['Amount']}",
-            debt_id
-        ))
-        
-        connection.commit()
+        wake_worker()
         return jsonify({'message': 'Debt marked as paid'}), 200
 
     except Error as e:
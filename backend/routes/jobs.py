@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify
+from ..database_config import get_db_connection
+from mysql.connector import Error
+from ..utils.jobs import get_job
+
+jobs = Blueprint('jobs', __name__)
+
+@jobs.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job_status(job_id):
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+
+        job = get_job(cursor, job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job), 200
+
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'connection' in locals():
+            connection.close()
@@ -0,0 +1,59 @@
+from flask import Blueprint, Response
+from ..database_config import get_pool
+from ..utils import instrumentation
+from ..utils.cache import get_cache
+from ..utils.compression import body_cache
+from ..utils.hashing import hasher
+from ..utils.outbox import stats as outbox_stats
+from ..utils.token_cache import token_cache
+from ..utils.structured_logging import logging_stats
+
+metrics = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def runtime_gauges():
+    pool = get_pool().stats()
+    gauges = [
+        ('saldo_db_pool_connections', 'Pooled connections by state.', {'state': state}, pool[key])
+        for state, key in (('open', 'open'), ('in_use', 'inUse'), ('idle', 'idle'))
+    ]
+    gauges += [
+        ('saldo_db_pool_checkouts', 'Connections checked out by this worker.', {}, pool['checkouts']),
+        ('saldo_db_pool_timeouts', 'Checkouts that timed out in this worker.', {}, pool['timeouts']),
+    ]
+    for family, counts in get_cache().stats().items():
+        gauges.append(('saldo_cache_hit_ratio', 'Read-through cache hit ratio.',
+                       {'family': family}, counts['hitRatio']))
+    tokens = token_cache.stats()
+    gauges += [
+        ('saldo_token_cache_hit_ratio', 'Verified token cache hit ratio.', {}, tokens['hitRatio']),
+        ('saldo_token_cache_entries', 'Verified tokens cached.', {}, tokens['size']),
+    ]
+    outbox = outbox_stats.snapshot()
+    gauges += [
+        ('saldo_outbox_lag_seconds', 'Age of the oldest event in the last outbox batch.', {}, outbox['lagSeconds']),
+        ('saldo_outbox_events', 'Outbox events drained by this worker.', {}, outbox['eventsTotal']),
+        ('saldo_outbox_dead_events', 'Outbox events this worker gave up on.', {}, outbox['deadTotal']),
+    ]
+    hashing = hasher.stats()
+    gauges += [
+        ('saldo_password_hash_in_flight', 'Password hashes queued or running.', {}, hashing['inFlight']),
+        ('saldo_password_hash_rejected', 'Password hashes rejected as busy.', {}, hashing['rejected']),
+    ]
+    logs = logging_stats()
+    gauges += [
+        ('saldo_log_queue_depth', 'Log records waiting to be written.', {}, logs['queued']),
+        ('saldo_log_records_dropped', 'Log records dropped because the queue was full.', {}, logs['dropped']),
+    ]
+    gauges.append(('saldo_http_compression_cache_entries', 'Compressed bodies cached by ETag.', {}, len(body_cache)))
+    return gauges
+
+
+instrumentation.register_collector(runtime_gauges)
+
+
+@metrics.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(instrumentation.exposition(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,9 +1,39 @@
-from flask import Blueprint, jsonify, request
+import json
+import logging
+import zlib
+from flask import Blueprint, Response, jsonify, request
 from mysql.connector import Error
 from ..database_config import get_db_connection
+from ..utils.pagination import page_args, paginate, paged_response, PaginationError
+from ..utils.pubsub import get_hub, user_channel
+from ..utils.notification_state import (
+    bump_notification_state, forget_notification_state, get_notification_state
+)
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEEPALIVE_SECONDS = 15
 
 notifications = Blueprint('notifications', __name__)
 
+def _not_modified(state, etag):
+    if request.if_none_match:
+        # Weak comparison: compressed responses carry the ETag as W/"..."
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    if not (since and state['lastChanged']):
+        return False
+    # HTTP dates have whole seconds: a change later in the second the client's
+    # copy is dated must still count, so only an earlier second is unchanged
+    return state['lastChanged'].replace(microsecond=0) < since
+
+def _conditional(response, state, etag):
+    response.set_etag(etag)
+    if state['lastChanged']:
+        response.last_modified = state['lastChanged']
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @notifications.route('/notifications', methods=['GET'])
 def get_notifications():
     user_id = request.args.get('userId')
@@ -11,17 +41,41 @@ def get_notifications():
         return jsonify({'error': 'User ID is required'}), 400
 
     try:
+        after, limit = page_args(request.args, key_size=2)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        state = get_notification_state(user_id)
+        # The version covers the user's whole list; the query string tells pages apart
+        etag = f"{state['version']}-{zlib.crc32(request.query_string):x}"
+        if _not_modified(state, etag):
+            return _conditional(Response(status=304), state, etag)
+
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT * FROM notifications 
-            WHERE UserID = %s 
-            ORDER BY CreatedDate DESC
-        """, (user_id,))
+        if after:
+            cursor.execute("""
+                SELECT * FROM notifications 
+                WHERE UserID = %s
+                AND (CreatedDate < %s OR (CreatedDate = %s AND NotificationID < %s))
+                ORDER BY CreatedDate DESC, NotificationID DESC
+                LIMIT %s
+            """, (user_id, after[0], after[0], after[1], limit + 1))
+        else:
+            cursor.execute("""
+                SELECT * FROM notifications 
+                WHERE UserID = %s 
+                ORDER BY CreatedDate DESC, NotificationID DESC
+                LIMIT %s
+            """, (user_id, limit + 1))
         
-        notifications = cursor.fetchall()
-        return jsonify(notifications)
+        notifications, next_cursor = paginate(
+            cursor.fetchall(), limit,
+            lambda n: [n['CreatedDate'], n['NotificationID']])
+        return _conditional(
+            paged_response(jsonify(notifications), next_cursor), state, etag)
 
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -31,6 +85,52 @@ def get_notifications():
         if 'connection' in locals():
             connection.close()
 
+@notifications.route('/notifications/unread-count', methods=['GET'])
+def get_unread_count():
+    user_id = request.args.get('userId')
+    if not user_id:
+        return jsonify({'error': 'User ID is required'}), 400
+
+    try:
+        state = get_notification_state(user_id)
+        etag = f"{state['version']}-count"
+        if _not_modified(state, etag):
+            return _conditional(Response(status=304), state, etag)
+
+        return _conditional(jsonify({
+            'unreadCount': state['unreadCount'],
+            'version': state['version']
+        }), state, etag)
+
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+@notifications.route('/notifications/stream', methods=['GET'])
+def stream_notifications():
+    # EventSource cannot send custom headers, so the user comes in the query
+    # string like GET /notifications. Each open stream holds a worker thread,
+    # so run gunicorn with threaded or gevent workers.
+    user_id = request.args.get('userId')
+    if not user_id:
+        return jsonify({'error': 'User ID is required'}), 400
+
+    subscription = get_hub().subscribe(user_channel(user_id))
+
+    def events():
+        yield f'retry: {STREAM_KEEPALIVE_SECONDS * 1000}\n\n'
+        while True:
+            event = subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: notification\ndata: {json.dumps(event, default=str)}\n\n"
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.call_on_close(subscription.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @notifications.route('/notifications/mark-read', methods=['POST'])
 def mark_notification_read():
     data = request.json
@@ -39,45 +139,32 @@ def mark_notification_read():
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
-        
+
         cursor.execute("""
-            UPDATE notifications 
-            SET IsRead = TRUE 
-            WHERE NotificationID = %s
+            SELECT UserID FROM notifications 
+            WHERE NotificationID = %s AND IsRead = FALSE
+            FOR UPDATE
         """, (notification_id,))
+        unread = cursor.fetchone()
+        
+        if unread:
+            cursor.execute("""
+                UPDATE notifications 
+                SET IsRead = TRUE 
+                WHERE NotificationID = %s
+            """, (notification_id,))
+            bump_notification_state(cursor, {unread[0]: -1})
         
         connection.commit()
+        if unread:
+            forget_notification_state(unread[0])
         return jsonify({'message': 'Notification marked as read'}), 200
 
     except Error as e:
-        print(f"Mark read error: {str(e)}")
+        logger.exception("Error marking notifications read")
         return jsonify({'error': str(e)}), 500
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'connection' in locals():
             connection.close()
-
-def create_debt_notification(user_id, from_user_name, amount, debt_id):
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        title = "New Debt Added"
-        message = f"{from_user_name} owes you ${amount}"
-        
-        cursor.execute("""
-            INSERT INTO notifications 
-            (UserID, Title, Message, Type, RelatedID) 
-            VALUES (%s, %s, %s, 'debt', %s)
-        """, (user_id, title, message, debt_id))
-        
-        connection.commit()
-
-    except Error as e:
-        print(f"Create notification error: {str(e)}")
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'connection' in locals():
-            connection.close()
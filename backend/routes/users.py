@@ -1,14 +1,38 @@
+import logging
 import sys
 import os
 from flask import Blueprint, request, jsonify, make_response
 from backend.database_config import get_db_connection
-from werkzeug.security import generate_password_hash, check_password_hash
 from mysql.connector import Error
-from ..utils.auth import generate_token, token_required
+from ..utils.auth import generate_token, token_required, revoke_bearer_token, revoke_user_tokens
 from ..utils.password_validator import validate_password
+from ..utils.pagination import page_args, paginate, paged_response, PaginationError
+from ..utils.user_search import search_index, index_user, unindex_user, start_index_listener
+from ..utils.hashing import hasher, HashingBusy
+from ..utils.rate_limit import TokenBucketLimiter
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULT_LIMIT = 10
+
+# Login attempts per minute (also the burst size) per email and per client IP
+LOGIN_ATTEMPTS_PER_EMAIL = int(os.environ.get('LOGIN_ATTEMPTS_PER_EMAIL', 5))
+LOGIN_ATTEMPTS_PER_IP = int(os.environ.get('LOGIN_ATTEMPTS_PER_IP', 30))
+
+login_email_limiter = TokenBucketLimiter(LOGIN_ATTEMPTS_PER_EMAIL / 60, LOGIN_ATTEMPTS_PER_EMAIL)
+login_ip_limiter = TokenBucketLimiter(LOGIN_ATTEMPTS_PER_IP / 60, LOGIN_ATTEMPTS_PER_IP)
 
 users = Blueprint('users', __name__)
 
+def _retry_later(message, status, retry_after):
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response, status
+
+@users.errorhandler(HashingBusy)
+def hashing_busy(e):
+    return _retry_later(str(e), 503, 1)
+
 @users.route('/users', methods=['POST'])
 def add_user():
     data = request.json
@@ -21,24 +45,20 @@ def add_user():
     if not all([name, email, password]):
         return jsonify({'error': 'Name, email, and password are required!'}), 400
 
+    hashed_password = hasher.hash_password(password)
+
     connection = get_db_connection()
     cursor = connection.cursor()
 
     try:
-        hashed_password = generate_password_hash(password)
         cursor.execute("""
             INSERT INTO Users (Name, Email, Phone, Password, Currency)
-            VALUES (:name, :email, :phone, :password, :currency)
-        """, {
-            'name': name,
-            'email': email,
-            'phone': phone,
-            'password': hashed_password,
-            'currency': currency
-        })
+            VALUES (%s, %s, %s, %s, %s)
+        """, (name, email, phone, hashed_password, currency))
         connection.commit()
+        index_user(cursor.lastrowid, name, email)
     except Exception as e:
-        print(f"Error during user creation: {e}")
+        logger.exception("Error during user creation")
         connection.rollback()
         return jsonify({'error': f'Failed to add user: {str(e)}'}), 500
     finally:
@@ -49,22 +69,34 @@ def add_user():
 
 @users.route('/users', methods=['GET'])
 def get_users():
+    try:
+        after, limit = page_args(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
     connection = get_db_connection()
     cursor = connection.cursor()
 
     try:
-        cursor.execute("SELECT * FROM Users")
+        cursor.execute("""
+            SELECT * FROM Users
+            WHERE UserID > %s
+            ORDER BY UserID
+            LIMIT %s
+        """, (after[0] if after else 0, limit + 1))
         rows = cursor.fetchall()
         columns = [col[0] for col in cursor.description]
-        result = [dict(zip(columns, row)) for row in rows]
+        result, next_cursor = paginate(
+            [dict(zip(columns, row)) for row in rows], limit,
+            lambda user: [user['UserID']])
     except Exception as e:
-        print(f"Error retrieving users: {e}")
+        logger.exception("Error retrieving users")
         return jsonify({'error': f'Failed to retrieve users: {str(e)}'}), 500
     finally:
         cursor.close()
         connection.close()
 
-    return jsonify(result), 200
+    return paged_response(jsonify(result), next_cursor), 200
 
 @users.route('/users/<int:user_id>', methods=['GET'])
 @token_required
@@ -123,19 +155,24 @@ def update_password(user_id):
         if not user:
             return jsonify({'error': 'User not found'}), 404
             
-        if not check_password_hash(user['Password'], current_password):
+        matches, _ = hasher.verify_password(user['Password'], current_password)
+        if not matches:
             return jsonify({'error': 'Current password is incorrect'}), 400
 
-        hashed_password = generate_password_hash(new_password)
+        hashed_password = hasher.hash_password(new_password)
         cursor.execute("""
             UPDATE users 
             SET Password = %s 
             WHERE UserID = %s
         """, (hashed_password, user_id))
         
+        revoke_user_tokens(cursor, user_id)
         connection.commit()
         
-        return jsonify({'message': 'Password updated successfully'}), 200
+        return jsonify({
+            'message': 'Password updated successfully',
+            'token': generate_token(user_id)
+        }), 200
 
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -158,18 +195,27 @@ def search_users():
 
     try:
         connection = get_db_connection()
+        start_index_listener()
+        search_index.refresh(connection)
+
+        # Over-fetch a little: matches deleted by another worker drop out below
+        user_ids = search_index.search(
+            term, limit=SEARCH_RESULT_LIMIT * 2,
+            exclude=int(current_user_id) if current_user_id.isdigit() else None)
+        if not user_ids:
+            return jsonify([]), 200
+
         cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("""
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        cursor.execute(f"""
             SELECT UserID, Name, Email 
             FROM Users 
-            WHERE (Name LIKE %s OR Email LIKE %s)
-            AND UserID != %s
-            LIMIT 10
-        """, (f'%{term}%', f'%{term}%', current_user_id))
+            WHERE UserID IN ({placeholders})
+        """, user_ids)
         
-        users = cursor.fetchall()
-        return jsonify(users), 200
+        found = {user['UserID']: user for user in cursor.fetchall()}
+        users = [found[user_id] for user_id in user_ids if user_id in found]
+        return jsonify(users[:SEARCH_RESULT_LIMIT]), 200
 
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -185,14 +231,15 @@ def delete_user(user_id):
     cursor = connection.cursor()
 
     try:
-        cursor.execute("DELETE FROM Users WHERE UserID = :user_id", {'user_id': user_id})
+        cursor.execute("DELETE FROM Users WHERE UserID = %s", (user_id,))
         connection.commit()
 
         if cursor.rowcount == 0:
             return jsonify({'error': 'User not found!'}), 404
+        unindex_user(user_id)
     except Exception as e:
         connection.rollback()
-        print(f"Error deleting user: {e}")
+        logger.exception("Error deleting user %s", user_id)
         return jsonify({'error': f'Failed to delete user: {str(e)}'}), 500
     finally:
         cursor.close()
@@ -219,7 +266,7 @@ def register():
         if cursor.fetchone():
             return jsonify({'error': 'Email already registered'}), 400
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hasher.hash_password(password)
 
         cursor.execute("""
             INSERT INTO users (Name, Email, Password, Phone, Currency)
@@ -227,6 +274,7 @@ def register():
         """, (name, email, hashed_password, phone, 'USD'))  
 
         connection.commit()
+        index_user(cursor.lastrowid, name, email)
         return jsonify({'message': 'Registration successful'}), 201
 
     except Error as e:
@@ -247,6 +295,12 @@ def login():
         if not email or not password:
             return jsonify({'error': 'Email and password are required'}), 400
 
+        # Throttle before touching the database or the hashing pool
+        retry_after = (login_ip_limiter.acquire(request.remote_addr)
+                       or login_email_limiter.acquire(email.strip().casefold()))
+        if retry_after:
+            return _retry_later('Too many login attempts, try again later', 429, retry_after)
+
         connection = get_db_connection()
         cursor = connection.cursor(dictionary=True)
 
@@ -257,8 +311,16 @@ def login():
         """, (email,))
 
         user = cursor.fetchone()
-
-        if user and check_password_hash(user['Password'], password):
+        matches, upgraded = (hasher.verify_password(user['Password'], password)
+                             if user else (False, None))
+
+        if matches:
+            if upgraded:
+                # Stored hash predates the current parameters; swap it now we know the password
+                cursor.execute("""
+                    UPDATE users SET Password = %s WHERE UserID = %s
+                """, (upgraded, user['UserID']))
+                connection.commit()
             token = generate_token(user['UserID'])
             return jsonify({
                 'token': token,
@@ -276,10 +338,16 @@ def login():
         if 'connection' in locals():
             connection.close()
 
+@users.route('/users/logout', methods=['POST'])
+@token_required
+def logout(current_user_id):
+    revoke_bearer_token(request.headers.get('Authorization'))
+    return jsonify({'message': 'Logged out successfully'}), 200
+
 @users.route('/users/profile', methods=['GET'])
 def get_user_profile():
     user_id = request.headers.get('User-ID')
-    print(f"Debug - User ID from header: {user_id}")
+    logger.debug("Profile requested", extra={'userId': user_id})
     
     if not user_id:
         return jsonify({'error': 'User ID is required'}), 400
@@ -297,7 +365,7 @@ def get_user_profile():
         cursor.execute(query, (user_id,))
         user = cursor.fetchone()
         
-        print(f"Debug - Query result: {user}")
+        logger.debug("Profile lookup", extra={'userId': user_id, 'found': user is not None})
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -310,7 +378,7 @@ def get_user_profile():
         return jsonify(result), 200
         
     except Error as e:
-        print(f"Debug - Database error: {str(e)}")
+        logger.exception("Error loading profile for user %s", user_id)
         return jsonify({'error': str(e)}), 500
     finally:
         if 'cursor' in locals():
@@ -340,18 +408,22 @@ def change_password():
         
         user = cursor.fetchone()
         
-        if not user or not check_password_hash(user['Password'], current_password):
+        if not user or not hasher.verify_password(user['Password'], current_password)[0]:
             return jsonify({'error': 'Current password is incorrect'}), 401
             
-        hashed_password = generate_password_hash(new_password)
+        hashed_password = hasher.hash_password(new_password)
         cursor.execute("""
             UPDATE Users 
             SET Password = %s 
             WHERE UserID = %s
         """, (hashed_password, user_id))
         
+        revoke_user_tokens(cursor, user_id)
         connection.commit()
-        return jsonify({'message': 'Password updated successfully'}), 200
+        return jsonify({
+            'message': 'Password updated successfully',
+            'token': generate_token(int(user_id))
+        }), 200
         
     except Error as e:
         return jsonify({'error': str(e)}), 500
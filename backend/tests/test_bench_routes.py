@@ -0,0 +1,21 @@
+from backend.benchmarks.bench_routes import percentile, summarize, compare
+
+
+def test_percentiles_use_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    result = summarize('GET /groups', 'flask', values, 0, 2.0, 250)
+
+    assert percentile(values, 0.5) == 0.05
+    assert (result['p50Ms'], result['p95Ms'], result['p99Ms']) == (50.0, 95.0, 99.0)
+    assert result['throughput'] == 50.0
+    assert result['queriesPerRequest'] == 2.5
+
+
+def test_compare_flags_latency_and_query_regressions():
+    def report(p95, queries):
+        return {'meta': {}, 'results': [
+            {'route': 'GET /groups', 'mode': 'flask', 'p95Ms': p95, 'queriesPerRequest': queries}]}
+
+    assert compare(report(10.0, 2), report(11.0, 2), 0.15, 0.5)[1] == []
+    assert len(compare(report(10.0, 2), report(12.0, 2), 0.15, 0.5)[1]) == 1
+    assert len(compare(report(10.0, 2), report(10.0, 3), 0.15, 0.5)[1]) == 1
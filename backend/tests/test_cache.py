@@ -0,0 +1,100 @@
+import time
+from backend.utils.cache import LocalBackend, ReadThroughCache, _MISSING
+
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_read_through_counts_hits_per_family():
+    cache = ReadThroughCache(ttl=60)
+    group = Loader({'GroupID': 1})
+    members = Loader([])
+
+    assert cache.get_or_load('group', 1, group) == {'GroupID': 1}
+    assert cache.get_or_load('group', 1, group) == {'GroupID': 1}
+    cache.get_or_load('group_members', 1, members)
+
+    assert group.calls == 1
+    stats = cache.stats()
+    assert stats['group']['hits'] == 1 and stats['group']['hitRatio'] == 0.5
+    assert stats['group_members']['misses'] == 1
+
+
+def test_missing_rows_are_cached_until_invalidated():
+    cache = ReadThroughCache(ttl=60)
+    loader = Loader(None)
+
+    assert cache.get_or_load('group', 7, loader) is None
+    assert cache.get_or_load('group', 7, loader) is None
+    assert loader.calls == 1
+
+    cache.invalidate(('group', 7))
+    loader.value = {'GroupID': 7}
+    assert cache.get_or_load('group', 7, loader) == {'GroupID': 7}
+    assert cache.stats()['group']['invalidations'] == 1
+
+
+def test_entries_expire():
+    cache = ReadThroughCache(ttl=0.01)
+    loader = Loader('x')
+
+    cache.get_or_load('user_groups', '3', loader)
+    time.sleep(0.02)
+    cache.get_or_load('user_groups', 3, loader)
+    assert loader.calls == 2
+
+
+def test_lru_evicts_least_recently_used():
+    backend = LocalBackend(max_size=2)
+    for key in 'abc':
+        backend.set(key, key, 60)
+    assert backend.get('a') is _MISSING
+    assert backend.get('c') == 'c'
+
+
+def test_shared_backend_serves_other_workers():
+    shared = LocalBackend()
+    first = ReadThroughCache(shared=shared, ttl=60)
+    second = ReadThroughCache(shared=shared, ttl=60)
+    loader = Loader(['group'])
+
+    first.get_or_load('user_groups', 1, loader)
+    assert second.get_or_load('user_groups', 1, loader) == ['group']
+    assert loader.calls == 1
+
+    first.invalidate(('user_groups', 1))
+    second.evict_local(['user_groups:1'])
+    second.get_or_load('user_groups', 1, loader)
+    assert loader.calls == 2
+
+
+def test_local_ttl_is_capped_without_a_shared_backend_or_broker():
+    # Invalidations stay in this process, so other workers would serve stale copies
+    assert ReadThroughCache(ttl=300, local_ttl=5).local_ttl == 5
+    assert ReadThroughCache(ttl=300, local_ttl=5, broadcast=True).local_ttl == 300
+    assert ReadThroughCache(shared=LocalBackend(), ttl=300, local_ttl=5, broadcast=True).local_ttl == 5
+
+
+def test_load_overtaken_by_an_invalidation_is_not_cached():
+    shared = LocalBackend()
+    cache = ReadThroughCache(shared=shared, ttl=60)
+    fresh = Loader(['ayse', 'mehmet'])
+
+    def stale_load():
+        # Read before the writer committed; it invalidates before this returns
+        cache.invalidate(('group_members', 3))
+        return ['ayse']
+
+    assert cache.get_or_load('group_members', 3, stale_load) == ['ayse']
+    assert shared.get('group_members:3') is _MISSING
+    assert cache.get_or_load('group_members', 3, fresh) == ['ayse', 'mehmet']
+    assert cache.get_or_load('group_members', 3, fresh) == ['ayse', 'mehmet']
+    assert fresh.calls == 1
+    assert not cache._loading
@@ -0,0 +1,91 @@
+import gzip
+import zlib
+import pytest
+from flask import Flask, Response, jsonify
+from backend.utils import compression
+from backend.utils.instrumentation import registry
+
+ROWS = [{'DebtID': i, 'FromUserName': 'Ada Lovelace', 'ToUserName': 'Bob Builder'} for i in range(100)]
+
+
+def saved_bytes():
+    counters = registry.snapshot()['counters']
+    return sum(value for name, _, value in counters if name == 'saldo_http_compression_saved_bytes_total')
+
+
+@pytest.fixture
+def client():
+    registry.clear()
+    compression.body_cache.clear()
+    app = Flask(__name__)
+    compression.init_app(app)
+
+    @app.route('/rows')
+    def rows():
+        return jsonify(ROWS)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/tagged')
+    def tagged():
+        response = jsonify(ROWS)
+        response.set_etag('v1')
+        return response
+
+    @app.route('/stream')
+    def stream():
+        return Response((b'x' * 1000 for _ in range(3)), mimetype='text/plain')
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize('accept, encoding, decode', [
+    ('gzip', 'gzip', gzip.decompress),
+    ('deflate', 'deflate', zlib.decompress),
+    ('deflate;q=1, gzip;q=0.5', 'deflate', zlib.decompress),
+])
+def test_negotiates_encoding(client, accept, encoding, decode):
+    response = client.get('/rows', headers={'Accept-Encoding': accept})
+
+    assert response.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert int(response.headers['Content-Length']) == len(response.data)
+    assert decode(response.data) == client.get('/rows').data
+
+
+def test_leaves_identity_small_and_streamed_responses(client):
+    plain = client.get('/rows')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    assert 'Content-Encoding' not in client.get('/rows', headers={'Accept-Encoding': 'gzip;q=0'}).headers
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    streamed = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in streamed.headers
+    assert streamed.data == b'x' * 3000
+
+
+def test_caches_compressed_body_by_etag(client, monkeypatch):
+    calls = []
+    real_compress = compression.compress
+    monkeypatch.setattr(compression, 'compress', lambda data, encoding: calls.append(encoding) or real_compress(data, encoding))
+
+    first = client.get('/tagged', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/tagged', headers={'Accept-Encoding': 'gzip'})
+
+    assert calls == ['gzip']
+    assert second.data == first.data
+    assert second.headers['ETag'] == 'W/"v1"'
+    assert len(compression.body_cache) == 1
+
+    client.get('/rows', headers={'Accept-Encoding': 'gzip'})
+    client.get('/rows', headers={'Accept-Encoding': 'gzip'})
+    assert calls == ['gzip', 'gzip', 'gzip']
+
+
+def test_reports_bytes_saved(client):
+    response = client.get('/rows', headers={'Accept-Encoding': 'gzip'})
+
+    assert saved_bytes() == len(gzip.decompress(response.data)) - len(response.data)
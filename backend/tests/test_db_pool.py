@@ -0,0 +1,102 @@
+import threading
+import pytest
+from flask import Flask
+from backend import database_config
+from backend.utils.db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.rollbacks = 0
+        self.alive = True
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise Exception('gone away')
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    return ConnectionPool(connect, **kwargs), created
+
+
+def test_connections_are_reused():
+    pool, created = make_pool(size=2)
+    first = pool.checkout()
+    first.close()
+    second = pool.checkout()
+    assert len(created) == 1
+    assert second._raw is created[0]
+    assert created[0].rollbacks == 1
+
+
+def test_overflow_connections_are_closed_on_release():
+    pool, created = make_pool(size=1, max_overflow=1)
+    a = pool.checkout()
+    b = pool.checkout()
+    assert pool.stats()['overflow'] == 1
+    a.close()
+    b.close()
+    stats = pool.stats()
+    assert stats['open'] == 1
+    assert stats['idle'] == 1
+    assert sum(c.closed for c in created) == 1
+
+
+def test_checkout_times_out_when_exhausted():
+    pool, _ = make_pool(size=1, max_overflow=0, timeout=0.05)
+    pool.checkout()
+    with pytest.raises(PoolTimeoutError):
+        pool.checkout()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool, created = make_pool(size=1, max_overflow=0, timeout=2)
+    held = pool.checkout()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout()))
+    waiter.start()
+    held.close()
+    waiter.join(2)
+    assert got and got[0]._raw is created[0]
+    assert pool.stats()['waitMaxSeconds'] > 0
+
+
+def test_dead_connection_is_replaced_by_pre_ping():
+    pool, created = make_pool(size=1)
+    pool.checkout().close()
+    created[0].alive = False
+    conn = pool.checkout()
+    assert conn._raw is created[1]
+    assert created[0].closed
+    assert pool.stats()['recycled'] == 1
+
+
+def test_request_gets_one_connection(monkeypatch):
+    pool, created = make_pool(size=2)
+    monkeypatch.setattr(database_config, '_pool', pool)
+    app = Flask(__name__)
+    database_config.init_app(app)
+
+    with app.app_context():
+        first = database_config.get_db_connection()
+        first.close()
+        assert database_config.get_db_connection() is first
+        assert pool.stats()['inUse'] == 1
+
+    assert len(created) == 1
+    assert pool.stats()['inUse'] == 0
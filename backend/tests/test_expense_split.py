@@ -0,0 +1,131 @@
+from decimal import Decimal
+import pytest
+from flask import Flask
+from backend.routes import groups as group_routes
+from backend.utils.expense_split import to_amount, split_shares
+from backend.utils.fx import RateCache
+
+
+def test_equal_split_distributes_leftover_cents():
+    shares = split_shares(to_amount('100'), {'mode': 'equal'}, [1, 2, 3])
+    assert shares == [(1, Decimal('33.34')), (2, Decimal('33.33')), (3, Decimal('33.33'))]
+    assert sum(amount for _, amount in shares) == Decimal('100.00')
+
+
+def test_equal_split_uses_given_participants():
+    shares = split_shares(to_amount(10), {'mode': 'equal', 'userIds': [4, 5]}, [1, 4, 5])
+    assert shares == [(4, Decimal('5.00')), (5, Decimal('5.00'))]
+
+
+def test_exact_split_must_add_up():
+    split = {'mode': 'exact', 'shares': [{'userId': 1, 'amount': 4}, {'userId': 2, 'amount': 5}]}
+    with pytest.raises(ValueError):
+        split_shares(to_amount(10), split, [1, 2])
+
+    split['shares'][1]['amount'] = '6'
+    assert split_shares(to_amount(10), split, [1, 2]) == [(1, Decimal('4.00')), (2, Decimal('6.00'))]
+
+
+def test_invalid_split_specs_are_rejected():
+    with pytest.raises(ValueError):
+        split_shares(to_amount(10), {'mode': 'weights'}, [1])
+    with pytest.raises(ValueError):
+        split_shares(to_amount(10), {'mode': 'equal', 'userIds': [1, 1]}, [1])
+    with pytest.raises(ValueError):
+        to_amount('abc')
+
+
+class FakeCursor:
+    """Members 1-3 in group 5; debt IDs skip values as concurrent inserts can make them."""
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        if 'FROM groupsaldo' in query:
+            self.rows = [{'GroupID': params[0]}]
+        elif 'FROM groupmembers' in query:
+            self.rows = [{'UserID': user_id, 'Name': f'User {user_id}', 'Currency': 'USD'}
+                         for user_id in (1, 2, 3)]
+        elif 'FROM fx_rates' in query:
+            self.rows = [('USD', Decimal(1))]
+        elif 'FROM debts' in query:
+            first_id, group_id, payer_id = params
+            self.rows = [{'DebtID': debt_id, 'FromUserID': row[0]}
+                         for debt_id, row in sorted(self.db.debts.items())
+                         if debt_id >= first_id and row[5] == group_id and row[1] == payer_id]
+
+    def executemany(self, query, seq_params):
+        ids = [self.db.next_id + 2 * i for i in range(len(seq_params))]
+        self.db.debts.update(zip(ids, seq_params))
+        self.lastrowid = ids[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.debts = {}
+        self.next_id = 10
+        self.commits = 0
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    connection = FakeConnection()
+    events = []
+    monkeypatch.setattr(group_routes, 'get_db_connection', lambda: connection)
+    monkeypatch.setattr(group_routes, 'rate_cache', RateCache())
+    monkeypatch.setattr(group_routes, 'record_debt_change', lambda cursor, after: None)
+    monkeypatch.setattr(group_routes, 'record_stats_change', lambda cursor, after: None)
+    monkeypatch.setattr(group_routes, 'enqueue', lambda cursor, event_type, batch: events.extend(batch))
+    monkeypatch.setattr(group_routes, 'wake_worker', lambda: None)
+
+    app = Flask(__name__)
+    app.testing = True
+    app.register_blueprint(group_routes.groups)
+    client = app.test_client()
+    client.connection = connection
+    client.events = events
+    return client
+
+
+def test_split_route_returns_the_inserted_debt_ids(client):
+    response = client.post('/groups/5/expenses/split', json={
+        'paidByUserId': 1, 'amount': '30', 'split': {'mode': 'equal'}})
+
+    assert response.status_code == 201
+    assert response.json['debtIds'] == [10, 12]
+    assert [(event['debtId'], event['fromUserId']) for event in client.events] == [(10, 2), (12, 3)]
+    assert client.connection.commits == 1
+
+
+@pytest.mark.parametrize('split', ['equal', ['mode', 'equal'], {'mode': 'equal', 'userIds': 5},
+                                   {'mode': 'exact', 'shares': ['x']}])
+def test_split_route_rejects_malformed_specs(client, split):
+    response = client.post('/groups/5/expenses/split', json={
+        'paidByUserId': 1, 'amount': '30', 'split': split})
+
+    assert response.status_code == 400
+    assert not client.connection.debts
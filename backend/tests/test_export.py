@@ -0,0 +1,39 @@
+import json
+from decimal import Decimal
+from backend.utils.export import stream_rows
+
+
+class FakeCursor:
+    description = [('DebtID',), ('Amount',), ('Status',)]
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_ndjson_streams_one_chunk_per_batch():
+    cursor = FakeCursor((i, Decimal('1.50'), 'pending') for i in range(5))
+    chunks = list(stream_rows(cursor, 'ndjson', batch_size=2))
+
+    assert len(chunks) == 3
+    lines = ''.join(chunks).splitlines()
+    assert json.loads(lines[0]) == {'DebtID': 0, 'Amount': '1.50', 'Status': 'pending'}
+    assert len(lines) == 5
+
+
+def test_stream_is_lazy():
+    cursor = FakeCursor((i, 1, 'paid') for i in range(10))
+    stream = stream_rows(cursor, 'csv', batch_size=3)
+    first = next(stream)
+
+    assert cursor.fetches == 1
+    assert first.splitlines() == ['DebtID,Amount,Status', '0,1,paid', '1,1,paid', '2,1,paid']
+
+
+def test_empty_csv_has_header():
+    assert list(stream_rows(FakeCursor([]), 'csv')) == ['DebtID,Amount,Status\r\n']
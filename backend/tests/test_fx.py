@@ -0,0 +1,77 @@
+from decimal import Decimal
+import pytest
+from backend.utils.fx import (
+    FxError, RateCache, choose_currency, convert, parse_rates, resolve_currency, to_base_sql
+)
+
+RATES = {'USD': Decimal(1), 'EUR': Decimal('0.8'), 'TRY': Decimal('32')}
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def execute(self, query, params=()):
+        self.queries += 1
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_parse_rates_rebases_to_the_base_currency(tmp_path):
+    csv_file = tmp_path / 'rates.csv'
+    csv_file.write_text('currency,rate\n# ECB reference\neur,0.8\nTRY,32\n')
+    assert parse_rates(str(csv_file)) == {'USD': 1, 'EUR': Decimal('0.8'), 'TRY': 32}
+
+    json_file = tmp_path / 'rates.json'
+    json_file.write_text('{"base": "EUR", "rates": {"USD": 1.25, "TRY": 40}}')
+    assert parse_rates(str(json_file)) == {'USD': 1, 'EUR': Decimal('0.8'), 'TRY': 32}
+
+
+@pytest.mark.parametrize('content', ['EUR,-1\n', 'EURO,1\n', 'EUR,abc\n'])
+def test_parse_rates_rejects_bad_rows(tmp_path, content):
+    path = tmp_path / 'rates.csv'
+    path.write_text(content)
+    with pytest.raises(FxError):
+        parse_rates(str(path))
+
+
+def test_choose_currency():
+    assert choose_currency(RATES, 'eur', 'TRY') == 'EUR'
+    assert choose_currency(RATES, None, 'TRY') == 'TRY'
+    # Users with no or an unknown currency fall back to the base
+    assert choose_currency(RATES, None, None) == 'USD'
+    assert resolve_currency(RATES, 'GBP') == 'USD'
+    with pytest.raises(FxError):
+        choose_currency(RATES, 'GBP')
+
+
+def test_convert_rounds_to_cents():
+    assert convert('10.00', 'EUR', 'TRY', RATES) == Decimal('400.00')
+    assert convert('1.00', 'TRY', 'EUR', RATES) == Decimal('0.03')
+    assert convert('1.005', 'USD', 'USD', RATES) == Decimal('1.01')
+
+
+def test_to_base_sql_inlines_cached_rates():
+    sql, params = to_base_sql('l.Balance', 'l.Currency', RATES)
+
+    assert sql.startswith('l.Balance * CASE l.Currency WHEN %s THEN %s')
+    assert 'FROM fx_rates r WHERE r.Currency = l.Currency' in sql
+    assert sql.count('%s') == len(params) == 6
+    assert dict(zip(params[::2], params[1::2]))['EUR'] == Decimal('1.25')
+
+
+def test_rate_cache_reloads_after_ttl():
+    cursor = FakeCursor([{'Currency': 'EUR', 'Rate': Decimal('0.8')}])
+    cache = RateCache(ttl=60)
+
+    rates, version = cache.get(cursor)
+    assert rates == {'EUR': Decimal('0.8'), 'USD': 1}
+    assert cache.get(cursor) == (rates, version)
+    assert cursor.queries == 1
+
+    cursor.rows = [('EUR', Decimal('0.9'))]
+    cache.invalidate()
+    assert cache.get(cursor)[1] != version
+    assert cursor.queries == 2
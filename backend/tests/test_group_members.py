@@ -0,0 +1,135 @@
+import pytest
+from flask import Flask
+from backend.routes import groups as group_routes
+from backend.utils.cache import ReadThroughCache
+from backend.utils.instrumentation import InstrumentedCursor
+from backend.utils.membership import MembershipError, parse_user_ids
+from backend.utils.query_tracking import assert_max_queries
+
+KNOWN_USERS = set(range(1, 1001))
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        self.db.queries.append((' '.join(query.split()), params))
+        if 'FROM users' in query:
+            self.rows = [{'UserID': user_id} for user_id in params if user_id in KNOWN_USERS]
+        elif 'FROM groupsaldo' in query:
+            deleted = params[0] in self.db.deleted and 'DeletedAt IS NULL' in query
+            self.rows = [] if deleted else [{'GroupID': params[0], 'GroupName': 'Trip'}]
+        elif 'INSERT INTO groupsaldo' in query:
+            self.lastrowid = 7
+        elif 'INSERT INTO groupmembers' in query:
+            pairs = set(zip(params[::2], params[1::2]))
+            self.rowcount = len(pairs - self.db.members)
+            self.db.members |= pairs
+        elif 'DELETE FROM groupmembers' in query:
+            pairs = {(params[0], user_id) for user_id in params[1:]}
+            self.rowcount = len(pairs & self.db.members)
+            self.db.members -= pairs
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries = []
+        self.members = set()
+        self.deleted = set()
+        self.commits = 0
+
+    def cursor(self, **kwargs):
+        return InstrumentedCursor(FakeCursor(self))
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    connection = FakeConnection()
+    refreshed = []
+    monkeypatch.setattr(group_routes, 'get_db_connection', lambda: connection)
+    cache = ReadThroughCache(ttl=60)
+    monkeypatch.setattr(group_routes, 'get_cache', lambda: cache)
+    monkeypatch.setattr(group_routes, 'refresh_user_stats',
+                        lambda cursor, user_ids: refreshed.append(list(user_ids)))
+
+    app = Flask(__name__)
+    app.testing = True
+    app.register_blueprint(group_routes.groups)
+    client = app.test_client()
+    client.connection = connection
+    client.refreshed = refreshed
+    return client
+
+
+def test_parse_user_ids_deduplicates_and_rejects_junk():
+    assert parse_user_ids([3, '1', 3, 2]) == [1, 2, 3]
+    for bad in (None, 5, [1, 'x'], [0], [True]):
+        with pytest.raises(MembershipError):
+            parse_user_ids(bad)
+
+
+def test_create_group_adds_all_members_in_one_statement(client):
+    with assert_max_queries(3):
+        response = client.post('/groups', json={'GroupName': 'Trip', 'Members': list(range(2, 501))},
+                               headers={'User-ID': '1'})
+
+    assert response.status_code == 201
+    assert len(client.connection.members) == 500
+    assert client.refreshed == [list(range(1, 501))]
+
+
+def test_create_group_rejects_unknown_users(client):
+    response = client.post('/groups', json={'GroupName': 'Trip', 'Members': [2, 5000]},
+                           headers={'User-ID': '1'})
+
+    assert response.status_code == 400
+    assert response.json['userIds'] == [5000]
+    assert not client.connection.members
+
+
+def test_add_and_remove_members_ignore_duplicates(client):
+    client.connection.members = {(7, 1), (7, 2)}
+
+    response = client.post('/groups/7/members', json={'Members': [2, 3, 3, 4]})
+    assert response.json == {'added': 2}
+    assert {user for _, user in client.connection.members} == {1, 2, 3, 4}
+
+    with assert_max_queries(2):
+        response = client.delete('/groups/7/members', json={'Members': [4, 9]})
+    assert response.json == {'removed': 1}
+    assert {user for _, user in client.connection.members} == {1, 2, 3}
+    assert client.refreshed == [[2, 3, 4], [4, 9]]
+
+
+def test_member_writes_check_deletion_in_the_database(client):
+    assert client.get('/groups/7').status_code == 200
+    # Deleted by another worker: this worker's cache still has the group
+    client.connection.deleted.add(7)
+
+    response = client.post('/groups/7/members', json={'Members': [2]})
+
+    assert response.status_code == 404
+    assert 'FOR SHARE' in client.connection.queries[-1][0]
+    assert not client.connection.members
@@ -0,0 +1,109 @@
+from decimal import Decimal
+import pytest
+from flask import Flask
+from backend.routes import groups as group_routes
+from backend.utils.cache import ReadThroughCache
+from backend.utils.fx import rate_cache
+from backend.utils.instrumentation import InstrumentedCursor
+from backend.utils.json_provider import RowJSONProvider
+from backend.utils.query_tracking import assert_max_queries
+
+RESULTS = {
+    'FROM groupsaldo': [{'GroupID': 1, 'GroupName': 'Trip'}],
+    'FROM Users u': [
+        {'UserID': 1, 'Name': 'Ada', 'Email': 'ada@example.com'},
+        {'UserID': 2, 'Name': 'Bob', 'Email': 'bob@example.com'},
+    ],
+    'FROM debts': [
+        {'DebtID': 11, 'FromUserID': 3, 'ToUserID': 1, 'Amount': Decimal('5.00'),
+         'Status': 'pending', 'GroupID': 1},
+        {'DebtID': 10, 'FromUserID': 2, 'ToUserID': 1, 'Amount': Decimal('12.50'),
+         'Status': 'pending', 'GroupID': 1},
+    ],
+    'FROM balance_ledger': [
+        {'UserID': 1, 'Balance': Decimal('17.50'), 'Receives': Decimal('17.50'), 'Owes': Decimal('0.00')},
+        {'UserID': 2, 'Balance': Decimal('-12.50'), 'Receives': Decimal('0.00'), 'Owes': Decimal('12.50')},
+        {'UserID': 3, 'Balance': Decimal('-5.00'), 'Receives': Decimal('0.00'), 'Owes': Decimal('5.00')},
+    ],
+    'FROM users': [{'UserID': 3, 'Name': 'Cem'}],
+    'FROM fx_rates': [{'Currency': 'USD', 'Rate': Decimal('1')}, {'Currency': 'EUR', 'Rate': Decimal('0.5')}],
+}
+
+
+class FakeCursor:
+    def __init__(self, queries):
+        self.queries = queries
+        self.rows = []
+
+    def execute(self, query, params=()):
+        self.queries.append(query)
+        self.rows = next(rows for marker, rows in RESULTS.items() if marker in query)
+
+    def fetchall(self):
+        return [dict(row) for row in self.rows]
+
+    def fetchone(self):
+        return dict(self.rows[0]) if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self, **kwargs):
+        return InstrumentedCursor(FakeCursor(self.queries))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    connection = FakeConnection()
+    cache = ReadThroughCache(ttl=60)
+    monkeypatch.setattr(group_routes, 'get_db_connection', lambda: connection)
+    monkeypatch.setattr(group_routes, 'get_cache', lambda: cache)
+    rate_cache.invalidate()
+
+    app = Flask(__name__)
+    app.testing = True
+    app.json = RowJSONProvider(app, decimal_mode='string')
+    app.register_blueprint(group_routes.groups)
+    client = app.test_client()
+    client.connection = connection
+    return client
+
+
+def test_overview_references_users_by_id(client):
+    response = client.get('/groups/1/overview')
+
+    assert response.status_code == 200
+    body = response.json
+    assert body['group']['GroupName'] == 'Trip'
+    assert [m['UserID'] for m in body['members']] == [1, 2]
+    assert body['otherUsers'] == [{'UserID': 3, 'Name': 'Cem'}]
+    assert body['debts'][1] == {'DebtID': 10, 'FromUserID': 2, 'ToUserID': 1,
+                                'Amount': '12.50', 'Status': 'pending', 'GroupID': 1}
+    assert body['currency'] == 'USD'
+    assert {b['userId']: b['balance'] for b in body['balances']} == {1: 17.5, 2: -12.5, 3: -5.0}
+    assert body['balances'][1] == {'userId': 2, 'balance': -12.5, 'receives': 0.0, 'owes': 12.5}
+
+
+def test_overview_converts_balances_in_sql(client):
+    assert client.get('/groups/1/overview?currency=EUR').json['currency'] == 'EUR'
+    balances_query = next(q for q in client.connection.queries if 'FROM balance_ledger' in q)
+    assert 'CASE l.Currency' in balances_query
+
+    assert client.get('/groups/1/overview?currency=XXX').status_code == 400
+
+
+def test_overview_query_count(client):
+    with assert_max_queries(6, repeat_limit=1):
+        client.get('/groups/1/overview')
+
+    # Group, members and FX rates come from caches the second time
+    with assert_max_queries(3, repeat_limit=1):
+        client.get('/groups/1/overview')
@@ -0,0 +1,159 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from backend.utils import group_purge
+from backend.utils.group_purge import GroupNotDeleted, purge_group_step
+
+
+class FakeCursor:
+    """Just enough of the purge's statements over in-memory tables."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.rows = []
+        self.rowcount = 0
+        self.ledger_changes = []
+        self.unread_bumps = []
+
+    def execute(self, query, params=()):
+        query = ' '.join(query.split())
+        self.rows = []
+        if query.startswith('SELECT DeletedAt FROM groupsaldo'):
+            self.rows = [g for g in self.tables['groupsaldo'] if g['GroupID'] == params[0]]
+        elif query.startswith('SELECT DebtID'):
+            group_id, limit = params
+            self.rows = [d for d in self.tables['debts'] if d['GroupID'] == group_id][:limit]
+        elif query.startswith('SELECT UserID, COUNT(*) AS Removed'):
+            debt_ids = set(params[:-2])
+            counts = {}
+            for n in self.tables['notifications']:
+                if n['RelatedID'] in debt_ids:
+                    row = counts.setdefault(n['UserID'], {'UserID': n['UserID'], 'Removed': 0, 'Unread': 0})
+                    row['Removed'] += 1
+                    row['Unread'] += not n['IsRead']
+            self.rows = list(counts.values())
+        elif query.startswith('DELETE FROM notifications'):
+            self._delete('notifications', lambda n: n['RelatedID'] in set(params[:-2]))
+        elif query.startswith('DELETE FROM debts'):
+            self._delete('debts', lambda d: d['DebtID'] in set(params))
+        elif query.startswith('SELECT 1 FROM'):
+            table = query.split()[3]
+            self.rows = [r for r in self.tables[table] if r['GroupID'] == params[0]][:1]
+        elif query.startswith('DELETE FROM') and 'LIMIT' in query:
+            table = query.split()[2]
+            group_id, limit = params
+            matching = [r for r in self.tables[table] if r['GroupID'] == group_id][:limit]
+            self._delete(table, lambda r: any(r is m for m in matching))
+        elif query.startswith('DELETE FROM balance_ledger'):
+            self._delete('balance_ledger', lambda r: r['GroupID'] == params[0])
+        elif query.startswith('DELETE FROM groupsaldo'):
+            self._delete('groupsaldo', lambda g: g['GroupID'] == params[0] and g['DeletedAt'])
+        else:
+            raise AssertionError(f'unexpected query: {query}')
+
+    def executemany(self, query, rows):
+        if 'balance_ledger' in query:
+            self.ledger_changes.extend(rows)
+        else:
+            self.unread_bumps.extend(rows)
+
+    def _delete(self, table, predicate):
+        before = len(self.tables[table])
+        self.tables[table] = [r for r in self.tables[table] if not predicate(r)]
+        self.rowcount = before - len(self.tables[table])
+
+    def fetchall(self):
+        return [dict(r) for r in self.rows]
+
+    def fetchone(self):
+        return dict(self.rows[0]) if self.rows else None
+
+
+def make_tables(deleted=True):
+    debts = [{'DebtID': i, 'GroupID': 1 if i <= 7 else 2, 'FromUserID': 1, 'ToUserID': 2,
+              'Amount': Decimal('1.00'), 'Currency': 'USD', 'Status': 'pending',
+              'CreatedDate': datetime(2026, 1, 1)}
+             for i in range(1, 10)]
+    return {
+        'groupsaldo': [{'GroupID': 1, 'DeletedAt': datetime(2026, 2, 1) if deleted else None},
+                       {'GroupID': 2, 'DeletedAt': None}],
+        'debts': debts,
+        'notifications': [{'UserID': 2, 'RelatedID': i, 'IsRead': i % 2 == 0} for i in range(1, 10)],
+        'expenses': [{'GroupID': 1}] * 4 + [{'GroupID': 2}],
+        'user_stats_daily': [{'GroupID': 1}] * 3,
+        'groupmembers': [{'GroupID': 1}, {'GroupID': 1}, {'GroupID': 2}],
+        'balance_ledger': [{'GroupID': 1}, {'GroupID': 2}],
+    }
+
+
+def run_to_completion(cursor, progress=None, chunk_size=3, max_steps=50):
+    progress = progress or {}
+    for step in range(max_steps):
+        progress, done = purge_group_step(cursor, {'groupId': 1}, progress, chunk_size)
+        if done:
+            return progress, step + 1
+    raise AssertionError('purge did not finish')
+
+
+def test_purge_removes_the_group_in_bounded_chunks():
+    tables = make_tables()
+    cursor = FakeCursor(tables)
+
+    progress, steps = run_to_completion(cursor)
+
+    assert progress == {'phase': 'done', 'debts': 7, 'notifications': 7,
+                        'expenses': 4, 'stats': 3, 'members': 2}
+    # 3 debt chunks + 1 empty, 2 expense chunks, 1 each for stats/members, the final step
+    assert steps == 9
+    assert [g['GroupID'] for g in tables['groupsaldo']] == [2]
+    assert [d['GroupID'] for d in tables['debts']] == [2, 2]
+    assert tables['expenses'] == [{'GroupID': 2}]
+    assert tables['balance_ledger'] == [{'GroupID': 2}]
+    # Four of the seven notifications were unread
+    assert sum(delta for _, delta in cursor.unread_bumps) == -4
+    assert cursor.ledger_changes
+
+
+def test_purge_resumes_from_committed_progress():
+    tables = make_tables()
+    cursor = FakeCursor(tables)
+    progress, _ = purge_group_step(cursor, {'groupId': 1}, {}, 3)
+
+    # A new worker picks the job up with only the committed progress
+    progress, _ = run_to_completion(FakeCursor(tables), progress)
+
+    assert progress['debts'] == 7
+    assert not [d for d in tables['debts'] if d['GroupID'] == 1]
+
+
+def test_purge_goes_round_again_if_rows_appear_late():
+    tables = make_tables()
+    cursor = FakeCursor(tables)
+    progress = {'phase': 'group'}
+    tables['debts'].append(dict(tables['debts'][0], DebtID=99))
+
+    progress, done = purge_group_step(cursor, {'groupId': 1}, progress, 3)
+
+    assert not done and progress['phase'] == 'debts'
+
+
+def test_purge_refuses_a_group_that_is_not_deleted():
+    with pytest.raises(GroupNotDeleted):
+        purge_group_step(FakeCursor(make_tables(deleted=False)), {'groupId': 1}, {}, 3)
+
+
+def test_purge_bumps_users_whose_removed_notifications_were_all_read(monkeypatch):
+    forgotten = []
+    monkeypatch.setattr(group_purge, 'forget_notification_state', lambda *ids: forgotten.extend(ids))
+    tables = make_tables()
+    tables['notifications'].append({'UserID': 5, 'RelatedID': 1, 'IsRead': True})
+    cursor = FakeCursor(tables)
+    after_commit = []
+
+    purge_group_step(cursor, {'groupId': 1}, {}, 3, after_commit=after_commit)
+
+    assert sorted(cursor.unread_bumps) == [(2, -2), (5, 0)]
+    assert not forgotten
+    for callback in after_commit:
+        callback()
+    assert sorted(forgotten) == [2, 5]
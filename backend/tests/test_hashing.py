@@ -0,0 +1,72 @@
+import time
+import pytest
+from werkzeug.security import generate_password_hash
+from backend.utils.hashing import HashingService, HashingBusy, hash_method_of
+from backend.utils.rate_limit import TokenBucketLimiter
+
+
+def test_inline_hash_and_verify():
+    hasher = HashingService(method='pbkdf2', workers=0, queue_limit=2)
+    pwhash = hasher.hash_password('s3cret!')
+
+    assert hash_method_of(pwhash).startswith('pbkdf2')
+    assert hasher.verify_password(pwhash, 's3cret!') == (True, None)
+    assert hasher.verify_password(pwhash, 'wrong') == (False, None)
+
+
+def test_verify_returns_upgraded_hash_when_parameters_change():
+    old_hash = generate_password_hash('s3cret!', method='pbkdf2:sha256:1000')
+    hasher = HashingService(method='pbkdf2', workers=0, queue_limit=2)
+
+    matches, upgraded = hasher.verify_password(old_hash, 's3cret!')
+
+    assert matches
+    assert hash_method_of(upgraded) == hasher.target_method
+    assert hasher.verify_password(upgraded, 's3cret!') == (True, None)
+
+
+def test_rejects_when_saturated():
+    hasher = HashingService(method='pbkdf2', workers=0, queue_limit=1)
+    hasher._slots.acquire()
+
+    with pytest.raises(HashingBusy):
+        hasher.hash_password('s3cret!')
+    assert hasher.stats()['rejected'] == 1
+
+    hasher._slots.release()
+    assert hasher.hash_password('s3cret!')
+
+
+def test_process_pool_hashing():
+    hasher = HashingService(method='pbkdf2:sha256:1000', workers=1, queue_limit=2)
+    pwhash = hasher.hash_password('s3cret!')
+
+    assert hasher.verify_password(pwhash, 's3cret!') == (True, None)
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    hasher = HashingService(method='pbkdf2:sha256:1000', workers=1, queue_limit=1, timeout=1)
+    hasher.hash_password('s3cret!')  # start the pool process
+    hasher.timeout = 0.05
+
+    with pytest.raises(HashingBusy):
+        hasher._run(time.sleep, 0.5)
+    # Still running in the pool, so the one slot is taken
+    with pytest.raises(HashingBusy):
+        hasher.hash_password('s3cret!')
+    assert hasher.stats()['rejected'] == 1
+
+    deadline = time.monotonic() + 5
+    while hasher.stats()['inFlight'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert hasher.hash_password('s3cret!')
+
+
+def test_token_bucket_limits_per_key():
+    limiter = TokenBucketLimiter(rate=1, burst=2)
+
+    assert limiter.acquire('a') == 0
+    assert limiter.acquire('a') == 0
+    assert limiter.acquire('a') > 0
+    assert limiter.acquire('b') == 0
+    assert limiter.limited == 1
@@ -0,0 +1,106 @@
+import logging
+import os
+import pytest
+from flask import Flask, jsonify
+from backend.utils import instrumentation
+from backend.utils.instrumentation import InstrumentedCursor, Registry, merge, render
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def execute(self, query, params=None):
+        self.pending = list(self.rows)
+
+    def fetchall(self):
+        rows, self.pending = self.pending, []
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def app():
+    instrumentation.registry.clear()
+    app = Flask(__name__)
+    instrumentation.init_app(app)
+
+    @app.route('/things/<int:thing_id>')
+    def thing(thing_id):
+        cursor = InstrumentedCursor(FakeCursor([(1,), (2,), (3,)]))
+        cursor.execute("SELECT * FROM things WHERE ThingID = %s", (thing_id,))
+        cursor.fetchall()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+        return jsonify({'ok': True})
+
+    yield app
+    instrumentation.registry.clear()
+
+
+def test_requests_are_labelled_by_route_with_db_counts(app):
+    client = app.test_client()
+    client.get('/things/1')
+    client.get('/things/2')
+    client.get('/nowhere')
+
+    text = instrumentation.exposition()
+    assert 'saldo_http_requests_total{endpoint="/things/<int:thing_id>",method="GET",status="200"} 2' in text
+    assert 'saldo_http_requests_total{endpoint="unmatched",method="GET",status="404"} 1' in text
+    assert 'saldo_db_rows_fetched_total{endpoint="/things/<int:thing_id>",method="GET"} 12' in text
+    assert 'saldo_db_queries_per_request_sum{endpoint="/things/<int:thing_id>",method="GET"} 4.0' in text
+    assert 'saldo_http_request_duration_seconds_count{endpoint="/things/<int:thing_id>",method="GET"} 2' in text
+
+
+def test_slow_queries_are_logged_without_parameter_values(caplog):
+    cursor = InstrumentedCursor(FakeCursor([]), slow_seconds=0)
+    with caplog.at_level(logging.WARNING, logger='backend.slow_query'):
+        cursor.execute("SELECT *\n  FROM users WHERE Email = %s", ('ada@example.com',))
+        cursor.close()
+
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert 'SELECT * FROM users WHERE Email = %s' in message
+    assert "params=['str']" in message
+    assert 'ada@example.com' not in message
+
+
+def test_histogram_buckets_render_cumulatively():
+    registry = Registry()
+    for value in (0.001, 0.02, 0.02, 20):
+        registry.observe('saldo_http_request_duration_seconds', {'endpoint': '/x', 'method': 'GET'}, value)
+
+    text = render(*merge([dict(registry.snapshot(), pid=None, gauges=[])]))
+    assert 'saldo_http_request_duration_seconds_bucket{endpoint="/x",method="GET",le="0.005"} 1' in text
+    assert 'saldo_http_request_duration_seconds_bucket{endpoint="/x",method="GET",le="0.025"} 3' in text
+    assert 'saldo_http_request_duration_seconds_bucket{endpoint="/x",method="GET",le="10.0"} 3' in text
+    assert 'saldo_http_request_duration_seconds_bucket{endpoint="/x",method="GET",le="+Inf"} 4' in text
+
+
+def test_worker_snapshots_are_summed_and_dead_worker_gauges_dropped():
+    def snapshot(pid, requests, in_use):
+        registry = Registry()
+        registry.inc('saldo_http_requests_total', {'endpoint': '/x', 'method': 'GET', 'status': '200'}, requests)
+        registry.observe('saldo_db_queries_per_request', {'endpoint': '/x', 'method': 'GET'}, requests)
+        gauges = [['saldo_db_pool_connections', 'Pooled connections.', [['state', 'in_use']], in_use]]
+        return dict(registry.snapshot(), pid=pid, gauges=gauges)
+
+    dead_pid = 2 ** 22 + 1
+    text = render(*merge([snapshot(os.getpid(), 3, 1), snapshot(dead_pid, 4, 7)]))
+
+    assert 'saldo_http_requests_total{endpoint="/x",method="GET",status="200"} 7' in text
+    assert 'saldo_db_queries_per_request_count{endpoint="/x",method="GET"} 2' in text
+    assert f'saldo_db_pool_connections{{state="in_use",pid="{os.getpid()}"}} 1' in text
+    assert str(dead_pid) not in text
+
+
+def test_snapshots_round_trip_through_the_metrics_dir(tmp_path, app):
+    app.test_client().get('/things/1')
+    text = instrumentation.exposition(str(tmp_path))
+
+    assert (tmp_path / f'metrics-{os.getpid()}.json').exists()
+    assert 'saldo_http_requests_total{endpoint="/things/<int:thing_id>",method="GET",status="200"} 1' in text
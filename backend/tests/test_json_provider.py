@@ -0,0 +1,61 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+from flask import Flask, jsonify
+from backend.utils.json_provider import RowJSONProvider, orjson
+
+ROW = {'DebtID': 7, 'Amount': Decimal('12.345'), 'CreatedDate': datetime(2026, 1, 31, 18, 4, 5),
+       'DueDate': date(2026, 2, 1), 'Description': 'Café'}
+
+ENCODERS = [False, pytest.param(True, marks=pytest.mark.skipif(orjson is None, reason='orjson not installed'))]
+
+
+def make_app(**kwargs):
+    app = Flask(__name__)
+    app.json = RowJSONProvider(app, **kwargs)
+
+    @app.route('/rows/<int:count>')
+    def rows(count):
+        return jsonify([dict(ROW, DebtID=i) for i in range(count)])
+
+    return app
+
+
+@pytest.mark.parametrize('use_orjson', ENCODERS)
+def test_rows_serialize_without_conversion(use_orjson):
+    app = make_app(use_orjson=use_orjson)
+
+    assert json.loads(app.json.dumps(ROW)) == {
+        'DebtID': 7, 'Amount': '12.345', 'CreatedDate': '2026-01-31T18:04:05',
+        'DueDate': '2026-02-01', 'Description': 'Café'}
+    assert app.json.loads(app.json.dumps({1: 'a'})) == {'1': 'a'}
+
+
+@pytest.mark.parametrize('use_orjson', ENCODERS)
+def test_cents_mode_rounds_half_up(use_orjson):
+    app = make_app(decimal_mode='cents', use_orjson=use_orjson)
+
+    encoded = json.loads(app.json.dumps([Decimal('12.345'), Decimal('-0.005'), Decimal('3')]))
+    assert encoded == [1235, -1, 300]
+
+
+def test_unknown_decimal_mode_is_rejected():
+    with pytest.raises(ValueError):
+        make_app(decimal_mode='float')
+
+
+@pytest.mark.parametrize('use_orjson', ENCODERS)
+def test_large_arrays_are_streamed(use_orjson):
+    app = make_app(stream_threshold=10, stream_chunk=4, use_orjson=use_orjson)
+    client = app.test_client()
+
+    small = client.get('/rows/10')
+    assert 'Content-Length' in small.headers
+    assert len(small.json) == 10
+
+    large = client.get('/rows/11')
+    assert 'Content-Length' not in large.headers
+    assert large.mimetype == 'application/json'
+    assert [row['DebtID'] for row in json.loads(large.data)] == list(range(11))
+    assert json.loads(client.get('/rows/0').data) == []
@@ -0,0 +1,69 @@
+from decimal import Decimal
+import pytest
+from flask import Flask
+from backend.routes import debts as debt_routes
+from backend.routes import groups as group_routes
+from backend.utils.ledger import debt_deltas, merge_deltas, record_debt_change
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.batches = []
+
+    def executemany(self, query, rows):
+        self.batches.append(rows)
+
+
+def debt(status='pending', amount='12.50'):
+    return {'GroupID': 1, 'FromUserID': 2, 'ToUserID': 3, 'Amount': amount,
+            'Currency': 'EUR', 'Status': status}
+
+
+def test_new_debt_is_mirrored_for_both_users():
+    deltas = debt_deltas([debt()])
+    assert deltas[(1, 3, 2, 'EUR')] == [1, 1, Decimal('12.50'), Decimal('12.50')]
+    assert deltas[(1, 2, 3, 'EUR')] == [1, 1, Decimal('12.50'), Decimal('-12.50')]
+
+
+def test_mark_paid_only_moves_open_columns():
+    deltas = merge_deltas(debt_deltas([debt()], -1), debt_deltas([debt('paid')]))
+    assert deltas[(1, 3, 2, 'EUR')] == [0, -1, Decimal(0), Decimal('-12.50')]
+    assert deltas[(1, 2, 3, 'EUR')] == [0, -1, Decimal(0), Decimal('12.50')]
+
+
+def test_unchanged_status_writes_nothing():
+    cursor = RecordingCursor()
+    record_debt_change(cursor, before=[debt()], after=[debt()])
+    assert cursor.batches == []
+
+
+def test_bulk_insert_is_one_batch():
+    cursor = RecordingCursor()
+    debts = [dict(debt(), FromUserID=user_id) for user_id in (4, 5, 6)]
+    record_debt_change(cursor, after=debts)
+    assert len(cursor.batches) == 1
+    assert len(cursor.batches[0]) == 6
+
+
+def test_currencies_are_kept_apart():
+    deltas = debt_deltas([debt(), dict(debt(), Currency='USD', Amount='1.00')])
+    assert deltas[(1, 3, 2, 'EUR')][3] == Decimal('12.50')
+    assert deltas[(1, 3, 2, 'USD')][3] == Decimal('1.00')
+
+
+def test_self_debt_adds_no_ledger_rows():
+    assert debt_deltas([dict(debt(), ToUserID=2)]) == {}
+
+
+@pytest.mark.parametrize('module, blueprint', [(group_routes, 'groups'), (debt_routes, 'debts')])
+def test_routes_refuse_self_debts(monkeypatch, module, blueprint):
+    opened = []
+    monkeypatch.setattr(module, 'get_db_connection', lambda: opened.append(1))
+    app = Flask(__name__)
+    app.register_blueprint(getattr(module, blueprint))
+
+    response = app.test_client().post('/groups/1/debts', json={
+        'fromUserId': 2, 'toUserId': '2', 'amount': '5.00', 'description': ''})
+
+    assert response.status_code == 400
+    assert not opened
@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+import pytest
+from flask import Flask
+from backend.routes import notifications as notification_routes
+
+
+@pytest.fixture
+def client(monkeypatch):
+    state = {
+        'version': 3,
+        'unreadCount': 2,
+        'lastChanged': datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    }
+    monkeypatch.setattr(notification_routes, 'get_notification_state', lambda user_id: state)
+
+    def no_database():
+        raise AssertionError('conditional hit must not touch the database')
+    monkeypatch.setattr(notification_routes, 'get_db_connection', no_database)
+
+    app = Flask(__name__)
+    app.testing = True
+    app.register_blueprint(notification_routes.notifications)
+    return app.test_client()
+
+
+def test_unread_count_comes_from_state(client):
+    response = client.get('/notifications/unread-count?userId=1')
+    assert response.status_code == 200
+    assert response.json == {'unreadCount': 2, 'version': 3}
+    assert response.headers['ETag'] == '"3-count"'
+
+
+def test_matching_etag_returns_304(client):
+    etag = client.get('/notifications/unread-count?userId=1').headers['ETag']
+    response = client.get('/notifications/unread-count?userId=1',
+                          headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_notification_list_revalidates_without_query(client):
+    url = '/notifications?userId=1&limit=20'
+    with pytest.raises(AssertionError):
+        client.get(url)
+
+    from zlib import crc32
+    etag = '"3-%x"' % crc32(b'userId=1&limit=20')
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(url, headers={
+        'If-Modified-Since': 'Wed, 01 May 2024 12:00:01 GMT'
+    }).status_code == 304
+
+
+def test_change_in_the_same_second_is_not_a_304(client):
+    # The copy dated 12:00:00 may predate a second change within that second
+    with pytest.raises(AssertionError):
+        client.get('/notifications?userId=1', headers={
+            'If-Modified-Since': 'Wed, 01 May 2024 12:00:00 GMT'})
+    response = client.get('/notifications/unread-count?userId=1', headers={
+        'If-Modified-Since': 'Wed, 01 May 2024 12:00:00 GMT'})
+    assert response.status_code == 200
@@ -0,0 +1,112 @@
+import json
+from backend.utils import outbox
+from backend.utils.outbox import DEBT_ADDED, DEBT_PAID, debt_event, drain_once, render_notifications
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, query, params=None):
+        self.db.queries.append(' '.join(query.split()))
+        if 'FROM notification_outbox' in query and query.lstrip().startswith('SELECT'):
+            self.result = [r for r in self.db.outbox
+                           if r['Status'] == params[0] and (len(params) == 2 or r['OutboxID'] == params[1])]
+            self.result = self.result[:params[-1]]
+        elif query.lstrip().startswith('UPDATE notification_outbox'):
+            attempts, status, error, outbox_id = params
+            for r in self.db.outbox:
+                if r['OutboxID'] == outbox_id:
+                    r.update(Attempts=attempts, Status=status, LastError=error)
+        elif 'FROM users' in query:
+            self.result = [{'UserID': u, 'Name': self.db.names[u]} for u in params]
+        elif query.lstrip().startswith('DELETE'):
+            self.db.outbox = [r for r in self.db.outbox if r['OutboxID'] not in params]
+
+    def executemany(self, query, rows):
+        self.db.queries.append(' '.join(query.split()))
+        if 'INTO notifications' in query:
+            self.db.notifications.extend(rows)
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, events):
+        self.outbox = [
+            {'OutboxID': i, 'EventType': kind, 'Payload': json.dumps(event), 'AgeMicros': 250000,
+             'Attempts': 0, 'Status': 'pending'}
+            for i, (kind, event) in enumerate(events, 1)
+        ]
+        self.names = {1: 'Ayse', 2: 'Mehmet'}
+        self.notifications = []
+        self.queries = []
+        self.commits = 0
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def test_render_uses_resolved_names():
+    rows = render_notifications([
+        (DEBT_ADDED, debt_event(10, 1, 2, '5.00')),
+        (DEBT_PAID, debt_event(11, 3, 2, '7.25')),
+    ], {1: 'Ayse'})
+    assert rows == [
+        (2, 'New Debt Added', 'Ayse owes you $5.00', 'debt', 10),
+        (2, 'Debt Paid', 'Someone paid their debt of $7.25', 'payment', 11),
+    ]
+
+
+def test_drain_processes_batch_in_one_transaction(monkeypatch):
+    published = []
+    monkeypatch.setattr(outbox, 'publish_to_user', lambda user_id, event: published.append(user_id))
+    connection = FakeConnection([
+        (DEBT_ADDED, debt_event(i, 1 + i % 2, 3, '1.00')) for i in range(5)
+    ])
+
+    assert drain_once(connection, batch_size=3) == 3
+    assert connection.commits == 1
+    assert len(connection.notifications) == 3
+    assert len(connection.outbox) == 2
+    # claim, one name lookup, bulk insert, state bump, delete
+    assert len(connection.queries) == 5
+    assert published == [3, 3, 3]
+    assert outbox.stats.snapshot()['lagSeconds'] == 0.25
+
+    assert drain_once(connection, batch_size=3) == 2
+    assert drain_once(connection, batch_size=3) == 0
+
+
+def test_failing_event_is_retried_alone_then_dead_lettered(monkeypatch):
+    monkeypatch.setattr(outbox, 'publish_to_user', lambda user_id, event: None)
+    monkeypatch.setattr(outbox, 'OUTBOX_MAX_ATTEMPTS', 2)
+    connection = FakeConnection([
+        (DEBT_ADDED, debt_event(1, 1, 3, '1.00')),
+        ('unknown', debt_event(2, 1, 3, '1.00')),
+        (DEBT_PAID, debt_event(3, 2, 3, '1.00')),
+    ])
+
+    assert drain_once(connection, batch_size=10) == 2
+    assert [n[4] for n in connection.notifications] == [1, 3]
+    assert [(r['OutboxID'], r['Attempts'], r['Status']) for r in connection.outbox] == [(2, 1, 'pending')]
+
+    assert drain_once(connection, batch_size=10) == 0
+    assert connection.outbox[0]['Status'] == 'dead'
+    assert 'unknown' in connection.outbox[0]['LastError']
+
+    # Dead events are no longer claimed
+    connection.queries.clear()
+    assert drain_once(connection, batch_size=10) == 0
+    assert len(connection.queries) == 1
@@ -0,0 +1,40 @@
+import pytest
+from backend.utils.pagination import (
+    MAX_PAGE_SIZE, PaginationError, decode_cursor, encode_cursor, page_args, paginate
+)
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(['2024-01-02 03:04:05', 17])
+    assert decode_cursor(token, 2) == ['2024-01-02 03:04:05', 17]
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(PaginationError):
+        decode_cursor('not-a-cursor', 1)
+    with pytest.raises(PaginationError):
+        decode_cursor(encode_cursor([1, 2]), 1)
+
+
+@pytest.mark.parametrize('values', [[[1]], [{'a': 1}], [None], [True]])
+def test_cursor_values_must_be_scalars(values):
+    with pytest.raises(PaginationError):
+        decode_cursor(encode_cursor(values), 1)
+
+
+def test_limit_is_capped():
+    after, limit = page_args({'limit': str(MAX_PAGE_SIZE * 10)})
+    assert after is None
+    assert limit == MAX_PAGE_SIZE
+    with pytest.raises(PaginationError):
+        page_args({'limit': '0'})
+
+
+def test_next_cursor_only_when_more_rows():
+    rows = [{'id': i} for i in range(4)]
+    page, cursor = paginate(rows, 3, lambda row: [row['id']])
+    assert page == rows[:3]
+    assert decode_cursor(cursor, 1) == [2]
+
+    page, cursor = paginate(rows[:3], 3, lambda row: [row['id']])
+    assert cursor is None
@@ -0,0 +1,56 @@
+import threading
+import time
+from backend.utils.pubsub import Broker, BrokerBackend, PubSubHub
+
+
+def test_local_hub_delivers_to_channel_subscribers():
+    hub = PubSubHub()
+    alice = hub.subscribe('user:1')
+    bob = hub.subscribe('user:2')
+
+    hub.publish('user:1', {'relatedId': 7})
+
+    assert alice.get(timeout=1) == {'relatedId': 7}
+    assert bob.get(timeout=0.01) is None
+
+    alice.close()
+    bob.close()
+    assert hub.subscriber_count() == 0
+
+
+def test_full_subscriber_queue_drops_instead_of_blocking():
+    hub = PubSubHub(queue_size=1)
+    subscription = hub.subscribe('user:1')
+    hub.publish('user:1', 1)
+    hub.publish('user:1', 2)
+    assert subscription.dropped == 1
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_broker_fans_out_between_workers():
+    broker = Broker('127.0.0.1:0')
+    threading.Thread(target=broker.serve_forever, daemon=True).start()
+    address = '%s:%d' % broker.server_address
+
+    worker_a = PubSubHub(BrokerBackend(address))
+    worker_b = PubSubHub(BrokerBackend(address))
+    try:
+        assert wait_for(lambda: len(broker.clients) == 2)
+        subscription = worker_b.subscribe('user:5')
+
+        worker_a.publish('user:5', {'type': 'debt'})
+
+        assert subscription.get(timeout=2) == {'type': 'debt'}
+    finally:
+        worker_a.backend.stop()
+        worker_b.backend.stop()
+        broker.shutdown()
+        broker.server_close()
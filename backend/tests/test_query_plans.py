@@ -0,0 +1,272 @@
+"""
+Runs the routes against a freshly migrated scratch database, captures
+every statement they send, and EXPLAINs them; fails on full scans of the
+tables that grow with usage.
+
+Needs a MySQL server reachable with the DB_* settings and permission to
+create the EXPLAIN_TEST_DB database (default saldo_explain_test); skipped
+otherwise.
+"""
+import os
+import random
+import re
+from decimal import Decimal
+import pytest
+import mysql.connector
+from flask import Flask
+from mysql.connector import Error
+from backend.database_config import DB_CONFIG
+from backend.migrations import upgrade
+from backend.routes import debts as debt_routes
+from backend.routes import groups as group_routes
+from backend.routes import notifications as notification_routes
+from backend.routes import stats as stats_routes
+from backend.routes import users as user_routes
+from backend.utils import ledger, notification_state, user_stats
+from backend.utils.cache import ReadThroughCache
+from backend.utils.fx import load_rates
+from backend.utils.group_purge import purge_group_step
+from backend.utils.instrumentation import InstrumentedCursor
+from backend.utils.json_provider import init_app as init_json
+from backend.utils.pagination import NEXT_CURSOR_HEADER
+
+EXPLAIN_TEST_DB = os.environ.get('EXPLAIN_TEST_DB', 'saldo_explain_test')
+
+RATES = {'EUR': Decimal('0.92'), 'USD': Decimal(1)}
+
+LARGE_TABLES = {
+    'users', 'debts', 'notifications', 'groupmembers', 'expenses',
+    'balance_ledger', 'user_stats_daily', 'user_stats',
+}
+# EXPLAIN reports aliases; these are the ones the routes' queries use
+ALIASES = {'u': 'users', 'u1': 'users', 'u2': 'users', 'gm': 'groupmembers', 'l': 'balance_ledger',
+           'd': 'user_stats_daily', 's': 'user_stats'}
+EXPLAINABLE = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+# Modules whose get_db_connection hands out the capturing connection
+CONNECTION_USERS = [debt_routes, group_routes, notification_routes, stats_routes, user_routes,
+                    notification_state]
+
+
+def _next_page(client, user_id):
+    first = client.get('/notifications', query_string={'userId': user_id, 'limit': 5})
+    return client.get('/notifications', query_string={
+        'userId': user_id, 'limit': 5, 'after': first.headers[NEXT_CURSOR_HEADER]})
+
+
+# (route, request) as a client sends it; ids holds a seeded group, two of its
+# members, the user with the most notifications and one of their unread ones
+ROUTES = [
+    ('POST /users/login', lambda client, ids: client.post(
+        '/users/login', json={'email': 'user7@example.com', 'password': 'not-the-password'})),
+    ('GET /groups', lambda client, ids: client.get(
+        '/groups', headers={'User-ID': str(ids['member'])})),
+    ('GET /groups/<id>/members', lambda client, ids: client.get(
+        f"/groups/{ids['group']}/members")),
+    ('GET /groups/<id>/debts', lambda client, ids: client.get(
+        f"/groups/{ids['group']}/debts", query_string={'limit': 100})),
+    ('GET /groups/<id>/overview', lambda client, ids: client.get(
+        f"/groups/{ids['group']}/overview", query_string={'currency': 'EUR'},
+        headers={'User-ID': str(ids['member'])})),
+    ('GET /groups/<id>/settlement', lambda client, ids: client.get(
+        f"/groups/{ids['group']}/settlement", query_string={'currency': 'EUR'},
+        headers={'User-ID': str(ids['member'])})),
+    ('POST /groups/<id>/debts', lambda client, ids: client.post(
+        f"/groups/{ids['group']}/debts",
+        json={'fromUserId': ids['member'], 'toUserId': ids['other'], 'amount': '12.50'})),
+    ('GET /debts', lambda client, ids: client.get('/debts', query_string={'limit': 100})),
+    ('GET /notifications', lambda client, ids: client.get(
+        '/notifications', query_string={'userId': ids['reader'], 'limit': 100})),
+    ('GET /notifications (next page)', lambda client, ids: _next_page(client, ids['reader'])),
+    ('POST /notifications/mark-read', lambda client, ids: client.post(
+        '/notifications/mark-read', json={'notificationId': ids['unread']})),
+    ('GET /stats', lambda client, ids: client.get(
+        '/stats', headers={'User-ID': str(ids['member'])})),
+]
+PURGE_PHASES = ['debts', 'stats']
+LABELS = [route for route, _ in ROUTES] + [f'purge_group job ({phase})' for phase in PURGE_PHASES]
+
+
+class CapturingCursor(InstrumentedCursor):
+    def __init__(self, cursor, statements):
+        super().__init__(cursor)
+        self._captured = statements
+
+    def _start(self, operation, params):
+        super()._start(operation, params)
+        self._captured.append((operation, params))
+
+
+class CapturingConnection:
+    """The scratch connection, shared by every request; close() leaves it open."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self.statements = []
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return CapturingCursor(self._connection.cursor(*args, **kwargs), self.statements)
+
+    def close(self):
+        pass
+
+    def capture(self):
+        self.statements = []
+        return self.statements
+
+
+def _seed(cursor, users=300, groups=60, debts=5000, notifications=5000):
+    rng = random.Random(16)
+    load_rates(cursor, RATES)
+    cursor.executemany(
+        "INSERT INTO users (Name, Email, Password, Currency) VALUES (%s, %s, 'x', 'USD')",
+        [(f'User {i}', f'user{i}@example.com') for i in range(1, users + 1)])
+    cursor.executemany(
+        "INSERT INTO groupsaldo (GroupName) VALUES (%s)",
+        [(f'Group {i}',) for i in range(1, groups + 1)])
+    members = {(group_id, rng.randint(1, users)) for group_id in range(1, groups + 1) for _ in range(5)}
+    cursor.executemany("INSERT INTO groupmembers (GroupID, UserID) VALUES (%s, %s)", sorted(members))
+    members = sorted(members)
+    cursor.executemany("""
+        INSERT INTO debts (FromUserID, ToUserID, Amount, Currency, Status, GroupID)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [
+        (rng.randint(1, users), rng.randint(1, users), rng.randint(1, 10000) / 100,
+         rng.choice(list(RATES)), rng.choice(['pending', 'paid']), rng.choice(members)[0])
+        for _ in range(debts)
+    ])
+    cursor.executemany("""
+        INSERT INTO notifications (UserID, Title, Message, Type, IsRead)
+        VALUES (%s, 'Title', 'Message', 'debt', %s)
+    """, [(rng.randint(1, users), rng.randint(0, 1)) for _ in range(notifications)])
+
+
+def _ids(cursor):
+    cursor.execute("""
+        SELECT GroupID, MIN(UserID) AS Member, MAX(UserID) AS Other
+        FROM groupmembers
+        GROUP BY GroupID
+        HAVING COUNT(*) > 1
+        ORDER BY GroupID
+        LIMIT 1
+    """)
+    group = cursor.fetchone()
+    cursor.execute("""
+        SELECT UserID, MAX(CASE WHEN IsRead THEN NULL ELSE NotificationID END) AS Unread
+        FROM notifications
+        GROUP BY UserID
+        ORDER BY COUNT(*) DESC
+        LIMIT 1
+    """)
+    reader = cursor.fetchone()
+    return {'group': group['GroupID'], 'member': group['Member'], 'other': group['Other'],
+            'reader': reader['UserID'], 'unread': reader['Unread']}
+
+
+def _capture_purge(capturing, group_id):
+    """Statements of the purge job's chunked phases, rolled back afterwards."""
+    setup = capturing._connection.cursor()
+    setup.execute("UPDATE groupsaldo SET DeletedAt = NOW() WHERE GroupID = %s", (group_id,))
+    setup.close()
+    captured = {}
+    try:
+        for phase in PURGE_PHASES:
+            captured[f'purge_group job ({phase})'] = capturing.capture()
+            cursor = capturing.cursor(dictionary=True)
+            purge_group_step(cursor, {'groupId': group_id}, {'phase': phase}, chunk_size=50)
+            cursor.close()
+    finally:
+        capturing.rollback()
+    return captured
+
+
+@pytest.fixture(scope='module')
+def connection():
+    config = dict(DB_CONFIG)
+    config.pop('database')
+    try:
+        connection = mysql.connector.connect(**config)
+    except Error as e:
+        pytest.skip(f'MySQL not available: {e}')
+
+    setup = connection.cursor()
+    setup.execute(f"DROP DATABASE IF EXISTS {EXPLAIN_TEST_DB}")
+    setup.execute(f"CREATE DATABASE {EXPLAIN_TEST_DB}")
+    setup.execute(f"USE {EXPLAIN_TEST_DB}")
+    setup.close()
+
+    upgrade(connection, log=lambda message: None)
+    seed = connection.cursor()
+    _seed(seed)
+    connection.commit()
+    ledger.rebuild(connection)
+    user_stats.rebuild(connection)
+    for table in sorted(LARGE_TABLES):
+        seed.execute(f"ANALYZE TABLE {table}")
+        seed.fetchall()
+    seed.close()
+
+    yield connection
+
+    teardown = connection.cursor()
+    teardown.execute(f"DROP DATABASE IF EXISTS {EXPLAIN_TEST_DB}")
+    teardown.close()
+    connection.close()
+
+
+@pytest.fixture(scope='module')
+def statements(connection):
+    """{route: [(statement, params)]} as the handlers sent them."""
+    capturing = CapturingConnection(connection)
+    app = Flask(__name__)
+    init_json(app)
+    for blueprint in (user_routes.users, group_routes.groups, debt_routes.debts,
+                      notification_routes.notifications, stats_routes.stats):
+        app.register_blueprint(blueprint)
+    client = app.test_client()
+
+    lookup = connection.cursor(dictionary=True)
+    ids = _ids(lookup)
+    lookup.close()
+
+    captured = {}
+    with pytest.MonkeyPatch.context() as patch:
+        for module in CONNECTION_USERS:
+            patch.setattr(module, 'get_db_connection', lambda: capturing)
+        cache = ReadThroughCache(ttl=60)
+        patch.setattr(group_routes, 'get_cache', lambda: cache)
+        # The seeded passwords are not hashes; only the lookup matters here
+        patch.setattr(user_routes.hasher, 'verify_password', lambda pwhash, password: (False, None))
+
+        for route, send in ROUTES:
+            captured[route] = capturing.capture()
+            response = send(client, ids)
+            assert response.status_code < 500, f'{route}: {response.get_data(as_text=True)}'
+            # End whatever the handler left open so its locks do not leak into the next one
+            connection.rollback()
+        captured.update(_capture_purge(capturing, ids['group']))
+    return captured
+
+
+@pytest.mark.parametrize('route', LABELS)
+def test_route_query_uses_an_index(connection, statements, route):
+    queries = [(query, params) for query, params in statements[route] if EXPLAINABLE.match(query)]
+    assert queries, f'{route} ran no queries'
+
+    cursor = connection.cursor(dictionary=True)
+    try:
+        for query, params in queries:
+            cursor.execute(f"EXPLAIN {query}", params)
+            plan = cursor.fetchall()
+
+            full_scans = []
+            for row in plan:
+                table = (row['table'] or '').lower()
+                if row['type'] == 'ALL' and ALIASES.get(table, table) in LARGE_TABLES:
+                    full_scans.append(table)
+            assert not full_scans, f'{route} scans {full_scans} in {query}: {plan}'
+    finally:
+        cursor.close()
@@ -0,0 +1,79 @@
+import logging
+import pytest
+from flask import Flask, jsonify
+from backend.utils import instrumentation, query_tracking
+from backend.utils.instrumentation import InstrumentedCursor
+from backend.utils.query_tracking import RepeatedQueryError, assert_max_queries, fingerprint
+
+
+class FakeCursor:
+    def execute(self, query, params=None):
+        pass
+
+    def executemany(self, query, rows):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_fingerprint_ignores_literals_lists_and_layout():
+    assert fingerprint("""
+        SELECT Name FROM users  -- payer
+        WHERE UserID = %s AND Email = 'a@b.c'
+    """) == fingerprint("select Name from users where UserID = 42 and Email = 'x'")
+    assert fingerprint("SELECT * FROM users WHERE UserID IN (%s, %s, %s)") == \
+        fingerprint("SELECT * FROM users WHERE UserID IN (%s)")
+    assert fingerprint("INSERT INTO groupmembers (GroupID, UserID) VALUES (%s, %s), (%s, %s)") == \
+        'insert into groupmembers (groupid, userid) values (?+)'
+    assert fingerprint("SELECT * FROM v0001_t") != fingerprint("SELECT * FROM v0002_t")
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    instrumentation.init_app(app)
+
+    @app.route('/members/<int:count>', methods=['POST'])
+    def add_members(count):
+        cursor = InstrumentedCursor(FakeCursor())
+        for user_id in range(count):
+            cursor.execute("INSERT INTO groupmembers (GroupID, UserID) VALUES (%s, %s)", (1, user_id))
+        cursor.close()
+        return jsonify({'ok': True})
+
+    yield app
+    instrumentation.registry.clear()
+
+
+def test_repeated_statement_fails_the_request_when_testing(app):
+    app.testing = True
+    client = app.test_client()
+
+    assert client.post('/members/5').status_code == 200
+    with pytest.raises(RepeatedQueryError, match=r'6 x insert into groupmembers'):
+        client.post('/members/6')
+
+
+def test_repeated_statement_is_logged_in_warn_mode(app, monkeypatch, caplog):
+    monkeypatch.setattr(query_tracking, 'QUERY_TRACKING', 'warn')
+    with caplog.at_level(logging.WARNING, logger='backend.utils.query_tracking'):
+        assert app.test_client().post('/members/6').status_code == 200
+    assert 'POST /members/<int:count> repeated statements' in caplog.text
+
+
+def test_assert_max_queries_counts_every_statement():
+    cursor = InstrumentedCursor(FakeCursor())
+    with assert_max_queries(2):
+        cursor.execute("SELECT 1")
+        cursor.executemany("INSERT INTO t (a) VALUES (%s)", [(1,), (2,)])
+
+    with pytest.raises(AssertionError, match='3 queries, expected at most 2'):
+        with assert_max_queries(2):
+            for _ in range(3):
+                cursor.execute("SELECT 1")
+
+    with pytest.raises(RepeatedQueryError):
+        with assert_max_queries(10, repeat_limit=2):
+            for _ in range(3):
+                cursor.execute("SELECT 1")
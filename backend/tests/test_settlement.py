@@ -0,0 +1,37 @@
+from backend.benchmarks.bench_settlement import synthetic_debts
+from backend.utils.settlement import net_balances, settle, zero_sum
+
+
+def apply_transfers(balances, transfers):
+    result = dict(balances)
+    for from_user_id, to_user_id, cents in transfers:
+        result[from_user_id] += cents
+        result[to_user_id] -= cents
+    return result
+
+
+def test_chain_is_netted_into_one_transfer():
+    balances = net_balances([(1, 2, '10.00'), (2, 3, '10.00')])
+    assert settle(balances) == [(1, 3, 1000)]
+
+
+def test_cycle_needs_no_transfers():
+    balances = net_balances([(1, 2, 5), (2, 3, 5), (3, 1, 5)])
+    assert settle(balances) == []
+
+
+def test_large_group_settles_with_at_most_n_minus_one_transfers():
+    balances = net_balances(synthetic_debts(members=50, debts=3000, seed=7))
+    transfers = settle(balances)
+
+    assert len(transfers) <= len(balances) - 1
+    assert all(cents > 0 for _, _, cents in transfers)
+    assert all(value == 0 for value in apply_transfers(balances, transfers).values())
+
+
+def test_rounding_remainder_goes_to_the_largest_balance():
+    # Three thirds of 10.00 EUR converted and rounded separately
+    balances = zero_sum({1: 1334, 2: -667, 3: -666})
+
+    assert balances == {1: 1333, 2: -667, 3: -666}
+    assert all(value == 0 for value in apply_transfers(balances, settle(balances)).values())
@@ -0,0 +1,90 @@
+import json
+import logging
+import queue
+import sys
+import pytest
+from flask import Flask
+from backend.utils import structured_logging
+from backend.utils.structured_logging import (
+    DebugSampler, JsonFormatter, RequestQueueHandler, parse_levels
+)
+
+
+def make_record(level=logging.INFO, msg='Created debt %s', args=(7,), **extra):
+    record = logging.LogRecord('backend.routes.debts', level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    structured_logging.init_app(app)
+
+    @app.route('/ping')
+    def ping():
+        return {'requestId': structured_logging.current_request_id()}
+
+    return app
+
+
+def test_request_id_is_echoed_or_generated(app):
+    client = app.test_client()
+
+    response = client.get('/ping', headers={'X-Request-ID': 'abc-123'})
+    assert response.headers['X-Request-ID'] == 'abc-123'
+    assert response.json['requestId'] == 'abc-123'
+
+    response = client.get('/ping', headers={'X-Request-ID': 'not ok'})
+    assert len(response.headers['X-Request-ID']) == 32
+    assert response.headers['X-Request-ID'] != 'not ok'
+
+
+def test_queue_handler_tags_records_and_json_keeps_extras(app):
+    handler = RequestQueueHandler(queue.Queue())
+    with app.test_request_context('/ping', headers={'X-Request-ID': 'req-1'}):
+        app.preprocess_request()
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = make_record(groupId=3)
+            record.exc_info = sys.exc_info()
+            handler.emit(record)
+
+    queued = handler.queue.get_nowait()
+    assert queued.exc_info is None and queued.args is None
+    entry = json.loads(JsonFormatter().format(queued))
+    assert entry['message'] == 'Created debt 7'
+    assert entry['requestId'] == 'req-1'
+    assert entry['groupId'] == 3
+    assert entry['level'] == 'INFO'
+    assert 'ValueError: boom' in entry['exception']
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = RequestQueueHandler(queue.Queue(maxsize=1))
+    handler.emit(make_record())
+    handler.emit(make_record())
+
+    assert handler.stats() == {'queued': 1, 'dropped': 1}
+
+
+def test_debug_sampling_keeps_whole_requests(app):
+    sampler = DebugSampler(0.5)
+    assert sampler.filter(make_record(level=logging.WARNING))
+
+    kept = 0
+    for n in range(200):
+        with app.test_request_context('/ping', headers={'X-Request-ID': f'req-{n}'}):
+            app.preprocess_request()
+            decisions = {sampler.filter(make_record(level=logging.DEBUG)) for _ in range(3)}
+        assert len(decisions) == 1
+        kept += decisions.pop()
+    assert 60 < kept < 140
+
+
+def test_parse_levels():
+    assert parse_levels('backend.routes=debug, werkzeug=WARNING,') == {
+        'backend.routes': 'DEBUG', 'werkzeug': 'WARNING'}
+    with pytest.raises(ValueError):
+        parse_levels('backend=LOUD')
@@ -0,0 +1,152 @@
+import time
+import pytest
+from flask import Flask, jsonify
+from backend.utils import auth
+from backend.utils.auth import generate_token, token_required
+from backend.utils.token_cache import TOKEN_LIFETIME_SECONDS, TokenCache
+
+
+class FakeDatabase:
+    """revoked_tokens and users.TokensValidAfter, for every connection."""
+
+    def __init__(self):
+        self.revoked_tokens = {}
+        self.valid_after = {7: None}
+
+    def connection(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self.row = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=()):
+        if 'INSERT INTO revoked_tokens' in query:
+            self.db.revoked_tokens[params[0]] = params[1]
+        elif 'UPDATE users SET TokensValidAfter' in query:
+            self.db.valid_after[params[1]] = params[0]
+        elif 'FROM users u' in query:
+            digest, now, user_id = params
+            revoked = self.db.revoked_tokens.get(digest, 0) > now
+            self.row = (self.db.valid_after[user_id], int(revoked)) if user_id in self.db.valid_after else None
+
+    def fetchone(self):
+        return self.row
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(auth, 'get_db_connection', db.connection)
+    return db
+
+
+@pytest.fixture
+def client(monkeypatch, db):
+    cache = TokenCache(max_size=2, ttl=60)
+    monkeypatch.setattr(auth, 'token_cache', cache)
+    monkeypatch.setattr('backend.utils.token_cache.token_cache', cache)
+
+    app = Flask(__name__)
+
+    @app.route('/me')
+    @token_required
+    def me(current_user_id):
+        return jsonify({'user_id': current_user_id})
+
+    client = app.test_client()
+    client.cache = cache
+    return client
+
+
+def get_me(client, token):
+    return client.get('/me', headers={'Authorization': f'Bearer {token}'})
+
+
+def test_token_is_verified_once(client, monkeypatch):
+    token = generate_token(7)
+    assert get_me(client, token).json == {'user_id': 7}
+
+    def fail(*args, **kwargs):
+        raise AssertionError('cached token was decoded again')
+    monkeypatch.setattr(auth.jwt, 'decode', fail)
+
+    assert get_me(client, token).json == {'user_id': 7}
+    assert client.cache.stats()['hits'] == 1
+    assert client.cache.stats()['misses'] == 1
+
+
+def test_cache_is_bounded():
+    cache = TokenCache(max_size=2, ttl=60)
+    for user_id in range(3):
+        cache.put(f'token-{user_id}', {'user_id': user_id, 'exp': time.time() + 60})
+    assert cache.get('token-0') is None
+    assert cache.get('token-2') == 2
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entry_expires_with_token():
+    cache = TokenCache(ttl=60)
+    cache.put('token', {'user_id': 1, 'exp': time.time() - 1})
+    assert cache.get('token') is None
+
+
+def test_revoked_token_is_rejected(client):
+    token = generate_token(7)
+    assert get_me(client, token).status_code == 200
+
+    auth.revoke_bearer_token(f'Bearer {token}')
+
+    response = get_me(client, token)
+    assert response.status_code == 401
+    assert response.json['error'] == 'Token has been revoked'
+
+
+def test_password_change_revokes_older_tokens(client):
+    old_token = generate_token(7)
+    assert get_me(client, old_token).status_code == 200
+
+    auth.revoke_user_tokens(auth.get_db_connection().cursor(), 7)
+    new_token = generate_token(7)
+
+    assert get_me(client, old_token).status_code == 401
+    assert get_me(client, new_token).status_code == 200
+
+
+def test_revocations_outlive_the_process(client, monkeypatch):
+    logged_out = generate_token(7)
+    old_token = generate_token(7)
+    auth.revoke_bearer_token(f'Bearer {logged_out}')
+    auth.revoke_user_tokens(auth.get_db_connection().cursor(), 7)
+
+    # A restarted worker (or one that missed the broadcast) starts empty
+    restarted = TokenCache(max_size=2, ttl=60)
+    monkeypatch.setattr(auth, 'token_cache', restarted)
+    monkeypatch.setattr('backend.utils.token_cache.token_cache', restarted)
+
+    assert get_me(client, logged_out).status_code == 401
+    assert get_me(client, old_token).status_code == 401
+    assert get_me(client, generate_token(7)).status_code == 200
+
+
+def test_tokens_of_deleted_users_are_rejected(client, db):
+    del db.valid_after[7]
+    assert get_me(client, generate_token(7)).status_code == 401
+
+
+def test_user_cutoffs_are_pruned_after_the_token_lifetime():
+    cache = TokenCache(ttl=60)
+    cache.apply_revocation({'userId': 1, 'before': time.time() - TOKEN_LIFETIME_SECONDS - 1})
+    cache.apply_revocation({'userId': 2, 'before': time.time()})
+    assert cache.stats()['revokedUsers'] == 1
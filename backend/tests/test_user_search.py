@@ -0,0 +1,125 @@
+import threading
+import time
+from backend.utils.user_search import (
+    USER_SEARCH_RELOAD_SECONDS, USER_SEARCH_REFRESH_SECONDS, UserSearchIndex
+)
+
+
+def build():
+    index = UserSearchIndex()
+    index.bulk_load([
+        (1, 'Ahmet Yilmaz', 'ahmet.yilmaz@gmail.com'),
+        (2, 'Mehmet Ahmetoglu', 'mehmet@itu.edu.tr'),
+        (3, 'Ayse Kaya', 'ayse.k@hotmail.com'),
+        (4, 'Zeynep Ahmet', 'z.ahmet@outlook.com'),
+    ])
+    return index
+
+
+def test_prefix_matches_are_ranked_first():
+    # Full-name prefix, then name words (Ahmetoglu sorts after Ahmet)
+    assert build().search('ahm') == [1, 4, 2]
+
+
+def test_email_and_domain_tokens():
+    index = build()
+    assert index.search('mehmet@') == [2]
+    assert index.search('itu') == [2]
+    assert index.search('ayse.k') == [3]
+
+
+def test_exclude_and_limit():
+    index = build()
+    assert index.search('ahm', exclude=1) == [4, 2]
+    assert index.search('ahm', limit=1) == [1]
+
+
+def test_incremental_add_and_remove():
+    index = build()
+    index.add(5, 'Ahmad Kareem', 'ak@example.com')
+    assert index.search('ahma') == [5]
+    index.remove(1)
+    assert 1 not in index.search('ahm')
+    assert index.max_user_id == 5
+
+
+class FakeConnection:
+    """Serves Users rows with UserID above the bound high-water mark."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.after = []
+
+    def cursor(self, buffered=True):
+        return self
+
+    def execute(self, query, params):
+        self.after.append(params[0])
+        self.pending = [row for row in self.rows if row[0] > params[0]]
+
+    def fetchmany(self, size):
+        batch, self.pending = self.pending[:size], self.pending[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+def test_refresh_sees_lower_ids_committed_after_a_local_add():
+    index = build()
+    index.refreshed_at = time.monotonic() - USER_SEARCH_REFRESH_SECONDS
+    # Registered on this worker while another one committed user 5
+    index.add(10, 'Ahmad Kareem', 'ak@example.com')
+    connection = FakeConnection([(5, 'Ahmed Demir', 'ademir@example.com'),
+                                 (10, 'Ahmad Kareem', 'ak@example.com')])
+
+    index.refresh(connection)
+
+    assert connection.after == [4]
+    assert index.search('ahmed') == [5]
+    assert index.synced_user_id == 10
+
+
+def test_apply_published_changes():
+    index = build()
+    index.apply({'op': 'add', 'userId': 2, 'name': 'Mehmet Ozturk', 'email': 'mehmet@itu.edu.tr'})
+    assert index.search('ozt') == [2]
+    assert 2 not in index.search('ahm')
+    index.apply({'op': 'remove', 'userId': 3})
+    assert index.search('ayse') == []
+
+
+class BlockingConnection(FakeConnection):
+    """Holds the reload's table read until released."""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def fetchmany(self, size):
+        self.reading.set()
+        assert self.release.wait(5)
+        return super().fetchmany(size)
+
+
+def test_search_is_served_while_a_reload_runs():
+    index = build()
+    index.loaded_at = time.monotonic() - USER_SEARCH_RELOAD_SECONDS
+    connection = BlockingConnection([(1, 'Ahmet Yilmaz', 'ahmet.yilmaz@gmail.com'),
+                                     (3, 'Ayse Kaya', 'ayse.k@hotmail.com'),
+                                     (6, 'Ahmed Demir', 'ademir@example.com')])
+    reload = threading.Thread(target=index.refresh, args=(connection,))
+    reload.start()
+    assert connection.reading.wait(5)
+
+    # Another request neither waits for the reload nor starts a second one
+    index.refresh(FakeConnection([]))
+    assert index.search('ahm') == [1, 4, 2]
+    index.remove(3)
+    index.add(7, 'Ahmad Kareem', 'ak@example.com')
+
+    connection.release.set()
+    reload.join(5)
+    assert index.search('ahm') == [7, 6, 1]
+    assert index.search('ayse') == []
@@ -0,0 +1,125 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from backend.utils import user_stats
+from backend.utils.user_stats import (
+    DAILY_COLUMNS, build_summary, dump_totals, fold_daily, new_totals, record_stats_change, stats_deltas
+)
+
+TODAY = date(2024, 6, 30)
+
+
+def debt(status='pending', amount='10.00', created=datetime(2024, 6, 29, 18, 0)):
+    return {'GroupID': 1, 'FromUserID': 2, 'ToUserID': 3, 'Amount': amount,
+            'Currency': 'USD', 'Status': status, 'CreatedDate': created}
+
+
+def daily(day, group_id=1, **values):
+    row = dict.fromkeys(DAILY_COLUMNS, Decimal(0))
+    row.update(Day=day, GroupID=group_id, **{k: Decimal(v) for k, v in values.items()})
+    return row
+
+
+def test_new_debt_splits_owed_and_owing():
+    deltas = stats_deltas([debt()])
+    day = date(2024, 6, 29)
+    assert deltas[(3, day, 1, 'USD')] == [1, 1, Decimal('10.00'), 0, Decimal('10.00'), 0]
+    assert deltas[(2, day, 1, 'USD')] == [1, 1, 0, Decimal('10.00'), 0, Decimal('10.00')]
+
+
+def test_paid_debt_only_moves_open_columns():
+    before = stats_deltas([debt()], -1)
+    after = stats_deltas([debt('paid')])
+    key = (3, date(2024, 6, 29), 1, 'USD')
+    assert [a + b for a, b in zip(before[key], after[key])] == [0, -1, 0, 0, Decimal('-10.00'), 0]
+
+
+def test_summary_windows_and_groups():
+    rows = [
+        daily(date(2024, 6, 28), DebtCount=1, OpenCount=1, OwedAmount='20', OpenOwed='20'),
+        daily(date(2024, 5, 15), group_id=2, DebtCount=1, OwingAmount='5'),
+        daily(date(2023, 1, 1), DebtCount=2, OpenCount=1, OwingAmount='30', OpenOwing='12'),
+    ]
+    summary = build_summary(rows, {1: 'Trip', 2: 'Flat'}, total_groups=3, today=TODAY)
+
+    assert summary['windows']['7d'] == {'debtCount': 1, 'owed': 20.0, 'owing': 0.0, 'net': 20.0}
+    assert summary['windows']['90d']['debtCount'] == 2
+    assert summary['windows']['365d']['owing'] == 5.0
+    assert (summary['owed'], summary['owing'], summary['netBalance']) == (20.0, 12.0, 8.0)
+    assert summary['totalDebts'] == 4 and summary['activeDebts'] == 2
+    assert [(g['groupName'], g['netBalance']) for g in summary['groups']] == [('Trip', 8.0), ('Flat', 0.0)]
+
+
+def test_summary_is_converted_to_the_users_currency():
+    rows = [daily(date(2024, 6, 28), DebtCount=1, OpenCount=1, OwedAmount='10.005', OpenOwed='10.005')]
+    summary = build_summary(rows, {1: 'Trip'}, total_groups=1, today=TODAY,
+                            currency='EUR', rate=Decimal('0.5'), rates_version='v1')
+
+    assert (summary['currency'], summary['ratesVersion']) == ('EUR', 'v1')
+    assert summary['owed'] == 5.0
+    assert summary['windows']['7d']['owed'] == 5.0
+
+
+class FakeCursor:
+    def __init__(self, users):
+        self.users = users
+        self.queries = []
+        self.rows = []
+        self.daily = []
+        self.saved = {}
+
+    def execute(self, query, params=()):
+        self.queries.append(query)
+        if 'FOR UPDATE OF s' in query:
+            self.rows = [self.users[user_id] for user_id in params]
+        elif 'FROM groupsaldo' in query:
+            self.rows = [{'GroupID': group_id, 'GroupName': 'Flat'} for group_id in params]
+
+    def executemany(self, query, rows):
+        self.queries.append(query)
+        if 'INSERT INTO user_stats_daily' in query:
+            self.daily = rows
+        else:
+            self.saved = {row[0]: (json.loads(row[2]), row[3]) for row in rows}
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeRates:
+    def get(self, cursor):
+        return {'USD': Decimal(1), 'EUR': Decimal('0.5')}, 'v1'
+
+
+def locked_user(user_id, rows):
+    totals = fold_daily(new_totals(), rows, TODAY)
+    meta = {'asOf': TODAY.isoformat(), 'currency': 'USD', 'ratesVersion': 'v1',
+            'totalGroups': 2, 'groupNames': {'1': 'Trip'}}
+    return {'UserID': user_id, 'Currency': 'USD', 'AsOf': TODAY, 'Today': TODAY,
+            'Totals': dump_totals(totals, meta)}
+
+
+def test_folding_is_additive():
+    rows = [
+        daily(date(2024, 6, 28), DebtCount=1, OpenCount=1, OwedAmount='20', OpenOwed='20'),
+        daily(date(2023, 1, 1), group_id=2, DebtCount=2, OwingAmount='30'),
+    ]
+    assert fold_daily(fold_daily(new_totals(), rows[:1], TODAY), rows[1:], TODAY) == \
+        fold_daily(new_totals(), rows, TODAY)
+
+
+def test_debt_write_updates_running_totals_without_reading_daily_rows(monkeypatch):
+    monkeypatch.setattr(user_stats, 'rate_cache', FakeRates())
+    history = [daily(date(2024, 6, 1), DebtCount=1, OpenCount=1, OwedAmount='5', OpenOwed='5')]
+    cursor = FakeCursor({2: locked_user(2, []), 3: locked_user(3, history)})
+    new_debt = dict(debt(amount='10.00'), GroupID=2, Currency='EUR', CreatedDate=None)
+
+    record_stats_change(cursor, after=[new_debt])
+
+    assert not any('FROM user_stats_daily' in query for query in cursor.queries)
+    # The day of a row just inserted is the database's date
+    assert {row[1] for row in cursor.daily} == {TODAY}
+    summary = cursor.saved[3][0]
+    assert (summary['owed'], summary['windows']['7d']['owed']) == (25.0, 20.0)
+    assert [(g['groupName'], g['owed']) for g in summary['groups']] == [('Trip', 5.0), ('Flat', 20.0)]
+    assert cursor.saved[2][0]['owing'] == 20.0
@@ -1,17 +1,52 @@
 import jwt
+import time
 import datetime
 from functools import wraps
 from flask import request, jsonify
+from ..database_config import get_db_connection
+from .token_cache import (
+    TOKEN_LIFETIME_SECONDS, token_cache, start_revocation_listener, load_revocation,
+    revoke_token, revoke_user
+)
 
 SECRET_KEY = 'your-secret-key-here'  # Gerçek uygulamada environment variable kullanın
 
 def generate_token(user_id):
     token = jwt.encode({
         'user_id': user_id,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(days=1)
+        'iat': time.time(),
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=TOKEN_LIFETIME_SECONDS)
     }, SECRET_KEY, algorithm='HS256')
     return token
 
+def revoke_bearer_token(header):
+    token = header.split(' ')[1]
+    data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        revoke_token(cursor, token, data['exp'])
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+def revoke_user_tokens(cursor, user_id):
+    """Call before committing the password change, with its cursor."""
+    revoke_user(cursor, user_id)
+
+def _is_revoked(token, data):
+    if token_cache.is_revoked(token, data):
+        return True
+    # Not cached here: another worker or an earlier process may have revoked it
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        return load_revocation(cursor, token, data)
+    finally:
+        cursor.close()
+        connection.close()
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -22,12 +57,23 @@ def token_required(f):
 
         try:
             token = token.split(' ')[1]  # "Bearer <token>" formatından token'ı al
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            current_user_id = data['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
+        except IndexError:
             return jsonify({'error': 'Invalid token'}), 401
 
+        start_revocation_listener()
+        current_user_id = token_cache.get(token)
+        if current_user_id is None:
+            try:
+                data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+            except jwt.ExpiredSignatureError:
+                return jsonify({'error': 'Token has expired'}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({'error': 'Invalid token'}), 401
+
+            if _is_revoked(token, data):
+                return jsonify({'error': 'Token has been revoked'}), 401
+            token_cache.put(token, data)
+            current_user_id = data['user_id']
+
         return f(current_user_id, *args, **kwargs)
     return decorated 
\ No newline at end of file
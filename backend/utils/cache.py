@@ -0,0 +1,237 @@
+"""
+Read-through cache for rarely changing reads (group metadata, membership).
+
+Values live in an in-process LRU and, optionally, a shared backend that all
+workers read through:
+
+    local   only the in-process LRU (single worker, tests)
+    redis   Redis behind the LRU; needs the redis package and CACHE_REDIS_URL
+
+Select with CACHE_BACKEND=local|redis. Every entry has a TTL; writers call
+invalidate() after commit, which drops the keys locally and from the shared
+backend and broadcasts them over the pub/sub hub so the other workers evict
+their LRU copies too. The TTL bounds staleness if a broadcast is missed.
+With neither a shared backend nor PUBSUB_BACKEND=broker, invalidations
+never leave the process, so LRU entries only live CACHE_LOCAL_TTL seconds.
+A load that an invalidation (local or broadcast) overtakes is returned to
+its caller but not cached, since it may have read the rows before the write.
+
+Keys are "<family>:<id>". Hits and misses are counted per family.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from .pubsub import PUBSUB_BACKEND, get_hub
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_SIZE = int(os.environ.get('CACHE_SIZE', 10000))
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+# With a shared backend the LRU only absorbs bursts; the shared copy is authoritative.
+# Also the LRU TTL when invalidations cannot reach the other workers.
+CACHE_LOCAL_TTL = float(os.environ.get('CACHE_LOCAL_TTL', 5))
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+_MISSING = object()
+
+
+def cache_key(family, key):
+    return f'{family}:{key}'
+
+
+class LocalBackend:
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[1] <= now:
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Values are pickled; they only ever come from our own database reads."""
+
+    def __init__(self, url=CACHE_REDIS_URL, prefix='saldo:'):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis needs the redis package installed')
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self._client.get(self.prefix + key)
+        return _MISSING if data is None else pickle.loads(data)
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, pickle.dumps(value), px=int(ttl * 1000))
+
+    def delete(self, keys):
+        if keys:
+            self._client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+def create_shared_backend(name=CACHE_BACKEND):
+    if name == 'redis':
+        return RedisBackend()
+    if name != 'local':
+        raise ValueError(f'Unknown CACHE_BACKEND: {name}')
+    return None
+
+
+class ReadThroughCache:
+    def __init__(self, local=None, shared=None, ttl=CACHE_TTL, local_ttl=CACHE_LOCAL_TTL,
+                 broadcast=PUBSUB_BACKEND == 'broker'):
+        self.local = local or LocalBackend()
+        self.shared = shared
+        self.ttl = ttl
+        # Only a broadcast reaching every worker makes a long-lived LRU copy safe
+        self.local_ttl = ttl if shared is None and broadcast else min(ttl, local_ttl)
+        self._lock = threading.Lock()
+        self._stats = {}
+        # key: [generation, loads in flight]; kept only while a load is running
+        self._loading = {}
+
+    def _count(self, family, field):
+        with self._lock:
+            counts = self._stats.setdefault(family, {'hits': 0, 'misses': 0, 'invalidations': 0})
+            counts[field] += 1
+
+    def get_or_load(self, family, key, loader, ttl=None):
+        """Returns the cached value, or calls loader() and caches what it returns."""
+        key = cache_key(family, key)
+        value = self.local.get(key)
+        if value is _MISSING and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not _MISSING:
+                self.local.set(key, value, self.local_ttl)
+        if value is not _MISSING:
+            self._count(family, 'hits')
+            return value
+
+        self._count(family, 'misses')
+        generation = self._begin_load(key)
+        try:
+            value = loader()
+        finally:
+            current = self._end_load(key, generation)
+        if not current:
+            # Invalidated while loading: the loader may have read the rows before the
+            # write committed, so hand the value out but do not cache it
+            return value
+        ttl = ttl or self.ttl
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+        self.local.set(key, value, min(ttl, self.local_ttl))
+        return value
+
+    def _begin_load(self, key):
+        with self._lock:
+            entry = self._loading.setdefault(key, [0, 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _end_load(self, key, generation):
+        """True if the key was not invalidated since _begin_load returned generation."""
+        with self._lock:
+            entry = self._loading[key]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._loading[key]
+            return entry[0] == generation
+
+    def _bump(self, keys):
+        with self._lock:
+            for key in keys:
+                entry = self._loading.get(key)
+                if entry:
+                    entry[0] += 1
+
+    def evict_local(self, keys):
+        self._bump(keys)
+        self.local.delete(keys)
+
+    def invalidate(self, *family_keys):
+        """family_keys: (family, key) pairs; call after the write commits."""
+        keys = sorted({cache_key(family, key) for family, key in family_keys})
+        if not keys:
+            return
+        for family, _ in set(family_keys):
+            self._count(family, 'invalidations')
+        self._bump(keys)
+        self.local.delete(keys)
+        if self.shared is not None:
+            self.shared.delete(keys)
+        get_hub().publish(INVALIDATION_CHANNEL, {'keys': keys})
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for family, counts in self._stats.items():
+                lookups = counts['hits'] + counts['misses']
+                result[family] = dict(counts, hitRatio=counts['hits'] / lookups if lookups else 0.0)
+            return result
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _listen(cache):
+    subscription = get_hub().subscribe(INVALIDATION_CHANNEL)
+    while True:
+        message = subscription.get()
+        if message:
+            cache.evict_local(message['keys'])
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache = ReadThroughCache(shared=create_shared_backend())
+                threading.Thread(
+                    target=_listen, args=(cache,), name='cache-invalidations', daemon=True).start()
+                _cache = cache
+    return _cache
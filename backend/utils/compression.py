@@ -0,0 +1,136 @@
+"""
+Negotiated response compression.
+
+An after_request hook gzip- or deflate-encodes response bodies when the
+client's Accept-Encoding allows it (gzip preferred on equal quality). It
+leaves alone:
+
+    - streamed responses (exports, SSE, large JSON arrays): they are never
+      buffered here
+    - bodies under COMPRESSION_MIN_SIZE bytes (500)
+    - types outside COMPRESSIBLE_TYPES, responses already encoded and
+      responses marked Cache-Control: no-transform
+
+A compressed response's ETag is made weak, since the bytes differ from the
+identity encoding's. When the response has a strong ETag, the compressed
+body is kept in an in-process LRU (COMPRESSION_CACHE_SIZE entries, 256)
+keyed by path, ETag and encoding, so repeated reads of an unchanged list
+skip the compression. Bytes saved are counted in
+saldo_http_compression_saved_bytes_total.
+"""
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from flask import request
+from .instrumentation import registry
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 500))
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))
+
+ENCODINGS = ('gzip', 'deflate')
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain',
+}
+
+
+def compress(data, encoding, level=COMPRESSION_LEVEL):
+    if encoding == 'gzip':
+        # Fixed mtime: the same body always compresses to the same bytes
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zlib.compress(data, level)
+
+
+class CompressedBodyCache:
+    """Bounded LRU of compressed bodies keyed by (path, etag, encoding)."""
+
+    def __init__(self, size=COMPRESSION_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+body_cache = CompressedBodyCache()
+
+
+def negotiate(accept_encodings):
+    """Best of ENCODINGS the client accepts, or None for identity."""
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def _compressible(response):
+    if response.is_streamed or response.direct_passthrough:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or request.method == 'HEAD':
+        return False
+    if response.cache_control.no_transform:
+        return False
+    return response.mimetype in COMPRESSIBLE_TYPES
+
+
+def compress_response(response):
+    if not _compressible(response):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    # The body depends on Accept-Encoding from here on, sent or not
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    key = (request.full_path, etag, encoding) if etag and not weak else None
+    body = body_cache.get(key) if key else None
+    if body is None:
+        body = compress(data, encoding)
+        if key:
+            body_cache.set(key, body)
+    else:
+        registry.inc('saldo_http_compression_cache_hits_total', {'encoding': encoding})
+
+    if len(body) >= len(data):
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(etag, weak=True)
+
+    rule = request.url_rule
+    labels = {'endpoint': rule.rule if rule is not None else 'unmatched', 'encoding': encoding}
+    registry.inc('saldo_http_compressed_responses_total', labels)
+    registry.inc('saldo_http_compression_saved_bytes_total', labels, len(data) - len(body))
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
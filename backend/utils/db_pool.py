@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+from mysql.connector import Error
+
+
+class PoolTimeoutError(Error):
+    pass
+
+
+class PooledConnection:
+    """Wraps a raw connection so close() hands it back to the pool."""
+
+    def __init__(self, pool, raw, scoped=False):
+        self._pool = pool
+        self._raw = raw
+        self._scoped = scoped
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool.cursor_wrapper is not None:
+            cursor = self._pool.cursor_wrapper(cursor)
+        return cursor
+
+    def close(self):
+        # Request-scoped connections are released in teardown, not by handlers
+        if self._scoped:
+            return
+        self.release()
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw)
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=10, max_overflow=5, timeout=30.0,
+                 recycle=3600, pre_ping=True, cursor_wrapper=None):
+        self._connect = connect
+        self.cursor_wrapper = cursor_wrapper
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()
+        self._created_at = {}
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recycled = 0
+
+    def checkout(self, scoped=False):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    raw = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        msg=f'Timed out after {self.timeout}s waiting for a database connection')
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+        try:
+            raw = self._prepare(raw)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return PooledConnection(self, raw, scoped=scoped)
+
+    def _prepare(self, raw):
+        if raw is not None and self._is_stale(raw):
+            self._discard(raw)
+            with self._cond:
+                self._recycled += 1
+            raw = None
+        if raw is None:
+            raw = self._connect()
+            self._created_at[id(raw)] = time.monotonic()
+        return raw
+
+    def _is_stale(self, raw):
+        created = self._created_at.get(id(raw), 0)
+        if self.recycle is not None and time.monotonic() - created > self.recycle:
+            return True
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                return True
+        return False
+
+    def _discard(self, raw):
+        self._created_at.pop(id(raw), None)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release(self, raw):
+        try:
+            # Never hand out a connection with a half-finished transaction
+            raw.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.size:
+                self._idle.append(raw)
+                raw = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def dispose(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'maxOverflow': self.max_overflow,
+                'open': self._open,
+                'inUse': self._in_use,
+                'idle': len(self._idle),
+                'overflow': max(0, self._open - self.size),
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'waitTotalSeconds': self._wait_total,
+                'waitMaxSeconds': self._wait_max,
+                'waitAvgSeconds': (self._wait_total / self._checkouts
+                                   if self._checkouts else 0.0),
+            }
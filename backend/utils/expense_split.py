@@ -0,0 +1,72 @@
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+
+CENT = Decimal('0.01')
+
+
+def to_amount(value):
+    try:
+        amount = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError('Amount must be a number')
+    if not amount.is_finite():
+        raise ValueError('Amount must be a number')
+    return amount.quantize(CENT)
+
+
+def equal_shares(total, user_ids):
+    if not user_ids:
+        raise ValueError('At least one participant is required')
+
+    count = len(user_ids)
+    base = (total / count).quantize(CENT, rounding=ROUND_DOWN)
+    # Leftover cents go to the first participants so shares add up to total
+    leftover = int((total - base * count) / CENT)
+    return [
+        (user_id, base + CENT if index < leftover else base)
+        for index, user_id in enumerate(user_ids)
+    ]
+
+
+def exact_shares(total, shares):
+    if not shares:
+        raise ValueError('At least one share is required')
+
+    if not isinstance(shares, list):
+        raise ValueError('shares must be a list')
+
+    result = []
+    for share in shares:
+        if not isinstance(share, dict):
+            raise ValueError('Each share must be an object')
+        user_id = share.get('userId')
+        if user_id is None:
+            raise ValueError('Each share needs a userId')
+        amount = to_amount(share.get('amount'))
+        if amount < 0:
+            raise ValueError('Share amounts cannot be negative')
+        result.append((int(user_id), amount))
+
+    if sum(amount for _, amount in result) != total:
+        raise ValueError('Shares must add up to the total amount')
+    return result
+
+
+def split_shares(total, split, member_ids):
+    """Returns [(user_id, amount)] for everyone sharing the expense, payer included."""
+    if not isinstance(split, dict):
+        raise ValueError('split must be an object')
+    mode = split.get('mode', 'equal')
+    if mode == 'equal':
+        user_ids = split.get('userIds') or member_ids
+        if not isinstance(user_ids, list):
+            raise ValueError('userIds must be a list')
+        user_ids = [int(u) for u in user_ids]
+        if len(set(user_ids)) != len(user_ids):
+            raise ValueError('Participants must be unique')
+        return equal_shares(total, user_ids)
+    if mode == 'exact':
+        shares = exact_shares(total, split.get('shares'))
+        if len({user_id for user_id, _ in shares}) != len(shares):
+            raise ValueError('Participants must be unique')
+        return shares
+    raise ValueError(f'Unknown split mode: {mode}')
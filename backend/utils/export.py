@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_QUERIES = {
+    'debts': """
+        SELECT DebtID, FromUserID, ToUserID, Amount, Currency, Status, Description
+        FROM debts
+        WHERE GroupID = %s
+        ORDER BY DebtID
+    """,
+    'expenses': """
+        SELECT ExpenseID, UserID, Amount, Description, Date
+        FROM expenses
+        WHERE GroupID = %s
+        ORDER BY ExpenseID
+    """,
+}
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows
+        )
+
+
+def _csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def open_export(connection, records, group_id):
+    # Unbuffered: rows stay on the server until fetchmany() asks for them
+    cursor = connection.cursor(buffered=False)
+    cursor.execute(EXPORT_QUERIES[records], (group_id,))
+    return cursor
+
+
+def stream_rows(cursor, fmt, batch_size=EXPORT_BATCH_SIZE):
+    columns = [col[0] for col in cursor.description]
+
+    def batches():
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+    chunks = _csv_chunks if fmt == 'csv' else _ndjson_chunks
+    yield from chunks(columns, batches())
+
+
+def close_export(cursor, connection):
+    try:
+        cursor.close()
+    except Exception:
+        # Unread rows after an aborted download; the pool drops the connection
+        pass
+    connection.close()
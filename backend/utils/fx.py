@@ -0,0 +1,236 @@
+"""
+Currency conversion against a local FX rate table.
+
+fx_rates has one row per currency. Rate is how many units of the currency
+one unit of FX_BASE_CURRENCY (USD) buys, so the base row is 1 and
+
+    amount in target = amount / Rate[source] * Rate[target]
+
+Rates come from a file, never from the network:
+
+    python -m backend.utils.fx load rates.csv    # "EUR,0.92" per line
+    python -m backend.utils.fx load rates.json   # {"base": "EUR", "rates": {"USD": 1.08}}
+    python -m backend.utils.fx list
+
+A file quoted against another base (--base, or "base" in JSON) is rebased
+on load, so it has to contain FX_BASE_CURRENCY.
+
+Each process keeps the table in memory for FX_CACHE_TTL seconds (60).
+Aggregates convert inside SQL: to_base_sql() turns the cached rates into a
+CASE over the currency column, so SUM() adds up amounts in any mix of
+currencies in one statement. A currency the cache has not seen yet falls
+back to a lookup in fx_rates; debts.Currency references fx_rates, so that
+lookup always finds a row instead of turning the amount into NULL.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+FX_BASE_CURRENCY = os.environ.get('FX_BASE_CURRENCY', 'USD').upper()
+FX_CACHE_TTL = float(os.environ.get('FX_CACHE_TTL', 60))
+
+RATE_SCALE = Decimal('1e-10')
+# 1 / Rate as sent to MySQL: amount (scale 2) * inverse (18) * rate (10) stays
+# within DECIMAL's 30 digit scale
+INVERSE_SCALE = Decimal('1e-18')
+CENT = Decimal('0.01')
+
+_CODE = re.compile(r'^[A-Z]{3}$')
+
+UPSERT_RATE_QUERY = """
+    INSERT INTO fx_rates (Currency, Rate)
+    VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE Rate = VALUES(Rate)
+"""
+
+
+class FxError(ValueError):
+    pass
+
+
+def normalize_currency(code):
+    code = str(code or '').strip().upper()
+    if not _CODE.match(code):
+        raise FxError(f'Invalid currency code: {code!r}')
+    return code
+
+
+def _rate(value):
+    try:
+        rate = Decimal(str(value))
+    except InvalidOperation:
+        raise FxError(f'Invalid rate: {value!r}')
+    if not rate.is_finite() or rate <= 0:
+        raise FxError(f'Invalid rate: {value!r}')
+    return rate
+
+
+def rebase(rates, base, to_base=FX_BASE_CURRENCY):
+    """Re-expresses {currency: units per one `base`} per one `to_base`."""
+    rates = dict(rates, **{base: Decimal(1)})
+    if to_base not in rates:
+        raise FxError(f'Rates quoted in {base} must include {to_base}')
+    factor = rates[to_base]
+    return {code: (rate / factor).quantize(RATE_SCALE, ROUND_HALF_UP) for code, rate in rates.items()}
+
+
+def parse_rates(path, base=FX_BASE_CURRENCY):
+    """Reads a CSV (currency,rate per line) or JSON rates file; returns rates per FX_BASE_CURRENCY."""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            data = json.load(f, parse_float=Decimal)
+            base = data.get('base', base)
+            entries = data['rates'].items()
+        else:
+            entries = [
+                row[:2] for row in csv.reader(f)
+                if row and not row[0].startswith('#') and row[0].strip().lower() != 'currency'
+            ]
+    rates = {normalize_currency(code): _rate(rate) for code, rate in entries}
+    return rebase(rates, normalize_currency(base))
+
+
+def load_rates(cursor, rates):
+    """Upserts {currency: rate per FX_BASE_CURRENCY}; the base itself is always 1."""
+    rates = dict(rates, **{FX_BASE_CURRENCY: Decimal(1)})
+    cursor.executemany(UPSERT_RATE_QUERY, sorted(rates.items()))
+    rate_cache.invalidate()
+    return len(rates)
+
+
+def rates_version(rates):
+    return '%08x' % zlib.crc32(repr(sorted(rates.items())).encode())
+
+
+class RateCache:
+    """fx_rates in memory, reread at most every ttl seconds."""
+
+    def __init__(self, ttl=FX_CACHE_TTL):
+        self.ttl = ttl
+        self._rates = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, cursor):
+        cursor.execute("SELECT Currency, Rate FROM fx_rates")
+        rates = {}
+        for row in cursor.fetchall():
+            code, rate = (row['Currency'], row['Rate']) if isinstance(row, dict) else row
+            rates[code] = Decimal(str(rate))
+        rates.setdefault(FX_BASE_CURRENCY, Decimal(1))
+        return rates
+
+    def get(self, cursor):
+        """(rates, version); cursor is only used when the cache is stale."""
+        with self._lock:
+            if self._rates is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._rates, self._version
+        rates = self._load(cursor)
+        with self._lock:
+            self._rates = rates
+            self._version = rates_version(rates)
+            self._loaded_at = time.monotonic()
+            return self._rates, self._version
+
+    def rates(self, cursor):
+        return self.get(cursor)[0]
+
+    def invalidate(self):
+        with self._lock:
+            self._rates = None
+
+
+rate_cache = RateCache()
+
+
+def resolve_currency(rates, code):
+    """code if there is a rate for it, else FX_BASE_CURRENCY (users with no or an unknown currency)."""
+    code = str(code or '').strip().upper()
+    return code if code in rates else FX_BASE_CURRENCY
+
+
+def choose_currency(rates, requested=None, preferred=None):
+    """An explicitly requested currency (which must have a rate), else the user's preferred one."""
+    if requested:
+        code = normalize_currency(requested)
+        if code not in rates:
+            raise FxError(f'No exchange rate for {code}')
+        return code
+    return resolve_currency(rates, preferred)
+
+
+def preferred_currency(cursor, user_id):
+    cursor.execute("SELECT Currency FROM users WHERE UserID = %s", (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return row['Currency'] if isinstance(row, dict) else row[0]
+
+
+def convert(amount, source, target, rates):
+    """One amount, rounded to cents; aggregates should use to_base_sql() instead."""
+    amount = Decimal(str(amount))
+    if source != target:
+        amount = amount / rates[source] * rates[target]
+    return amount.quantize(CENT, ROUND_HALF_UP)
+
+
+def to_base_sql(amount_sql, currency_sql, rates):
+    """
+    (sql, params) for amount_sql expressed in FX_BASE_CURRENCY, e.g.
+
+        balance, params = to_base_sql('l.Balance', 'l.Currency', rates)
+        f"SELECT ROUND(SUM({balance}) * %s, 2) ..."
+    """
+    whens = []
+    params = []
+    for code, rate in sorted(rates.items()):
+        whens.append('WHEN %s THEN %s')
+        params += [code, (Decimal(1) / rate).quantize(INVERSE_SCALE, ROUND_HALF_UP)]
+    sql = (f"{amount_sql} * CASE {currency_sql} {' '.join(whens)} "
+           f"ELSE (SELECT ROUND(CAST(1 AS DECIMAL(19, 18)) / r.Rate, 18) FROM fx_rates r "
+           f"WHERE r.Currency = {currency_sql}) END")
+    return sql, params
+
+
+def main(argv=None):
+    from backend.database_config import get_db_connection
+
+    parser = argparse.ArgumentParser(description='Load or list FX rates')
+    parser.add_argument('command', choices=['load', 'list'])
+    parser.add_argument('path', nargs='?', help='CSV or JSON rates file (load)')
+    parser.add_argument('--base', default=FX_BASE_CURRENCY,
+                        help='currency the file is quoted against, if not in the file')
+    args = parser.parse_args(argv)
+    if args.command == 'load' and not args.path:
+        parser.error('load needs a rates file')
+
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        if args.command == 'load':
+            count = load_rates(cursor, parse_rates(args.path, args.base))
+            connection.commit()
+            print(f'{count} rates loaded (base {FX_BASE_CURRENCY})')
+        else:
+            for code, rate in sorted(rate_cache.rates(cursor).items()):
+                print(f'{code} {rate}')
+    except FxError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        cursor.close()
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
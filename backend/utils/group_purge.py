@@ -0,0 +1,129 @@
+"""
+Purge of a soft-deleted group, run as a background job.
+
+delete_group only stamps groupsaldo.DeletedAt; every read filters on it.
+This job then removes the group's rows phase by phase, at most
+PURGE_CHUNK_SIZE rows per step, each step in its own short transaction:
+
+    debts     debts plus their notifications; balance_ledger and
+              notification_state are adjusted in the same transaction
+    expenses  expenses
+    stats     user_stats_daily rows
+    members   groupmembers
+    group     the (now zero) balance_ledger rows and the groupsaldo row
+
+Progress holds the current phase and how many rows each phase removed.
+"""
+import os
+from .ledger import fetch_debts_for_update, record_debt_change
+from .notification_state import bump_notification_state, forget_notification_state
+from .outbox import DEBT_ADDED, DEBT_PAID
+
+PURGE_GROUP = 'purge_group'
+PURGE_CHUNK_SIZE = int(os.environ.get('PURGE_CHUNK_SIZE', 500))
+
+PHASES = ['debts', 'expenses', 'stats', 'members', 'group']
+
+# phase: table purged with DELETE ... WHERE GroupID = %s LIMIT %s
+CHUNKED_DELETES = {
+    'expenses': 'expenses',
+    'stats': 'user_stats_daily',
+    'members': 'groupmembers',
+}
+
+
+class GroupNotDeleted(Exception):
+    pass
+
+
+def _purge_debts(cursor, group_id, chunk_size, progress, after_commit):
+    debts = fetch_debts_for_update(
+        cursor, "GroupID = %s ORDER BY DebtID LIMIT %s", (group_id, chunk_size))
+    if not debts:
+        return 0
+    debt_ids = [debt['DebtID'] for debt in debts]
+    placeholders = ', '.join(['%s'] * len(debt_ids))
+
+    cursor.execute(f"""
+        SELECT UserID, COUNT(*) AS Removed, SUM(IsRead = FALSE) AS Unread
+        FROM notifications
+        WHERE RelatedID IN ({placeholders}) AND Type IN (%s, %s)
+        GROUP BY UserID
+    """, (*debt_ids, DEBT_ADDED, DEBT_PAID))
+    # Every user who loses a notification gets a new version, read ones included,
+    # so their cached list and its ETag are not served again
+    unread = {row['UserID']: -int(row['Unread'] or 0) for row in cursor.fetchall()}
+
+    cursor.execute(f"""
+        DELETE FROM notifications
+        WHERE RelatedID IN ({placeholders}) AND Type IN (%s, %s)
+    """, (*debt_ids, DEBT_ADDED, DEBT_PAID))
+    progress['notifications'] = progress.get('notifications', 0) + cursor.rowcount
+    bump_notification_state(cursor, unread)
+    if unread and after_commit is not None:
+        after_commit.append(lambda: forget_notification_state(*unread))
+
+    record_debt_change(cursor, before=debts)
+    cursor.execute(f"""
+        DELETE FROM debts
+        WHERE DebtID IN ({placeholders})
+    """, debt_ids)
+    progress['debts'] = progress.get('debts', 0) + len(debts)
+    return len(debts)
+
+
+def purge_group_step(cursor, payload, progress, chunk_size=PURGE_CHUNK_SIZE, after_commit=None):
+    """
+    One bounded step of a purge; returns (progress, done). Callables appended
+    to after_commit must be run once the step's transaction has committed.
+    """
+    group_id = payload['groupId']
+    progress = dict(progress)
+    phase = progress.setdefault('phase', PHASES[0])
+
+    cursor.execute("""
+        SELECT DeletedAt FROM groupsaldo
+        WHERE GroupID = %s
+    """, (group_id,))
+    group = cursor.fetchone()
+    if group is None or group['DeletedAt'] is None:
+        raise GroupNotDeleted(f'Group {group_id} is missing or not deleted')
+
+    if phase == 'debts':
+        removed = _purge_debts(cursor, group_id, chunk_size, progress, after_commit)
+    elif phase in CHUNKED_DELETES:
+        cursor.execute(f"""
+            DELETE FROM {CHUNKED_DELETES[phase]}
+            WHERE GroupID = %s
+            LIMIT %s
+        """, (group_id, chunk_size))
+        removed = cursor.rowcount
+        progress[phase] = progress.get(phase, 0) + removed
+    else:
+        for table in ('debts', 'expenses', 'groupmembers'):
+            cursor.execute(f"""
+                SELECT 1 FROM {table}
+                WHERE GroupID = %s
+                LIMIT 1
+            """, (group_id,))
+            if cursor.fetchone():
+                # Writes check the group under a shared lock, so this is only a safety
+                # net for rows written around the routes; go round again
+                progress['phase'] = PHASES[0]
+                return progress, False
+
+        # Every debt is gone, so what is left of the ledger is all zeros
+        cursor.execute("""
+            DELETE FROM balance_ledger
+            WHERE GroupID = %s
+        """, (group_id,))
+        cursor.execute("""
+            DELETE FROM groupsaldo
+            WHERE GroupID = %s AND DeletedAt IS NOT NULL
+        """, (group_id,))
+        progress['phase'] = 'done'
+        return progress, True
+
+    if removed < chunk_size:
+        progress['phase'] = PHASES[PHASES.index(phase) + 1]
+    return progress, False
@@ -0,0 +1,127 @@
+"""
+Password hashing off the request thread.
+
+Key derivation is deliberately CPU-heavy, so hashing and verification run in
+a bounded process pool rather than on the worker's request threads. At most
+PASSWORD_HASH_QUEUE_LIMIT jobs may be queued or running per process. Past
+that, callers get HashingBusy immediately (the routes turn it into a 503)
+instead of piling up behind each other.
+
+verify_password() also reports when a stored hash was made with parameters
+other than PASSWORD_HASH_METHOD, and returns a fresh hash so the caller can
+upgrade it transparently on login.
+
+PASSWORD_HASH_WORKERS=0 hashes inline, which is handy for tests and dev.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get(
+    'PASSWORD_HASH_QUEUE_LIMIT', max(PASSWORD_HASH_WORKERS, 1) * 4))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def hash_method_of(pwhash):
+    return pwhash.split('$', 1)[0]
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password, method, target_method):
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if hash_method_of(pwhash) != target_method:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+class HashingService:
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=PASSWORD_HASH_WORKERS,
+                 queue_limit=PASSWORD_HASH_QUEUE_LIMIT, timeout=PASSWORD_HASH_TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._target_method = None
+        self._counter_lock = threading.Lock()
+        self.rejected = 0
+        self.in_flight = 0
+
+    def _get_executor(self):
+        # Created on first use so each gunicorn worker forks its own pool
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    @property
+    def target_method(self):
+        """Full parameter string (e.g. scrypt:32768:8:1) new hashes carry."""
+        if self._target_method is None:
+            self._target_method = hash_method_of(generate_password_hash('', method=self.method))
+        return self._target_method
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._counter_lock:
+                self.rejected += 1
+            raise HashingBusy('Password hashing is saturated, try again shortly')
+        with self._counter_lock:
+            self.in_flight += 1
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        # The slot is held until the job itself ends: a timed out job keeps its
+        # worker process busy, so it still counts against the queue limit
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingBusy('Password hashing timed out')
+
+    def _release(self, future=None):
+        with self._counter_lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def hash_password(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify_password(self, pwhash, password):
+        """Returns (matches, upgraded_hash_or_None)."""
+        return self._run(_verify, pwhash, password, self.method, self.target_method)
+
+    def stats(self):
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'queueLimit': self.queue_limit,
+            'inFlight': self.in_flight,
+            'rejected': self.rejected,
+        }
+
+
+hasher = HashingService()
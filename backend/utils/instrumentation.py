@@ -0,0 +1,482 @@
+"""
+Request and database instrumentation, exported in Prometheus text format.
+
+before_request/after_request hooks time every request and label it with the
+matched route (never the raw path, so IDs don't explode the label set).
+Pooled connections hand out InstrumentedCursor, which adds each statement's
+execute and fetch time, the statement count and the rows fetched to the
+current request. Statements slower than SLOW_QUERY_MS are logged to the
+backend.slow_query logger with their parameters reduced to type names.
+
+Each gunicorn worker keeps its own registry. With METRICS_DIR set, workers
+write a snapshot to METRICS_DIR/metrics-<pid>.json every
+METRICS_FLUSH_INTERVAL seconds, and a scrape of /metrics on any worker sums
+counters and histograms over every file in the directory. Runtime gauges
+(pool, caches, outbox) are reported per live worker with a pid label. Clear
+the directory when the service is redeployed.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from flask import current_app, g, has_app_context, request
+from .query_tracking import check_repeats, record_query, start_tracking, stop_tracking, tracking_mode
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('backend.slow_query')
+
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_MS', 200)) / 1000
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+GAUGE = 'gauge'
+
+# name: (type, help, buckets)
+METRICS = {
+    'saldo_http_requests_total': (
+        COUNTER, 'Requests by route, method and status.', None),
+    'saldo_http_request_duration_seconds': (
+        HISTOGRAM, 'Time to produce the response.', LATENCY_BUCKETS),
+    'saldo_db_time_seconds': (
+        HISTOGRAM, 'Time spent executing and fetching statements per request.', LATENCY_BUCKETS),
+    'saldo_db_queries_per_request': (
+        HISTOGRAM, 'Statements executed per request.', QUERY_COUNT_BUCKETS),
+    'saldo_db_rows_fetched_total': (
+        COUNTER, 'Rows fetched from the database.', None),
+    'saldo_db_pool_wait_seconds': (
+        HISTOGRAM, 'Time spent waiting for a pooled connection per request.', LATENCY_BUCKETS),
+    'saldo_db_slow_queries_total': (
+        COUNTER, 'Statements slower than SLOW_QUERY_MS.', None),
+    'saldo_http_compressed_responses_total': (
+        COUNTER, 'Responses sent compressed, by route and encoding.', None),
+    'saldo_http_compression_saved_bytes_total': (
+        COUNTER, 'Bytes saved by compressing responses.', None),
+    'saldo_http_compression_cache_hits_total': (
+        COUNTER, 'Compressed bodies reused for an unchanged ETag.', None),
+}
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class Registry:
+    """Counters and histograms keyed by (name, sorted label pairs)."""
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = self.metrics[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        """JSON-friendly copy: non-cumulative bucket counts, sum and count per series."""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value]
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(counts), total, count]
+                               for (name, labels), (counts, total, count) in self._histograms.items()],
+            }
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+_collectors = []
+
+
+def register_collector(collect):
+    """collect() returns [(name, help, labels, value)] gauges read at flush/scrape time."""
+    _collectors.append(collect)
+
+
+def collect_gauges():
+    gauges = []
+    for collect in _collectors:
+        try:
+            gauges.extend(collect())
+        except Exception:
+            logger.exception('Metrics collector %s failed', collect)
+    return [[name, help_text, sorted(labels.items()), value]
+            for name, help_text, labels, value in gauges]
+
+
+# Per-request accounting
+
+class RequestMetrics:
+    __slots__ = ('started', 'db_seconds', 'queries', 'rows', 'pool_wait', 'slow')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.pool_wait = 0.0
+        self.slow = 0
+
+
+def current_request_metrics():
+    return g.get('request_metrics') if has_app_context() else None
+
+
+def record_pool_wait(seconds):
+    metrics = current_request_metrics()
+    if metrics is not None:
+        metrics.pool_wait += seconds
+
+
+def redact(params):
+    """Parameters reduced to their types so slow-query logs never carry user data."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+class InstrumentedCursor:
+    """
+    Delegates to a DB-API cursor, timing execute() and the fetches that
+    follow it. A statement is finished (and checked against the slow-query
+    threshold) when the next one starts or the cursor is closed.
+    """
+
+    def __init__(self, cursor, slow_seconds=None):
+        self._cursor = cursor
+        self._slow_seconds = SLOW_QUERY_SECONDS if slow_seconds is None else slow_seconds
+        self._statement = None
+        self._params = None
+        self._elapsed = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _timed(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._elapsed += elapsed
+            metrics = current_request_metrics()
+            if metrics is not None:
+                metrics.db_seconds += elapsed
+
+    def _start(self, operation, params):
+        self._finish()
+        self._statement = operation
+        self._params = params
+        self._elapsed = 0.0
+        record_query(operation)
+        metrics = current_request_metrics()
+        if metrics is not None:
+            metrics.queries += 1
+
+    def _finish(self):
+        if self._statement is None:
+            return
+        if self._elapsed >= self._slow_seconds:
+            metrics = current_request_metrics()
+            if metrics is not None:
+                metrics.slow += 1
+            statement = _WHITESPACE.sub(' ', self._statement).strip()
+            params = redact(self._params)
+            slow_query_logger.warning(
+                'Slow query (%.1f ms): %s params=%s', self._elapsed * 1000, statement, params,
+                extra={'durationMs': round(self._elapsed * 1000, 1),
+                       'statement': statement, 'params': params})
+        self._statement = None
+
+    def _fetched(self, rows):
+        metrics = current_request_metrics()
+        if metrics is not None:
+            metrics.rows += rows
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._start(operation, params)
+        return self._timed(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        self._start(operation, seq_params[0] if seq_params else None)
+        return self._timed(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._fetched(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._timed(self._cursor.fetchmany, *args, **kwargs)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._fetched(len(rows))
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+
+def instrument_cursor(cursor):
+    return InstrumentedCursor(cursor)
+
+
+# Request hooks
+
+def _route_labels():
+    rule = request.url_rule
+    return {
+        'endpoint': rule.rule if rule is not None else 'unmatched',
+        'method': request.method,
+    }
+
+
+def start_request():
+    g.request_metrics = RequestMetrics()
+    mode = tracking_mode(current_app)
+    if mode != 'off':
+        g.query_tracking = (start_tracking(), mode)
+    _ensure_flusher()
+
+
+def finish_request(response):
+    metrics = g.pop('request_metrics', None)
+    if metrics is None:
+        return response
+    labels = _route_labels()
+    _record_request(metrics, labels, response)
+    tracking = g.pop('query_tracking', None)
+    if tracking is not None:
+        tracker, mode = tracking
+        stop_tracking(tracker)
+        check_repeats(tracker, mode, f"{labels['method']} {labels['endpoint']}")
+    return response
+
+
+def end_tracking(exception=None):
+    tracking = g.pop('query_tracking', None)
+    if tracking is not None:
+        stop_tracking(tracking[0])
+
+
+def _record_request(metrics, labels, response):
+    registry.inc('saldo_http_requests_total', dict(labels, status=str(response.status_code)))
+    registry.observe('saldo_http_request_duration_seconds', labels,
+                     time.perf_counter() - metrics.started)
+    registry.observe('saldo_db_time_seconds', labels, metrics.db_seconds)
+    registry.observe('saldo_db_queries_per_request', labels, metrics.queries)
+    registry.observe('saldo_db_pool_wait_seconds', labels, metrics.pool_wait)
+    if metrics.rows:
+        registry.inc('saldo_db_rows_fetched_total', labels, metrics.rows)
+    if metrics.slow:
+        registry.inc('saldo_db_slow_queries_total', labels, metrics.slow)
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(end_tracking)
+
+
+# Cross-worker aggregation
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f'metrics-{pid}.json')
+
+
+def write_snapshot(directory=None):
+    directory = directory or METRICS_DIR
+    if not directory:
+        return
+    snapshot = dict(registry.snapshot(), pid=os.getpid(), gauges=collect_gauges())
+    path = _snapshot_path(directory, os.getpid())
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(temporary, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_snapshots(directory):
+    snapshots = []
+    for path in sorted(glob.glob(os.path.join(directory, 'metrics-*.json'))):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            # A worker replacing its file mid-read; it will be there next scrape
+            continue
+    return snapshots
+
+
+def merge(snapshots):
+    """Sums counters and histograms; keeps gauges of live workers, labelled by pid."""
+    counters = {}
+    histograms = {}
+    gauges = []
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            entry = histograms.get(key)
+            if entry is None:
+                histograms[key] = [list(counts), total, count]
+            else:
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+        pid = snapshot.get('pid')
+        if pid is None or pid == os.getpid() or _pid_alive(pid):
+            for name, help_text, labels, value in snapshot.get('gauges', []):
+                labels = [tuple(pair) for pair in labels]
+                if pid is not None:
+                    labels.append(('pid', str(pid)))
+                gauges.append((name, help_text, tuple(labels), value))
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms, gauges, metrics=METRICS):
+    lines = []
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), value in histograms.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    for name in sorted(by_name):
+        kind, help_text, buckets = metrics[name]
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind == COUNTER:
+                lines.append(f'{name}{_labels_text(labels)} {_number(value)}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket in zip(buckets, counts):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{_labels_text(labels + (("le", _number(float(bound))),))} {cumulative}')
+            lines.append(f'{name}_bucket{_labels_text(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_labels_text(labels)} {_number(float(total))}')
+            lines.append(f'{name}_count{_labels_text(labels)} {count}')
+
+    described = set()
+    for name, help_text, labels, value in sorted(gauges, key=lambda gauge: (gauge[0], gauge[2])):
+        if name not in described:
+            described.add(name)
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {GAUGE}')
+        lines.append(f'{name}{_labels_text(labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def exposition(directory=None):
+    """The /metrics body: this worker alone, or every worker sharing METRICS_DIR."""
+    directory = directory or METRICS_DIR
+    if directory:
+        write_snapshot(directory)
+        snapshots = read_snapshots(directory)
+    else:
+        snapshots = [dict(registry.snapshot(), pid=None, gauges=collect_gauges())]
+    return render(*merge(snapshots))
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            write_snapshot()
+        except OSError:
+            logger.exception('Could not write metrics snapshot')
+
+
+def _ensure_flusher():
+    # Started from the first request so it runs in the forked worker, not the master
+    global _flusher
+    if not METRICS_DIR or _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            _flusher = threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True)
+            _flusher.start()
+            atexit.register(write_snapshot)
@@ -0,0 +1,260 @@
+"""
+Background jobs: long work split into short, resumable transactions.
+
+A job is a background_jobs row with a Kind, a JSON Payload and a JSON
+Progress. Its handler does one bounded step per call,
+
+    step(cursor, payload, progress, after_commit=[]) -> (progress, done)
+
+and the new Progress is committed in the same transaction as the step's
+writes. Callables the step appends to after_commit (dropping per-process
+caches, say) run once that transaction has committed. A crash therefore loses at most the step in flight; the job is
+picked up again from its last committed progress once its lease runs out.
+
+Workers claim jobs with FOR UPDATE SKIP LOCKED and hold them under a lease
+of JOB_LEASE_SECONDS, renewed by every step. A step first re-reads the job
+row with a lock and gives up if another worker has taken it over. Failed
+steps are retried with a backoff up to JOB_MAX_ATTEMPTS times.
+
+Every web process runs a worker thread (started on its first request);
+JOBS_WORKER=off disables it when a standalone worker is used:
+
+    python -m backend.utils.jobs
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from ..database_config import get_pool
+from .group_purge import PURGE_GROUP, purge_group_step
+from .structured_logging import configure_logging
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 60))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 5))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOBS_WORKER = os.environ.get('JOBS_WORKER', 'thread')
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+HANDLERS = {
+    PURGE_GROUP: purge_group_step,
+}
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def enqueue_job(cursor, kind, payload):
+    """Adds a job inside the caller's transaction; returns its JobID."""
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    cursor.execute("""
+        INSERT INTO background_jobs (Kind, Payload, Progress)
+        VALUES (%s, %s, %s)
+    """, (kind, json.dumps(payload), json.dumps({})))
+    return cursor.lastrowid
+
+
+def get_job(cursor, job_id):
+    cursor.execute("""
+        SELECT JobID, Kind, Status, Progress, Attempts, LastError, CreatedAt, UpdatedAt
+        FROM background_jobs
+        WHERE JobID = %s
+    """, (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return {
+        'jobId': row['JobID'],
+        'kind': row['Kind'],
+        'status': row['Status'],
+        'progress': json.loads(row['Progress'] or '{}'),
+        'attempts': row['Attempts'],
+        'lastError': row['LastError'],
+        'createdAt': row['CreatedAt'].isoformat() if row['CreatedAt'] else None,
+        'updatedAt': row['UpdatedAt'].isoformat() if row['UpdatedAt'] else None,
+    }
+
+
+def claim_job(connection, owner, lease=JOB_LEASE_SECONDS):
+    """Leases the oldest runnable job to owner; returns {JobID, Kind, Payload} or None."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT JobID, Kind, Payload
+            FROM background_jobs
+            WHERE Status IN ('pending', 'running')
+            AND (LeaseUntil IS NULL OR LeaseUntil <= UTC_TIMESTAMP())
+            ORDER BY JobID
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """)
+        job = cursor.fetchone()
+        if job is None:
+            connection.commit()
+            return None
+        cursor.execute("""
+            UPDATE background_jobs
+            SET Status = 'running', LeaseOwner = %s,
+                LeaseUntil = UTC_TIMESTAMP() + INTERVAL %s SECOND
+            WHERE JobID = %s
+        """, (owner, lease, job['JobID']))
+        connection.commit()
+        job['Payload'] = json.loads(job['Payload'])
+        return job
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def run_step(connection, job, owner, lease=JOB_LEASE_SECONDS):
+    """Runs and commits one step of a leased job; returns (progress, done)."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT Progress FROM background_jobs
+            WHERE JobID = %s AND LeaseOwner = %s
+            FOR UPDATE
+        """, (job['JobID'], owner))
+        row = cursor.fetchone()
+        if row is None:
+            raise LeaseLost(f"Job {job['JobID']} was taken over by another worker")
+
+        after_commit = []
+        progress, done = HANDLERS[job['Kind']](
+            cursor, job['Payload'], json.loads(row['Progress'] or '{}'), after_commit=after_commit)
+
+        if done:
+            cursor.execute("""
+                UPDATE background_jobs
+                SET Progress = %s, Status = 'done', LeaseOwner = NULL, LeaseUntil = NULL
+                WHERE JobID = %s
+            """, (json.dumps(progress), job['JobID']))
+        else:
+            cursor.execute("""
+                UPDATE background_jobs
+                SET Progress = %s, LeaseUntil = UTC_TIMESTAMP() + INTERVAL %s SECOND
+                WHERE JobID = %s
+            """, (json.dumps(progress), lease, job['JobID']))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    for callback in after_commit:
+        callback()
+    return progress, done
+
+
+def record_failure(connection, job, owner, error, max_attempts=JOB_MAX_ATTEMPTS):
+    """Counts a failed step; the job is retried after a backoff or marked failed."""
+    cursor = connection.cursor()
+    try:
+        # MySQL applies SET assignments left to right: Status sees the new Attempts
+        cursor.execute("""
+            UPDATE background_jobs
+            SET Attempts = Attempts + 1,
+                Status = IF(Attempts >= %s, 'failed', 'pending'),
+                LastError = %s,
+                LeaseOwner = NULL,
+                LeaseUntil = UTC_TIMESTAMP() + INTERVAL LEAST(POW(2, Attempts), 300) SECOND
+            WHERE JobID = %s AND LeaseOwner = %s
+        """, (max_attempts, str(error)[:2000], job['JobID'], owner))
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+class JobWorker:
+    def __init__(self, poll_interval=JOB_POLL_INTERVAL, lease=JOB_LEASE_SECONDS):
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.owner = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(
+                    target=self.run, name='background-jobs', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def run_job(self, connection, job):
+        done = False
+        try:
+            while not done and not self._stopped.is_set():
+                progress, done = run_step(connection, job, self.owner, self.lease)
+                logger.info('Job %s (%s): %s', job['JobID'], job['Kind'], progress)
+        except LeaseLost as e:
+            logger.warning('%s', e)
+        except Exception as e:
+            logger.exception('Job %s (%s) failed', job['JobID'], job['Kind'])
+            record_failure(connection, job, self.owner, e)
+
+    def run(self):
+        # Unique per process and worker, so a restarted process never reuses a lease
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        while not self._stopped.is_set():
+            try:
+                connection = get_pool().checkout()
+                try:
+                    while not self._stopped.is_set():
+                        job = claim_job(connection, self.owner, self.lease)
+                        if job is None:
+                            break
+                        self.run_job(connection, job)
+                finally:
+                    connection.close()
+            except Exception as e:
+                logger.warning('Job polling failed: %s', e)
+
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+
+worker = JobWorker()
+
+
+def ensure_worker():
+    if JOBS_WORKER == 'thread':
+        worker.start()
+
+
+def wake_worker():
+    worker.wake()
+
+
+def init_app(app):
+    app.before_request(ensure_worker)
+
+
+def main():
+    configure_logging()
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
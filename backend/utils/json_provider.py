@@ -0,0 +1,102 @@
+"""
+Flask JSON provider for responses built from database rows.
+
+Rows from dictionary cursors carry Decimal amounts and datetime/date
+columns. This provider serializes them directly instead of having routes
+convert every row first:
+
+    Decimal   JSON_DECIMAL=string (default): exact decimal string, "12.50"
+              JSON_DECIMAL=cents: integer number of cents, 1250
+    datetime  ISO 8601, "2026-01-31T18:04:05"
+    date      ISO 8601, "2026-01-31"
+
+orjson is used when installed (optional, like redis for the cache); the
+standard library encoder is the fallback. Top-level arrays longer than
+JSON_STREAM_THRESHOLD items are sent as a streamed body, encoded
+JSON_STREAM_CHUNK items at a time, rather than as one large string.
+"""
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_DECIMAL = os.environ.get('JSON_DECIMAL', 'string')
+JSON_STREAM_THRESHOLD = int(os.environ.get('JSON_STREAM_THRESHOLD', 5000))
+JSON_STREAM_CHUNK = int(os.environ.get('JSON_STREAM_CHUNK', 1000))
+
+DECIMAL_MODES = ('string', 'cents')
+_CENT = Decimal('0.01')
+
+
+def decimal_to_cents(value):
+    return int((value / _CENT).to_integral_value(ROUND_HALF_UP))
+
+
+class RowJSONProvider(JSONProvider):
+    mimetype = 'application/json'
+
+    def __init__(self, app, decimal_mode=JSON_DECIMAL, stream_threshold=JSON_STREAM_THRESHOLD,
+                 stream_chunk=JSON_STREAM_CHUNK, use_orjson=True):
+        super().__init__(app)
+        if decimal_mode not in DECIMAL_MODES:
+            raise ValueError(f'JSON_DECIMAL must be one of {DECIMAL_MODES}, not {decimal_mode!r}')
+        self.decimal_mode = decimal_mode
+        self.stream_threshold = stream_threshold
+        self.stream_chunk = stream_chunk
+        self.use_orjson = use_orjson and orjson is not None
+        self._decimal = decimal_to_cents if decimal_mode == 'cents' else str
+
+    def default(self, value):
+        if isinstance(value, Decimal):
+            return self._decimal(value)
+        # orjson handles these itself; the standard library does not
+        if isinstance(value, (datetime, date, time)):
+            return value.isoformat()
+        if isinstance(value, timedelta):
+            return value.total_seconds()
+        if isinstance(value, (set, frozenset)):
+            return list(value)
+        if isinstance(value, (bytes, bytearray)):
+            return value.decode('utf-8')
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+    def dumps_bytes(self, obj):
+        if self.use_orjson:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=self.default, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', self.default)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def iter_array(self, items):
+        """Yields a JSON array in chunks of stream_chunk encoded items."""
+        yield b'['
+        for start in range(0, len(items), self.stream_chunk):
+            encoded = self.dumps_bytes(items[start:start + self.stream_chunk])[1:-1]
+            yield encoded if start == 0 else b',' + encoded
+        yield b']\n'
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if isinstance(obj, list) and len(obj) > self.stream_threshold:
+            return self._app.response_class(self.iter_array(obj), mimetype=self.mimetype)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json = RowJSONProvider(app)
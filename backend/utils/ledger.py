@@ -0,0 +1,212 @@
+"""
+Materialized balance ledger.
+
+balance_ledger keeps one row per (group, user, counterparty, currency)
+and mirrors every pair, so all of a user's balances sit under one index
+prefix. Amounts are in the debts' own currency; readers convert when they
+aggregate (see fx.to_base_sql):
+
+    DebtCount    debts between the two users, any status
+    OpenCount    debts that are not paid yet
+    TotalAmount  sum of all those debts
+    Balance      unpaid amount the counterparty owes the user, minus
+                 the unpaid amount the user owes the counterparty
+
+Writers call record_debt_change() in the same transaction as the debts
+write. Rebuild/verify from the command line:
+
+    python -m backend.utils.ledger verify
+    python -m backend.utils.ledger rebuild
+"""
+import argparse
+import sys
+from decimal import Decimal
+
+UPSERT_QUERY = """
+    INSERT INTO balance_ledger
+    (GroupID, UserID, CounterpartyID, Currency, DebtCount, OpenCount, TotalAmount, Balance)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        DebtCount = DebtCount + VALUES(DebtCount),
+        OpenCount = OpenCount + VALUES(OpenCount),
+        TotalAmount = TotalAmount + VALUES(TotalAmount),
+        Balance = Balance + VALUES(Balance)
+"""
+
+EXPECTED_QUERY = """
+    SELECT GroupID, UserID, CounterpartyID, Currency,
+           COUNT(*) AS DebtCount,
+           SUM(IsOpen) AS OpenCount,
+           SUM(Amount) AS TotalAmount,
+           SUM(CASE WHEN IsOpen = 1 THEN Delta ELSE 0 END) AS Balance
+    FROM (
+        SELECT GroupID, ToUserID AS UserID, FromUserID AS CounterpartyID, Currency,
+               Amount, Amount AS Delta, Status <> 'paid' AS IsOpen
+        FROM debts
+        WHERE FromUserID <> ToUserID
+        UNION ALL
+        SELECT GroupID, FromUserID AS UserID, ToUserID AS CounterpartyID, Currency,
+               Amount, -Amount AS Delta, Status <> 'paid' AS IsOpen
+        FROM debts
+        WHERE FromUserID <> ToUserID
+    ) t
+    GROUP BY GroupID, UserID, CounterpartyID, Currency
+"""
+
+LEDGER_COLUMNS = ('DebtCount', 'OpenCount', 'TotalAmount', 'Balance')
+
+# Columns every debt row passed to the ledger must carry
+DEBT_COLUMNS = 'DebtID, GroupID, FromUserID, ToUserID, Amount, Currency, Status, CreatedDate'
+
+
+def is_open(status):
+    return status != 'paid'
+
+
+def debt_deltas(debts, sign=1):
+    """Folds debt dicts into {(group, user, counterparty, currency): [count, open, total, balance]}."""
+    deltas = {}
+    for debt in debts:
+        if debt['FromUserID'] == debt['ToUserID']:
+            # The routes refuse these; one written around them is not a balance
+            continue
+        amount = Decimal(str(debt['Amount'])) * sign
+        open_count = sign if is_open(debt['Status']) else 0
+        open_amount = amount if open_count else Decimal(0)
+        group_id = debt['GroupID']
+        from_user_id = debt['FromUserID']
+        to_user_id = debt['ToUserID']
+        currency = debt['Currency']
+
+        for key, balance in (
+            ((group_id, to_user_id, from_user_id, currency), open_amount),
+            ((group_id, from_user_id, to_user_id, currency), -open_amount),
+        ):
+            row = deltas.setdefault(key, [0, 0, Decimal(0), Decimal(0)])
+            row[0] += sign
+            row[1] += open_count
+            row[2] += amount
+            row[3] += balance
+    return deltas
+
+
+def merge_deltas(*parts):
+    merged = {}
+    for part in parts:
+        for key, values in part.items():
+            row = merged.setdefault(key, [0, 0, Decimal(0), Decimal(0)])
+            for index, value in enumerate(values):
+                row[index] += value
+    return {key: row for key, row in merged.items() if any(row)}
+
+
+def record_debt_change(cursor, before=(), after=()):
+    """
+    Applies the difference between the old and new state of some debts.
+    Pass the removed/previous rows as `before` and the inserted/updated rows
+    as `after`; either side may be empty.
+    """
+    deltas = merge_deltas(debt_deltas(before, -1), debt_deltas(after, 1))
+    if not deltas:
+        return
+    cursor.executemany(UPSERT_QUERY, [
+        key + tuple(values) for key, values in sorted(deltas.items())
+    ])
+
+
+def fetch_debts_for_update(cursor, where, params):
+    cursor.execute(f"""
+        SELECT {DEBT_COLUMNS}
+        FROM debts
+        WHERE {where}
+        FOR UPDATE
+    """, params)
+    rows = cursor.fetchall()
+    if rows and not isinstance(rows[0], dict):
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in rows]
+    return rows
+
+
+def find_drift(cursor):
+    cursor.execute(EXPECTED_QUERY)
+    expected = {
+        tuple(row[:4]): tuple(Decimal(str(v or 0)) for v in row[4:])
+        for row in cursor.fetchall()
+    }
+    cursor.execute(f"""
+        SELECT GroupID, UserID, CounterpartyID, Currency, {', '.join(LEDGER_COLUMNS)}
+        FROM balance_ledger
+    """)
+    actual = {
+        tuple(row[:4]): tuple(Decimal(str(v or 0)) for v in row[4:])
+        for row in cursor.fetchall()
+    }
+
+    zero = (Decimal(0),) * len(LEDGER_COLUMNS)
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, zero)
+        have = actual.get(key, zero)
+        if want != have:
+            drift.append({
+                'groupId': key[0],
+                'userId': key[1],
+                'counterpartyId': key[2],
+                'currency': key[3],
+                'expected': dict(zip(LEDGER_COLUMNS, want)),
+                'actual': dict(zip(LEDGER_COLUMNS, have)),
+            })
+    return drift
+
+
+def rebuild(connection):
+    cursor = connection.cursor()
+    try:
+        drift = find_drift(cursor)
+        cursor.execute("DELETE FROM balance_ledger")
+        cursor.execute(f"""
+            INSERT INTO balance_ledger
+            (GroupID, UserID, CounterpartyID, Currency, {', '.join(LEDGER_COLUMNS)})
+            {EXPECTED_QUERY}
+        """)
+        connection.commit()
+        return drift
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def verify(connection):
+    cursor = connection.cursor()
+    try:
+        return find_drift(cursor)
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    from backend.database_config import get_db_connection
+
+    parser = argparse.ArgumentParser(description='Verify or rebuild balance_ledger')
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    args = parser.parse_args(argv)
+
+    connection = get_db_connection()
+    try:
+        drift = rebuild(connection) if args.command == 'rebuild' else verify(connection)
+    finally:
+        connection.close()
+
+    for row in drift:
+        print(f"group {row['groupId']} user {row['userId']} / {row['counterpartyId']} {row['currency']}: "
+              f"expected {row['expected']}, found {row['actual']}")
+    print(f"{len(drift)} drifted ledger rows" +
+          (' (rebuilt)' if args.command == 'rebuild' else ''))
+    return 1 if drift and args.command == 'verify' else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Bulk group membership changes.
+
+Requests carry lists of user IDs. Unknown users are found with one IN query
+and the change is applied with one multi-row INSERT or DELETE, however long
+the list. Users already in the group (or already gone) are skipped.
+"""
+MAX_MEMBERS_PER_REQUEST = 1000
+
+
+class MembershipError(ValueError):
+    pass
+
+
+def parse_user_ids(values):
+    """Validated, de-duplicated, sorted user IDs from a request body list."""
+    if not isinstance(values, list):
+        raise MembershipError('Members must be a list of user IDs')
+    user_ids = set()
+    for value in values:
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            raise MembershipError(f'Invalid user ID: {value!r}')
+        user_ids.add(value)
+    if len(user_ids) > MAX_MEMBERS_PER_REQUEST:
+        raise MembershipError(f'At most {MAX_MEMBERS_PER_REQUEST} members per request')
+    return sorted(user_ids)
+
+
+def _placeholders(count, group='%s'):
+    return ', '.join([group] * count)
+
+
+def unknown_user_ids(cursor, user_ids):
+    if not user_ids:
+        return []
+    cursor.execute(f"""
+        SELECT UserID FROM users
+        WHERE UserID IN ({_placeholders(len(user_ids))})
+    """, tuple(user_ids))
+    found = {row['UserID'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()}
+    return [user_id for user_id in user_ids if user_id not in found]
+
+
+def add_members(cursor, group_id, user_ids):
+    """Adds users to the group in one statement; returns how many were new."""
+    if not user_ids:
+        return 0
+    # The no-op update skips existing (GroupID, UserID) rows without hiding other errors
+    cursor.execute(f"""
+        INSERT INTO groupmembers (GroupID, UserID)
+        VALUES {_placeholders(len(user_ids), '(%s, %s)')}
+        ON DUPLICATE KEY UPDATE UserID = UserID
+    """, tuple(value for user_id in user_ids for value in (group_id, user_id)))
+    return cursor.rowcount
+
+
+def remove_members(cursor, group_id, user_ids):
+    """Removes users from the group in one statement; returns how many were members."""
+    if not user_ids:
+        return 0
+    cursor.execute(f"""
+        DELETE FROM groupmembers
+        WHERE GroupID = %s AND UserID IN ({_placeholders(len(user_ids))})
+    """, (group_id, *user_ids))
+    return cursor.rowcount
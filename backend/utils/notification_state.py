@@ -0,0 +1,85 @@
+"""
+Per-user notification version.
+
+notification_state holds, per user, a Version that goes up whenever one of
+their notifications is added or read, the UnreadCount and when that last
+happened (UTC). Every writer bumps it in the same transaction as the
+notifications write, so GET /notifications can answer conditional requests
+and the bell badge can be served without reading the notifications table.
+
+Reads go through a small in-process cache. Local writes evict their users
+right after commit; other workers see the change within
+NOTIFICATION_STATE_TTL seconds.
+"""
+import os
+import threading
+import time
+from datetime import timezone
+from ..database_config import get_db_connection
+
+NOTIFICATION_STATE_TTL = float(os.environ.get('NOTIFICATION_STATE_TTL', 2))
+NOTIFICATION_STATE_CACHE_SIZE = 10000
+
+BUMP_QUERY = """
+    INSERT INTO notification_state (UserID, Version, UnreadCount, LastChanged)
+    VALUES (%s, 1, %s, UTC_TIMESTAMP())
+    ON DUPLICATE KEY UPDATE
+        Version = Version + 1,
+        UnreadCount = GREATEST(UnreadCount + VALUES(UnreadCount), 0),
+        LastChanged = UTC_TIMESTAMP()
+"""
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def bump_notification_state(cursor, unread_deltas):
+    """unread_deltas: {user_id: change in unread count}, one entry per touched user."""
+    if not unread_deltas:
+        return
+    cursor.executemany(BUMP_QUERY, [
+        (int(user_id), delta) for user_id, delta in sorted(unread_deltas.items())
+    ])
+
+
+def forget_notification_state(*user_ids):
+    with _cache_lock:
+        for user_id in user_ids:
+            _cache.pop(str(user_id), None)
+
+
+def get_notification_state(user_id):
+    """
+    Returns {'version', 'unreadCount', 'lastChanged'} for a user; a cache hit
+    does not check out a database connection at all.
+    """
+    key = str(user_id)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT Version, UnreadCount, LastChanged
+            FROM notification_state
+            WHERE UserID = %s
+        """, (user_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+
+    state = {
+        'version': row['Version'] if row else 0,
+        'unreadCount': row['UnreadCount'] if row else 0,
+        'lastChanged': (row['LastChanged'].replace(tzinfo=timezone.utc)
+                        if row and row['LastChanged'] else None),
+    }
+    with _cache_lock:
+        if len(_cache) >= NOTIFICATION_STATE_CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = (now + NOTIFICATION_STATE_TTL, state)
+    return state
@@ -0,0 +1,341 @@
+"""
+Transactional outbox for notification fan-out.
+
+Debt writers only add a compact event to notification_outbox inside their own
+transaction. A background worker drains the outbox in batches: it resolves
+user names with one query, renders the messages, bulk-inserts notifications,
+bumps notification_state, deletes the drained events and commits, then
+pushes the new notifications to open SSE streams.
+
+Every web process runs a worker thread (started on its first request).
+Batches are claimed with FOR UPDATE SKIP LOCKED, so any number of workers
+can drain the same outbox. It can also run on its own:
+
+    python -m backend.utils.outbox
+
+If a batch fails, its events are retried one at a time in their own
+transactions, so one bad event does not hold up the rest. Each failure of an
+event counts an attempt; after OUTBOX_MAX_ATTEMPTS (10) it is left in the
+table with Status 'dead' and its LastError, and is no longer claimed. Set
+Status back to 'pending' to retry it.
+
+Settings: OUTBOX_BATCH_SIZE, OUTBOX_FLUSH_INTERVAL (seconds) and
+OUTBOX_WORKER=thread|off (off when a standalone drainer is used).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from ..database_config import get_pool
+from .notification_state import bump_notification_state, forget_notification_state
+from .pubsub import publish_to_user
+from .structured_logging import configure_logging
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 200))
+OUTBOX_FLUSH_INTERVAL = float(os.environ.get('OUTBOX_FLUSH_INTERVAL', 0.5))
+OUTBOX_WORKER = os.environ.get('OUTBOX_WORKER', 'thread')
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 10))
+
+PENDING = 'pending'
+DEAD = 'dead'
+
+DEBT_ADDED = 'debt'
+DEBT_PAID = 'payment'
+
+TEMPLATES = {
+    DEBT_ADDED: ("New Debt Added", "{from_name} owes you {amount}"),
+    DEBT_PAID: ("Debt Paid", "{from_name} paid their debt of {amount}"),
+}
+
+
+def debt_event(debt_id, from_user_id, to_user_id, amount, currency=None):
+    event = {
+        'debtId': int(debt_id),
+        'fromUserId': int(from_user_id),
+        'toUserId': int(to_user_id),
+        'amount': str(amount),
+    }
+    if currency:
+        event['currency'] = currency
+    return event
+
+
+def format_amount(amount, currency=None):
+    # Events queued before debts had a currency are dollars
+    if currency in (None, 'USD'):
+        return f'${amount}'
+    return f'{amount} {currency}'
+
+
+def enqueue(cursor, event_type, events):
+    """Adds events to the outbox; call inside the writer's transaction."""
+    if not events:
+        return
+    cursor.executemany("""
+        INSERT INTO notification_outbox (EventType, Payload)
+        VALUES (%s, %s)
+    """, [(event_type, json.dumps(event)) for event in events])
+
+
+def render_notifications(events, names):
+    """Turns outbox events into notifications rows (UserID, Title, Message, Type, RelatedID)."""
+    rows = []
+    for event_type, event in events:
+        title, template = TEMPLATES[event_type]
+        rows.append((
+            event['toUserId'],
+            title,
+            template.format(
+                from_name=names.get(event['fromUserId'], 'Someone'),
+                amount=format_amount(event['amount'], event.get('currency'))
+            ),
+            event_type,
+            event['debtId']
+        ))
+    return rows
+
+
+class OutboxStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events_total = 0
+        self.batches_total = 0
+        self.failures_total = 0
+        self.dead_total = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.last_drain_at = None
+
+    def record_batch(self, size, seconds, lag):
+        with self._lock:
+            self.events_total += size
+            self.batches_total += 1
+            self.last_batch_size = size
+            self.last_batch_seconds = seconds
+            self.last_lag_seconds = lag
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+            self.last_drain_at = time.time()
+
+    def record_idle(self):
+        with self._lock:
+            self.last_lag_seconds = 0.0
+            self.last_drain_at = time.time()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures_total += 1
+
+    def record_dead(self):
+        with self._lock:
+            self.dead_total += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'eventsTotal': self.events_total,
+                'batchesTotal': self.batches_total,
+                'failuresTotal': self.failures_total,
+                'deadTotal': self.dead_total,
+                'lastBatchSize': self.last_batch_size,
+                'lastBatchSeconds': self.last_batch_seconds,
+                'lagSeconds': self.last_lag_seconds,
+                'maxLagSeconds': self.max_lag_seconds,
+                'lastDrainAt': self.last_drain_at,
+            }
+
+
+stats = OutboxStats()
+
+
+def _claim(cursor, batch_size, outbox_id=None):
+    where = 'Status = %s' + (' AND OutboxID = %s' if outbox_id else '')
+    params = (PENDING,) + ((outbox_id,) if outbox_id else ())
+    cursor.execute(f"""
+        SELECT OutboxID, EventType, Payload, Attempts,
+               TIMESTAMPDIFF(MICROSECOND, CreatedDate, NOW(3)) AS AgeMicros
+        FROM notification_outbox
+        WHERE {where}
+        ORDER BY OutboxID
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, params + (batch_size,))
+    return cursor.fetchall()
+
+
+def _deliver(cursor, claimed):
+    """Writes the notifications for claimed events and deletes them; returns the rows."""
+    events = [(row['EventType'], json.loads(row['Payload'])) for row in claimed]
+
+    from_ids = sorted({event['fromUserId'] for _, event in events})
+    placeholders = ', '.join(['%s'] * len(from_ids))
+    cursor.execute(f"""
+        SELECT UserID, Name FROM users
+        WHERE UserID IN ({placeholders})
+    """, from_ids)
+    names = {row['UserID']: row['Name'] for row in cursor.fetchall()}
+
+    rows = render_notifications(events, names)
+    cursor.executemany("""
+        INSERT INTO notifications
+        (UserID, Title, Message, Type, RelatedID)
+        VALUES (%s, %s, %s, %s, %s)
+    """, rows)
+
+    bump_notification_state(cursor, Counter(row[0] for row in rows))
+
+    outbox_ids = [row['OutboxID'] for row in claimed]
+    cursor.execute(f"""
+        DELETE FROM notification_outbox
+        WHERE OutboxID IN ({', '.join(['%s'] * len(outbox_ids))})
+    """, outbox_ids)
+    return rows
+
+
+def _record_failure(cursor, event, error):
+    attempts = event['Attempts'] + 1
+    status = DEAD if attempts >= OUTBOX_MAX_ATTEMPTS else PENDING
+    cursor.execute("""
+        UPDATE notification_outbox
+        SET Attempts = %s, Status = %s, LastError = %s
+        WHERE OutboxID = %s
+    """, (attempts, status, repr(error)[:1000], event['OutboxID']))
+    if status == DEAD:
+        stats.record_dead()
+        logger.error('Outbox event %s dead after %s attempts: %r', event['OutboxID'], attempts, error)
+
+
+def _deliver_each(connection, cursor, claimed):
+    """Retries a failed batch one event at a time so only the bad ones are charged."""
+    rows = []
+    for event in claimed:
+        reclaimed = _claim(cursor, 1, event['OutboxID'])
+        if not reclaimed:
+            # Drained by another worker meanwhile
+            connection.commit()
+            continue
+        try:
+            rows += _deliver(cursor, reclaimed)
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            # The rollback dropped the row lock; take it again before charging the attempt
+            failed = _claim(cursor, 1, event['OutboxID'])
+            if failed:
+                _record_failure(cursor, failed[0], e)
+            connection.commit()
+    return rows
+
+
+def drain_once(connection, batch_size=OUTBOX_BATCH_SIZE):
+    """Processes one batch; returns how many events it delivered."""
+    started = time.monotonic()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        claimed = _claim(cursor, batch_size)
+        if not claimed:
+            connection.commit()
+            stats.record_idle()
+            return 0
+
+        try:
+            rows = _deliver(cursor, claimed)
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            logger.warning('Outbox batch failed, retrying its events one by one: %r', e)
+            rows = _deliver_each(connection, cursor, claimed)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    forget_notification_state(*{row[0] for row in rows})
+    for user_id, title, message, event_type, debt_id in rows:
+        publish_to_user(user_id, {
+            'type': event_type,
+            'title': title,
+            'message': message,
+            'relatedId': debt_id
+        })
+
+    lag = max(row['AgeMicros'] or 0 for row in claimed) / 1e6
+    stats.record_batch(len(rows), time.monotonic() - started, lag)
+    return len(rows)
+
+
+class OutboxWorker:
+    def __init__(self, batch_size=OUTBOX_BATCH_SIZE, flush_interval=OUTBOX_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(
+                    target=self.run, name='notification-outbox', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def run(self):
+        delay = self.flush_interval
+        while not self._stopped.is_set():
+            try:
+                connection = get_pool().checkout()
+                try:
+                    handled = self.batch_size
+                    # Keep draining while batches come back full
+                    while handled == self.batch_size and not self._stopped.is_set():
+                        handled = drain_once(connection, self.batch_size)
+                finally:
+                    connection.close()
+                delay = self.flush_interval
+            except Exception as e:
+                stats.record_failure()
+                logger.warning('Outbox drain failed: %s', e)
+                delay = min(max(delay * 2, self.flush_interval), 30)
+
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+worker = OutboxWorker()
+
+
+def ensure_worker():
+    if OUTBOX_WORKER == 'thread':
+        worker.start()
+
+
+def wake_worker():
+    worker.wake()
+
+
+def init_app(app):
+    app.before_request(ensure_worker)
+
+
+def main():
+    configure_logging()
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
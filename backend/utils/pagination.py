@@ -0,0 +1,70 @@
+"""
+Keyset pagination shared by the list endpoints.
+
+Clients pass ?after=<cursor>&limit=<n>. The cursor is opaque: it encodes the
+sort key of the last row of the previous page, so the next page is an index
+range read instead of an OFFSET scan. The cursor for the following page is
+returned in the X-Next-Cursor header and is absent on the last page; the
+body stays a plain JSON list.
+"""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise PaginationError('Invalid cursor')
+    # Values are bound as query parameters, which must be scalars
+    if any(isinstance(v, bool) or not isinstance(v, (str, int, float)) for v in values):
+        raise PaginationError('Invalid cursor')
+    return values
+
+
+def page_args(args, key_size=1):
+    """Returns (after, limit) from request args; after is None on the first page."""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    token = args.get('after')
+    after = decode_cursor(token, key_size) if token else None
+    return after, limit
+
+
+def paginate(rows, limit, key):
+    """
+    Trims rows fetched with LIMIT limit + 1 down to one page and returns
+    (page, next_cursor).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
+
+
+def paged_response(response, next_cursor):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
@@ -0,0 +1,226 @@
+"""
+In-process pub/sub hub behind the notification stream.
+
+The hub fans published events out to local subscribers (one queue per open
+SSE connection). Where events travel between processes is up to the backend:
+
+    local   events stay in this process (single worker, tests)
+    broker  events go through a small TCP broker so every gunicorn worker
+            sees them; run it next to the workers with
+            python -m backend.utils.pubsub --broker 127.0.0.1:5006
+
+Select with PUBSUB_BACKEND=local|broker and PUBSUB_BROKER_ADDRESS.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_BACKEND = os.environ.get('PUBSUB_BACKEND', 'local')
+PUBSUB_BROKER_ADDRESS = os.environ.get('PUBSUB_BROKER_ADDRESS', '127.0.0.1:5006')
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def parse_address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+class LocalBackend:
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, channel, data):
+        self._deliver(channel, data)
+
+    def stop(self):
+        pass
+
+
+class BrokerBackend:
+    """Forwards publishes to the broker and delivers whatever it broadcasts."""
+
+    def __init__(self, address, reconnect_delay=1.0):
+        self.address = parse_address(address)
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self, deliver):
+        self._deliver = deliver
+        thread = threading.Thread(target=self._read_loop, name='pubsub-broker', daemon=True)
+        thread.start()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=5)
+        sock.settimeout(None)
+        self._sock = sock
+        return sock
+
+    def _read_loop(self):
+        while not self._stopped.is_set():
+            try:
+                with self._send_lock:
+                    sock = self._sock or self._connect()
+                for line in sock.makefile('r', encoding='utf-8'):
+                    message = json.loads(line)
+                    self._deliver(message['channel'], message['data'])
+            except (OSError, ValueError) as e:
+                logger.warning('Pub/sub broker connection lost: %s', e)
+            with self._send_lock:
+                self._sock = None
+            self._stopped.wait(self.reconnect_delay)
+
+    def publish(self, channel, data):
+        line = json.dumps({'channel': channel, 'data': data}, default=str) + '\n'
+        with self._send_lock:
+            try:
+                sock = self._sock or self._connect()
+                sock.sendall(line.encode('utf-8'))
+            except OSError as e:
+                # Notifications are persisted anyway; clients catch up on reconnect
+                logger.warning('Dropping pub/sub event for %s: %s', channel, e)
+                self._sock = None
+
+    def stop(self):
+        self._stopped.set()
+        with self._send_lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+
+class Subscription:
+    def __init__(self, hub, channel, maxsize):
+        self.hub = hub
+        self.channel = channel
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class PubSubHub:
+    def __init__(self, backend=None, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.backend = backend or LocalBackend()
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.backend.start(self._deliver)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, data):
+        self.backend.publish(channel, data)
+
+    def _deliver(self, channel, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(data)
+            except queue.Full:
+                # A stalled client must not block publishers
+                subscription.dropped += 1
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                backend = (BrokerBackend(PUBSUB_BROKER_ADDRESS)
+                           if PUBSUB_BACKEND == 'broker' else LocalBackend())
+                _hub = PubSubHub(backend)
+    return _hub
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def publish_to_user(user_id, event):
+    get_hub().publish(user_channel(user_id), event)
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        clients = self.server.clients
+        with self.server.clients_lock:
+            clients.add(self.wfile)
+        try:
+            for line in self.rfile:
+                with self.server.clients_lock:
+                    targets = list(clients)
+                # One broadcast at a time so lines from different publishers never interleave
+                with self.server.write_lock:
+                    for wfile in targets:
+                        try:
+                            wfile.write(line)
+                            wfile.flush()
+                        except OSError:
+                            with self.server.clients_lock:
+                                clients.discard(wfile)
+        finally:
+            with self.server.clients_lock:
+                clients.discard(self.wfile)
+
+
+class Broker(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(parse_address(address), _BrokerHandler)
+        self.clients = set()
+        self.clients_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local pub/sub broker for notification streams')
+    parser.add_argument('--broker', default=PUBSUB_BROKER_ADDRESS)
+    args = parser.parse_args(argv)
+
+    with Broker(args.broker) as broker:
+        print(f'Pub/sub broker listening on {args.broker}')
+        broker.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Repeated-statement (N+1) detection.
+
+Statements run through InstrumentedCursor are reduced to a fingerprint:
+comments dropped, literals and placeholders replaced with ?, IN lists and
+multi-row VALUES collapsed, whitespace and case normalised. A QueryTracker
+counts fingerprints while it is active on the current thread.
+
+Request tracking is set with QUERY_TRACKING=off|warn|raise (default: raise
+when the app is testing, warn in debug, off otherwise). When a request runs
+the same fingerprint more than QUERY_REPEAT_LIMIT times (5) it is logged or
+RepeatedQueryError is raised. Tests can also bound a block directly:
+
+    with assert_max_queries(3):
+        client.get('/groups/1/overview')
+"""
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+QUERY_TRACKING = os.environ.get('QUERY_TRACKING')
+QUERY_REPEAT_LIMIT = int(os.environ.get('QUERY_REPEAT_LIMIT', 5))
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s')
+_WHITESPACE = re.compile(r'\s+')
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+')
+
+
+class RepeatedQueryError(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    sql = _COMMENTS.sub(' ', sql)
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip().lower()
+    sql = _LISTS.sub('(?+)', sql)
+    return _ROWS.sub('(?+)', sql)
+
+
+class QueryTracker:
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+
+    def record(self, sql):
+        self.counts[fingerprint(sql)] += 1
+        self.total += 1
+
+    def repeated(self, limit):
+        """[(fingerprint, count)] for statements run more than limit times."""
+        return [(sql, count) for sql, count in self.counts.most_common() if count > limit]
+
+    def report(self):
+        return '\n'.join(f'{count:4d} x {sql}' for sql, count in self.counts.most_common())
+
+
+_local = threading.local()
+
+
+def _active():
+    if not hasattr(_local, 'trackers'):
+        _local.trackers = []
+    return _local.trackers
+
+
+def start_tracking():
+    tracker = QueryTracker()
+    _active().append(tracker)
+    return tracker
+
+
+def stop_tracking(tracker):
+    trackers = _active()
+    if tracker in trackers:
+        trackers.remove(tracker)
+
+
+def record_query(sql):
+    for tracker in _active():
+        tracker.record(sql)
+
+
+@contextmanager
+def track_queries():
+    tracker = start_tracking()
+    try:
+        yield tracker
+    finally:
+        stop_tracking(tracker)
+
+
+def tracking_mode(app):
+    if QUERY_TRACKING:
+        return QUERY_TRACKING
+    if app.testing:
+        return 'raise'
+    return 'warn' if app.debug else 'off'
+
+
+def check_repeats(tracker, mode, where, limit=QUERY_REPEAT_LIMIT):
+    repeated = tracker.repeated(limit)
+    if not repeated:
+        return
+    summary = '; '.join(f'{count} x {sql}' for sql, count in repeated)
+    if mode == 'raise':
+        raise RepeatedQueryError(f'{where} repeated statements more than {limit} times: {summary}')
+    logger.warning('%s repeated statements more than %d times: %s', where, limit, summary)
+
+
+@contextmanager
+def assert_max_queries(limit, repeat_limit=None):
+    """Fails the block if it runs more than limit statements (or repeats one more than repeat_limit times)."""
+    with track_queries() as tracker:
+        yield tracker
+    if tracker.total > limit:
+        raise AssertionError(
+            f'{tracker.total} queries, expected at most {limit}:\n{tracker.report()}')
+    if repeat_limit is not None:
+        check_repeats(tracker, 'raise', 'Block', repeat_limit)
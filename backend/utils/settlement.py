@@ -0,0 +1,103 @@
+import heapq
+from decimal import Decimal
+from .fx import FX_BASE_CURRENCY, to_base_sql
+
+CENT = Decimal('0.01')
+
+# Net balance per member over every unpaid debt of a group, read from the
+# balance ledger and converted to one currency by group_balances_query().
+# Positive balance: the member is owed money. Negative: owes.
+GROUP_BALANCES_QUERY = """
+    SELECT l.UserID, u.Name, ROUND(SUM({balance}) * %s, 2) AS Balance
+    FROM balance_ledger l
+    JOIN users u ON u.UserID = l.UserID
+    WHERE l.GroupID = %s
+    GROUP BY l.UserID, u.Name
+"""
+
+
+def group_balances_query(group_id, currency, rates):
+    """(sql, params) for GROUP_BALANCES_QUERY in currency."""
+    balance, params = to_base_sql('l.Balance', 'l.Currency', rates)
+    return GROUP_BALANCES_QUERY.format(balance=balance), params + [rates[currency], group_id]
+
+
+def to_cents(amount):
+    return int((Decimal(str(amount)) / CENT).to_integral_value())
+
+
+def net_balances(debts):
+    """Folds (from_user_id, to_user_id, amount) rows into {user_id: cents}."""
+    balances = {}
+    for from_user_id, to_user_id, amount in debts:
+        cents = to_cents(amount)
+        balances[from_user_id] = balances.get(from_user_id, 0) - cents
+        balances[to_user_id] = balances.get(to_user_id, 0) + cents
+    return balances
+
+
+def zero_sum(balances):
+    """
+    Balances converted and rounded one by one can miss zero by a few cents;
+    puts the remainder on the largest balance so settle() can zero them all.
+    """
+    remainder = sum(balances.values())
+    if remainder and balances:
+        largest = max(balances, key=lambda user_id: (abs(balances[user_id]), -user_id))
+        balances[largest] -= remainder
+    return balances
+
+
+def settle(balances):
+    """
+    Turns {user_id: cents} into a short list of (from_user_id, to_user_id, cents)
+    transfers that zeroes every balance.
+
+    Greedy: always match the largest debtor with the largest creditor. Each
+    step settles at least one member, so there are at most n - 1 transfers.
+    """
+    creditors = [(-cents, user_id) for user_id, cents in balances.items() if cents > 0]
+    debtors = [(cents, user_id) for user_id, cents in balances.items() if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return transfers
+
+
+def group_settlement(cursor, group_id, rates, currency=FX_BASE_CURRENCY):
+    cursor.execute(*group_balances_query(group_id, currency, rates))
+    rows = cursor.fetchall()
+
+    names = {row['UserID']: row['Name'] for row in rows}
+    balances = zero_sum({row['UserID']: to_cents(row['Balance'] or 0) for row in rows})
+    transfers = settle(balances)
+
+    return {
+        'groupId': group_id,
+        'currency': currency,
+        'balances': [
+            {'userId': user_id, 'name': names[user_id], 'balance': cents / 100}
+            for user_id, cents in balances.items() if cents != 0
+        ],
+        'transfers': [
+            {
+                'fromUserId': from_user_id,
+                'fromUserName': names[from_user_id],
+                'toUserId': to_user_id,
+                'toUserName': names[to_user_id],
+                'amount': cents / 100
+            }
+            for from_user_id, to_user_id, cents in transfers
+        ]
+    }
@@ -0,0 +1,221 @@
+"""
+Non-blocking, structured logging.
+
+configure_logging() puts a single QueueHandler on the root logger. Request
+threads only copy the record (message rendered, traceback formatted,
+request ID attached) onto a bounded in-memory queue; a QueueListener
+thread formats it as one JSON object per line and does the write. When
+the queue is full, records are dropped and counted rather than blocking
+the request.
+
+Settings:
+    LOG_LEVEL              root level (INFO)
+    LOG_LEVELS             per-logger levels, e.g.
+                           "backend.routes=DEBUG,werkzeug=WARNING"
+    LOG_FORMAT             json (default) or text
+    LOG_DEBUG_SAMPLE_RATE  share of requests whose DEBUG records are kept
+                           (0.1); sampling is per request ID, so a sampled
+                           request keeps all of its debug lines
+    LOG_QUEUE_SIZE         records buffered before dropping (10000)
+
+init_app() gives every request an ID (the incoming X-Request-ID when it
+looks sane, otherwise a new one), returns it in the X-Request-ID response
+header and adds it to every record logged during the request.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Everything a LogRecord has by default; any other attribute came in via extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id'}
+
+
+def parse_levels(spec):
+    """'a=DEBUG, b.c=warning' -> {'a': 'DEBUG', 'b.c': 'WARNING'}"""
+    levels = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, level = item.partition('=')
+        level = level.strip().upper()
+        if not name.strip() or not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f'Bad LOG_LEVELS entry: {item!r}')
+        levels[name.strip()] = level
+    return levels
+
+
+def current_request_id():
+    return g.get('request_id') if has_request_context() else None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['requestId'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+class DebugSampler(logging.Filter):
+    """Keeps DEBUG records for a rate share of requests (or of records outside requests)."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        request_id = current_request_id()
+        if request_id:
+            return zlib.crc32(request_id.encode()) % 10000 < self.rate * 10000
+        return random.random() < self.rate
+
+
+class RequestQueueHandler(logging.handlers.QueueHandler):
+    """Tags records with the request ID and never blocks or raises on a full queue."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Done in the calling thread: the request context and the traceback
+        # are only valid here; JSON formatting happens on the listener
+        record = copy.copy(record)
+        record.request_id = current_request_id()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'dropped': self.dropped}
+
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _output_handler(fmt):
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+    return output
+
+
+def configure_logging(level=LOG_LEVEL, levels=LOG_LEVELS, fmt=LOG_FORMAT,
+                      sample_rate=LOG_DEBUG_SAMPLE_RATE, queue_size=LOG_QUEUE_SIZE):
+    """Installs the queue handler on the root logger; later calls only re-apply levels."""
+    global _handler, _listener
+    with _lock:
+        root = logging.getLogger()
+        root.setLevel(level.upper())
+        for name, logger_level in parse_levels(levels).items():
+            logging.getLogger(name).setLevel(logger_level)
+        if _handler is not None:
+            return _handler
+
+        _handler = RequestQueueHandler(queue.Queue(queue_size))
+        _handler.addFilter(DebugSampler(sample_rate))
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+
+        _listener = logging.handlers.QueueListener(
+            _handler.queue, _output_handler(fmt), respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+        # A listener thread started before a fork (gunicorn --preload) does not
+        # exist in the child; give each worker its own
+        os.register_at_fork(after_in_child=_restart_listener)
+        return _handler
+
+
+def _stop_listener():
+    # Flushes what is still queued
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_listener():
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(
+            _handler.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def logging_stats():
+    return _handler.stats() if _handler is not None else {'queued': 0, 'dropped': 0}
+
+
+def assign_request_id():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+
+def add_request_id_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+def init_app(app):
+    app.before_request(assign_request_id)
+    app.after_request(add_request_id_header)
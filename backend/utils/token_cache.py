@@ -0,0 +1,205 @@
+"""
+Cache of already-verified JWTs for token_required.
+
+Entries are keyed on a SHA-256 digest of the raw token (the token itself is
+never stored). They hold the decoded user_id until the token's exp or
+TOKEN_CACHE_TTL seconds, whichever comes first, so each worker pays for the
+HMAC check and claim parsing once per token.
+
+Revocation: revoke_token() blocks a single token until it expires (logout);
+revoke_user() rejects every token issued to a user before now (password
+change). Both are written to the database (revoked_tokens and
+users.TokensValidAfter) in the caller's transaction, evict matching cache
+entries, and are broadcast over the pub/sub hub so the other workers apply
+them at once. A token that is not cached is checked against the database
+by load_revocation(), so a worker that missed the broadcast (no broker, or
+restarted) still rejects it; one it had already cached is rejected within
+TOKEN_CACHE_TTL.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from .pubsub import get_hub
+
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL', 300))
+# How long an issued token is valid; a user cutoff older than this rejects nothing
+TOKEN_LIFETIME_SECONDS = 24 * 3600
+REVOCATION_CHANNEL = 'auth:revocations'
+PRUNE_BATCH_SIZE = 1000
+
+REVOKE_TOKEN_QUERY = """
+    INSERT INTO revoked_tokens (Digest, ExpiresAt)
+    VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE ExpiresAt = VALUES(ExpiresAt)
+"""
+
+PRUNE_TOKENS_QUERY = """
+    DELETE FROM revoked_tokens
+    WHERE ExpiresAt <= %s
+    LIMIT %s
+"""
+
+REVOKE_USER_QUERY = """
+    UPDATE users SET TokensValidAfter = %s
+    WHERE UserID = %s
+"""
+
+REVOCATION_QUERY = """
+    SELECT u.TokensValidAfter,
+           EXISTS (
+               SELECT 1 FROM revoked_tokens r
+               WHERE r.Digest = %s AND r.ExpiresAt > %s
+           ) AS TokenRevoked
+    FROM users u
+    WHERE u.UserID = %s
+"""
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class TokenCache:
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._revoked_tokens = {}
+        self._revoked_users = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token):
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token, claims):
+        digest = token_digest(token)
+        now = time.time()
+        expires_at = min(claims.get('exp', now), now + self.ttl)
+        with self._lock:
+            self._entries[digest] = (claims['user_id'], expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def is_revoked(self, token, claims):
+        with self._lock:
+            if token_digest(token) in self._revoked_tokens:
+                return True
+            cutoff = self._revoked_users.get(claims['user_id'])
+        return cutoff is not None and claims.get('iat', 0) < cutoff
+
+    def apply_revocation(self, message):
+        now = time.time()
+        with self._lock:
+            if 'digest' in message:
+                self._revoked_tokens[message['digest']] = message['expires']
+                self._entries.pop(message['digest'], None)
+            if 'userId' in message:
+                user_id = message['userId']
+                self._revoked_users[user_id] = message['before']
+                for digest in [d for d, entry in self._entries.items() if entry[0] == user_id]:
+                    del self._entries[digest]
+            # Revocations only need remembering until the tokens would expire anyway
+            self._revoked_tokens = {
+                digest: expires for digest, expires in self._revoked_tokens.items()
+                if expires > now
+            }
+            self._revoked_users = {
+                user_id: before for user_id, before in self._revoked_users.items()
+                if before > now - TOKEN_LIFETIME_SECONDS
+            }
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRatio': self.hits / lookups if lookups else 0.0,
+                'revokedTokens': len(self._revoked_tokens),
+                'revokedUsers': len(self._revoked_users),
+            }
+
+
+token_cache = TokenCache()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _listen():
+    subscription = get_hub().subscribe(REVOCATION_CHANNEL)
+    while True:
+        message = subscription.get()
+        if message:
+            token_cache.apply_revocation(message)
+
+
+def start_revocation_listener():
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(target=_listen, name='token-revocations', daemon=True)
+            _listener.start()
+
+
+def _broadcast(message):
+    # Apply locally right away; the hub delivers it to the other workers
+    token_cache.apply_revocation(message)
+    get_hub().publish(REVOCATION_CHANNEL, message)
+
+
+def revoke_token(cursor, token, expires):
+    """Persists and broadcasts; call in the transaction that ends the session."""
+    now = time.time()
+    cursor.execute(REVOKE_TOKEN_QUERY, (token_digest(token), expires))
+    cursor.execute(PRUNE_TOKENS_QUERY, (now, PRUNE_BATCH_SIZE))
+    _broadcast({'digest': token_digest(token), 'expires': expires})
+
+
+def revoke_user(cursor, user_id):
+    """Persists and broadcasts; call in the transaction that changes the password."""
+    before = time.time()
+    cursor.execute(REVOKE_USER_QUERY, (before, user_id))
+    _broadcast({'userId': int(user_id), 'before': before})
+
+
+def load_revocation(cursor, token, claims):
+    """
+    Checks a token the cache has not seen against the database and keeps
+    what it finds in memory. A token of a user that no longer exists is
+    revoked too.
+    """
+    digest = token_digest(token)
+    cursor.execute(REVOCATION_QUERY, (digest, time.time(), claims['user_id']))
+    row = cursor.fetchone()
+    if row is None:
+        return True
+    valid_after, token_revoked = (
+        (row['TokensValidAfter'], row['TokenRevoked']) if isinstance(row, dict) else row)
+    if valid_after is not None and claims.get('iat', 0) < valid_after:
+        token_cache.apply_revocation({'userId': claims['user_id'], 'before': float(valid_after)})
+    if token_revoked:
+        token_cache.apply_revocation({'digest': digest, 'expires': claims.get('exp', time.time())})
+    return token_cache.is_revoked(token, claims)
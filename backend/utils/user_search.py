@@ -0,0 +1,277 @@
+"""
+In-process prefix index for the member picker's user search.
+
+Every user is indexed under a handful of lowercase tokens in four sorted
+tiers: full name, full email, each word of the name, and the email's local
+part, domain and local-part pieces. A search bisects into each tier in that
+order and walks the tokens that start with the term, stopping once it has
+enough results. So results come ranked (full-name prefix first, then email
+prefix, name-word prefix, other tokens; alphabetical within a tier) after
+reading only about limit index entries, instead of a LIKE '%term%' table
+scan. Matches are on token prefixes, not arbitrary substrings.
+
+Each worker loads the index on its first search and keeps it current:
+register/add/delete update it right away and are published on the pub/sub
+hub, so with PUBSUB_BACKEND=broker the other workers apply them too. Users
+created elsewhere are also picked up by a primary-key range read every
+USER_SEARCH_REFRESH_SECONDS, from a high-water mark that only that read
+advances (a local add of a higher ID must not hide a lower one committed by
+another worker meanwhile). Every USER_SEARCH_RELOAD_SECONDS the index is
+rebuilt from the table, which reconciles removals and changes that never
+reached this worker. One request at a time refreshes, reading and sorting
+outside the index lock; other requests keep searching the current index
+meanwhile, and changes made during a rebuild are replayed onto it. Callers
+re-read the matched rows by primary key, so a user deleted elsewhere never
+shows up in results.
+"""
+import bisect
+import os
+import re
+import threading
+import time
+from array import array
+from .pubsub import get_hub
+
+USER_SEARCH_REFRESH_SECONDS = float(os.environ.get('USER_SEARCH_REFRESH_SECONDS', 30))
+USER_SEARCH_RELOAD_SECONDS = float(os.environ.get('USER_SEARCH_RELOAD_SECONDS', 3600))
+LOAD_BATCH_SIZE = 10000
+INDEX_CHANNEL = 'users:search-index'
+
+_WORD_SPLIT = re.compile(r"[\s._\-+@]+")
+
+# Tiers are searched in order, which is what ranks the results
+FULL_NAME, FULL_EMAIL, NAME_WORD, EMAIL_PART = range(4)
+
+
+def normalize(text):
+    return (text or '').casefold().strip()
+
+
+def user_tokens(name, email):
+    """Returns [(tier, token)] for one user."""
+    name = normalize(name)
+    email = normalize(email)
+    local, _, domain = email.partition('@')
+    name_words = set(_WORD_SPLIT.split(name)) - {name}
+    email_parts = ({local, domain} | set(_WORD_SPLIT.split(local))) - name_words - {email}
+
+    tokens = [(FULL_NAME, name), (FULL_EMAIL, email)]
+    tokens.extend((NAME_WORD, word) for word in name_words)
+    tokens.extend((EMAIL_PART, part) for part in email_parts)
+    return [(tier, token) for tier, token in tokens if token]
+
+
+class _SortedTokens:
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.tokens = [token for token, _ in pairs]
+        self.ids = array('q', (user_id for _, user_id in pairs))
+
+    def insert(self, token, user_id):
+        position = bisect.bisect_left(self.tokens, token)
+        self.tokens.insert(position, token)
+        self.ids.insert(position, user_id)
+
+    def delete(self, token, user_id):
+        position = bisect.bisect_left(self.tokens, token)
+        while position < len(self.tokens) and self.tokens[position] == token:
+            if self.ids[position] == user_id:
+                del self.tokens[position]
+                del self.ids[position]
+                return
+            position += 1
+
+    def prefixed(self, term):
+        """Yields user IDs whose token starts with term, in token order."""
+        position = bisect.bisect_left(self.tokens, term)
+        while position < len(self.tokens) and self.tokens[position].startswith(term):
+            yield self.ids[position]
+            position += 1
+
+
+class UserSearchIndex:
+    def __init__(self):
+        self._tiers = [_SortedTokens() for _ in range(4)]
+        self._docs = {}
+        self._lock = threading.RLock()
+        # Held by the one request doing a refresh; the others keep searching
+        self._refresh_lock = threading.Lock()
+        # Changes made while a full reload reads the table, replayed onto its result
+        self._journal = None
+        self.loaded = False
+        self.max_user_id = 0
+        # Highest UserID read from the table; only bulk_load/refresh move it
+        self.synced_user_id = 0
+        self.refreshed_at = 0.0
+        self.loaded_at = 0.0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, user_id, name, email):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((user_id, (name, email)))
+            if user_id in self._docs:
+                self.remove(user_id)
+            self._docs[user_id] = (name, email)
+            for tier, token in user_tokens(name, email):
+                self._tiers[tier].insert(token, user_id)
+            self.max_user_id = max(self.max_user_id, user_id)
+
+    def remove(self, user_id):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((user_id, None))
+            doc = self._docs.pop(user_id, None)
+            if doc is None:
+                return
+            for tier, token in user_tokens(*doc):
+                self._tiers[tier].delete(token, user_id)
+
+    def bulk_load(self, rows):
+        """Replaces the index with (user_id, name, email) rows, one sort per tier."""
+        docs = {}
+        pairs = [[] for _ in range(4)]
+        for user_id, name, email in rows:
+            docs[user_id] = (name, email)
+            for tier, token in user_tokens(name, email):
+                pairs[tier].append((token, user_id))
+        tiers = [_SortedTokens(tier_pairs) for tier_pairs in pairs]
+        with self._lock:
+            self._docs = docs
+            self._tiers = tiers
+            self.max_user_id = max(docs, default=0)
+            self.synced_user_id = self.max_user_id
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+            journal, self._journal = self._journal or [], None
+            for user_id, doc in journal:
+                if doc is None:
+                    self.remove(user_id)
+                else:
+                    self.add(user_id, *doc)
+
+    def search(self, term, limit=10, exclude=None):
+        """Ranked user IDs; stops as soon as limit matches are found."""
+        term = normalize(term)
+        if not term:
+            return []
+        results = []
+        seen = {exclude}
+        with self._lock:
+            for tier in self._tiers:
+                for user_id in tier.prefixed(term):
+                    if user_id in seen:
+                        continue
+                    seen.add(user_id)
+                    results.append(user_id)
+                    if len(results) == limit:
+                        return results
+        return results
+
+    def _due(self, now):
+        return (not self.loaded
+                or now - self.loaded_at >= USER_SEARCH_RELOAD_SECONDS
+                or now - self.refreshed_at >= USER_SEARCH_REFRESH_SECONDS)
+
+    def refresh(self, connection):
+        """Full load on first use and every reload period; in between picks up users added elsewhere."""
+        now = time.monotonic()
+        if not self._due(now):
+            return
+        # Single flight. Only the first load makes others wait; after that they
+        # keep searching the current index while one request reloads it
+        if not self._refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if not self._due(now):
+                return
+            full = not self.loaded or now - self.loaded_at >= USER_SEARCH_RELOAD_SECONDS
+            if full:
+                with self._lock:
+                    self._journal = []
+            try:
+                rows = self._read(connection, 0 if full else self.synced_user_id)
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                raise
+
+            if full:
+                # Builds the tiers outside the lock and swaps them in under it
+                self.bulk_load(rows)
+            else:
+                for user_id, name, email in rows:
+                    self.add(user_id, name, email)
+                if rows:
+                    self.synced_user_id = max(self.synced_user_id, rows[-1][0])
+            self.refreshed_at = now
+        finally:
+            self._refresh_lock.release()
+
+    def _read(self, connection, after):
+        cursor = connection.cursor(buffered=False)
+        try:
+            cursor.execute("""
+                SELECT UserID, Name, Email FROM Users
+                WHERE UserID > %s
+                ORDER BY UserID
+            """, (after,))
+            rows = []
+            while True:
+                batch = cursor.fetchmany(LOAD_BATCH_SIZE)
+                if not batch:
+                    break
+                rows.extend(batch)
+            return rows
+        finally:
+            cursor.close()
+
+    def apply(self, message):
+        """Applies a change published by index_user/unindex_user."""
+        if not self.loaded:
+            return
+        if message.get('op') == 'remove':
+            self.remove(message['userId'])
+        else:
+            self.add(message['userId'], message['name'], message['email'])
+
+
+search_index = UserSearchIndex()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _listen():
+    subscription = get_hub().subscribe(INDEX_CHANNEL)
+    while True:
+        message = subscription.get()
+        if message:
+            search_index.apply(message)
+
+
+def start_index_listener():
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(target=_listen, name='user-search-index', daemon=True)
+            _listener.start()
+
+
+def _broadcast(message):
+    # Apply locally right away; the hub delivers it to the other workers
+    search_index.apply(message)
+    get_hub().publish(INDEX_CHANNEL, message)
+
+
+def index_user(user_id, name, email):
+    # Before the first search there is nothing to keep in sync; the full load will see it
+    if user_id:
+        _broadcast({'op': 'add', 'userId': int(user_id), 'name': name, 'email': email})
+
+
+def unindex_user(user_id):
+    _broadcast({'op': 'remove', 'userId': int(user_id)})
@@ -0,0 +1,497 @@
+"""
+Precomputed dashboard statistics per user.
+
+Two tables back GET /stats:
+
+    user_stats_daily  one row per (user, day the debt was created, group,
+                      currency): debts the user is part of, split into
+                      owed (others owe the user) and owing (the user owes
+                      others), both in total and still unpaid
+    user_stats        one JSON summary per user: 7/30/90/365-day windows,
+                      open owed/owing totals and a per-group breakdown, in
+                      the user's preferred currency
+
+Writers call record_stats_change() with the same before/after debt rows they
+pass to record_debt_change(), in the same transaction. It locks the
+user_stats rows of the users involved, upserts the daily deltas and adds
+them to the running totals kept next to each summary (user_stats.Totals),
+so a write touches only the keys it changes and the dashboard is a single
+primary-key read. Days come from the database (CURRENT_DATE()), as in the
+rebuild's DATE(CreatedDate).
+
+Windows roll over by day: a summary built on an earlier day, in another
+currency than the user's current one or with other FX rates is rebuilt from
+the daily rows instead, by the next write or by the next read (so the first
+GET /stats of a day writes and commits the user's summary).
+
+Backfill or repair everything from the command line:
+
+    python -m backend.utils.user_stats rebuild
+"""
+import argparse
+import json
+import sys
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from .fx import CENT, FX_BASE_CURRENCY, rate_cache, resolve_currency, to_base_sql
+from .ledger import is_open
+
+STATS_WINDOWS = (7, 30, 90, 365)
+REBUILD_BATCH_SIZE = 500
+
+DAILY_COLUMNS = ('DebtCount', 'OpenCount', 'OwedAmount', 'OwingAmount', 'OpenOwed', 'OpenOwing')
+COUNT_COLUMNS = ('DebtCount', 'OpenCount')
+
+UPSERT_DAILY_QUERY = f"""
+    INSERT INTO user_stats_daily (UserID, Day, GroupID, Currency, {', '.join(DAILY_COLUMNS)})
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        {', '.join(f'{column} = {column} + VALUES({column})' for column in DAILY_COLUMNS)}
+"""
+
+UPSERT_SUMMARY_QUERY = """
+    INSERT INTO user_stats (UserID, AsOf, Summary, Totals)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE AsOf = VALUES(AsOf), Summary = VALUES(Summary), Totals = VALUES(Totals)
+"""
+
+# Every summary update takes these locks first, in UserID order, so writers
+# of the same user queue here instead of on that user's daily rows
+LOCK_SUMMARIES_QUERY = """
+    SELECT u.UserID, u.Currency, s.AsOf, s.Totals, CURRENT_DATE() AS Today
+    FROM users u
+    LEFT JOIN user_stats s ON s.UserID = u.UserID
+    WHERE u.UserID IN ({users})
+    ORDER BY u.UserID
+    FOR UPDATE OF s
+"""
+
+# Same shape as the incremental deltas, straight from debts
+DAILY_FROM_DEBTS_QUERY = f"""
+    SELECT UserID, Day, GroupID, Currency,
+           COUNT(*), SUM(IsOpen),
+           SUM(Owed), SUM(Owing),
+           SUM(CASE WHEN IsOpen = 1 THEN Owed ELSE 0 END),
+           SUM(CASE WHEN IsOpen = 1 THEN Owing ELSE 0 END)
+    FROM (
+        SELECT ToUserID AS UserID, DATE(CreatedDate) AS Day, GroupID, Currency,
+               Amount AS Owed, 0 AS Owing, Status <> 'paid' AS IsOpen
+        FROM debts
+        UNION ALL
+        SELECT FromUserID AS UserID, DATE(CreatedDate) AS Day, GroupID, Currency,
+               0 AS Owed, Amount AS Owing, Status <> 'paid' AS IsOpen
+        FROM debts
+    ) t
+    GROUP BY UserID, Day, GroupID, Currency
+"""
+
+
+def debt_day(debt, today):
+    created = debt.get('CreatedDate')
+    if created is None:
+        # Rows the caller just inserted; the column defaults to the database's now
+        return today
+    return created.date() if isinstance(created, datetime) else created
+
+
+def stats_deltas(debts, sign=1, today=None):
+    """
+    Folds debt dicts into {(user, day, group, currency): [count, open, owed,
+    owing, open owed, open owing]}; today is the day of rows with no CreatedDate.
+    """
+    deltas = {}
+    for debt in debts:
+        amount = Decimal(str(debt['Amount'])) * sign
+        open_count = sign if is_open(debt['Status']) else 0
+        open_amount = amount if open_count else Decimal(0)
+        day = debt_day(debt, today)
+
+        for user_id, owed, owing, open_owed, open_owing in (
+            (debt['ToUserID'], amount, 0, open_amount, 0),
+            (debt['FromUserID'], 0, amount, 0, open_amount),
+        ):
+            row = deltas.setdefault((int(user_id), day, debt['GroupID'], debt['Currency']),
+                                    [0, 0, Decimal(0), Decimal(0), Decimal(0), Decimal(0)])
+            row[0] += sign
+            row[1] += open_count
+            row[2] += owed
+            row[3] += owing
+            row[4] += open_owed
+            row[5] += open_owing
+    return deltas
+
+
+def new_totals():
+    return {
+        'totals': dict.fromkeys(DAILY_COLUMNS, Decimal(0)),
+        'windows': {f'{days}d': [Decimal(0)] * 3 for days in STATS_WINDOWS},
+        'groups': {},
+    }
+
+
+def fold_daily(totals, daily_rows, today):
+    """
+    Adds daily rows (dicts with Day, GroupID and DAILY_COLUMNS, amounts in
+    FX_BASE_CURRENCY) to running totals. Folding is additive, so the rows
+    may be a user's whole history or just the deltas of one write.
+    """
+    for row in daily_rows:
+        for column in DAILY_COLUMNS:
+            totals['totals'][column] += row[column]
+
+        group = totals['groups'].setdefault(row['GroupID'], dict.fromkeys(DAILY_COLUMNS, Decimal(0)))
+        for column in DAILY_COLUMNS:
+            group[column] += row[column]
+
+        age = (today - row['Day']).days
+        for days in STATS_WINDOWS:
+            if age < days:
+                window = totals['windows'][f'{days}d']
+                window[0] += row['DebtCount']
+                window[1] += row['OwedAmount']
+                window[2] += row['OwingAmount']
+    return totals
+
+
+def dump_totals(totals, meta):
+    """JSON for user_stats.Totals; meta records what the totals are valid for."""
+    return json.dumps({
+        **meta,
+        'totals': {column: str(value) for column, value in totals['totals'].items()},
+        'windows': {name: [str(value) for value in window] for name, window in totals['windows'].items()},
+        'groups': {
+            str(group_id): {column: str(value) for column, value in group.items()}
+            for group_id, group in totals['groups'].items()
+        },
+    })
+
+
+def load_totals(text):
+    """(totals, meta) from user_stats.Totals."""
+    data = json.loads(text)
+    totals = {
+        'totals': {column: Decimal(value) for column, value in data.pop('totals').items()},
+        'windows': {name: [Decimal(value) for value in window] for name, window in data.pop('windows').items()},
+        'groups': {
+            int(group_id): {column: Decimal(value) for column, value in group.items()}
+            for group_id, group in data.pop('groups').items()
+        },
+    }
+    return totals, data
+
+
+def render_summary(totals, group_names, total_groups, today,
+                   currency=FX_BASE_CURRENCY, rate=1, rates_version=None):
+    """The GET /stats document for running totals; rate converts them to currency."""
+    def money(amount):
+        return float((Decimal(amount) * rate).quantize(CENT, ROUND_HALF_UP))
+
+    overall = totals['totals']
+    return {
+        'asOf': today.isoformat(),
+        'currency': currency,
+        'ratesVersion': rates_version,
+        'totalGroups': total_groups,
+        'totalDebts': int(overall['DebtCount']),
+        'activeDebts': int(overall['OpenCount']),
+        'totalAmount': money(overall['OwedAmount'] + overall['OwingAmount']),
+        'owed': money(overall['OpenOwed']),
+        'owing': money(overall['OpenOwing']),
+        'netBalance': money(overall['OpenOwed'] - overall['OpenOwing']),
+        'windows': {
+            name: {
+                'debtCount': int(count),
+                'owed': money(owed),
+                'owing': money(owing),
+                'net': money(owed - owing)
+            }
+            for name, (count, owed, owing) in totals['windows'].items()
+        },
+        'groups': [
+            {
+                'groupId': group_id,
+                'groupName': group_names.get(group_id),
+                'debtCount': int(group['DebtCount']),
+                'activeDebts': int(group['OpenCount']),
+                'owed': money(group['OpenOwed']),
+                'owing': money(group['OpenOwing']),
+                'netBalance': money(group['OpenOwed'] - group['OpenOwing'])
+            }
+            for group_id, group in sorted(totals['groups'].items())
+            if group['DebtCount']
+        ]
+    }
+
+
+def build_summary(daily_rows, group_names, total_groups, today=None,
+                  currency=FX_BASE_CURRENCY, rate=1, rates_version=None):
+    """Summary of one user's daily rows; see fold_daily() and render_summary()."""
+    today = today or date.today()
+    return render_summary(fold_daily(new_totals(), daily_rows, today), group_names, total_groups,
+                          today, currency=currency, rate=rate, rates_version=rates_version)
+
+
+def _in_list(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _dict_rows(cursor):
+    rows = cursor.fetchall()
+    if rows and not isinstance(rows[0], dict):
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in rows]
+    return rows
+
+
+def _lock_summaries(cursor, user_ids):
+    """Locks the users' summaries; returns ({user_id: row}, the database's current date)."""
+    cursor.execute(LOCK_SUMMARIES_QUERY.format(users=_in_list(user_ids)), user_ids)
+    rows = _dict_rows(cursor)
+    today = rows[0]['Today'] if rows else None
+    return {row['UserID']: row for row in rows}, today
+
+
+def _group_names(cursor, group_ids):
+    if not group_ids:
+        return {}
+    cursor.execute(f"""
+        SELECT GroupID, GroupName FROM groupsaldo
+        WHERE GroupID IN ({_in_list(group_ids)}) AND DeletedAt IS NULL
+    """, group_ids)
+    return {row['GroupID']: row['GroupName'] for row in _dict_rows(cursor)}
+
+
+def _rebuild_summaries(cursor, users, today, rates, version):
+    """Summaries and totals of already locked users, from all their daily rows."""
+    user_ids = sorted(users)
+
+    # Locking read: see daily rows committed since our snapshot was taken.
+    # Rows in other currencies are converted to the base and merged.
+    columns = []
+    params = []
+    for column in DAILY_COLUMNS:
+        if column in COUNT_COLUMNS:
+            columns.append(f'SUM(d.{column}) AS {column}')
+        else:
+            amount, amount_params = to_base_sql(f'd.{column}', 'd.Currency', rates)
+            columns.append(f'SUM({amount}) AS {column}')
+            params += amount_params
+    cursor.execute(f"""
+        SELECT d.UserID, d.Day, d.GroupID, {', '.join(columns)}
+        FROM user_stats_daily d
+        WHERE d.UserID IN ({_in_list(user_ids)})
+        GROUP BY d.UserID, d.Day, d.GroupID
+        FOR SHARE OF d
+    """, params + user_ids)
+    daily = {user_id: [] for user_id in user_ids}
+    for row in _dict_rows(cursor):
+        daily[row['UserID']].append(row)
+
+    cursor.execute(f"""
+        SELECT gm.UserID, COUNT(*) AS GroupCount
+        FROM groupmembers gm
+        JOIN groupsaldo g ON g.GroupID = gm.GroupID AND g.DeletedAt IS NULL
+        WHERE gm.UserID IN ({_in_list(user_ids)})
+        GROUP BY gm.UserID
+    """, user_ids)
+    group_counts = {row['UserID']: row['GroupCount'] for row in _dict_rows(cursor)}
+
+    group_names = _group_names(cursor, sorted({row['GroupID'] for rows in daily.values() for row in rows}))
+
+    results = {}
+    for user_id, rows in daily.items():
+        # Soft-deleted groups keep their daily rows until the purge job removes them
+        rows = [row for row in rows if row['GroupID'] in group_names]
+        currency = resolve_currency(rates, users[user_id]['Currency'])
+        totals = fold_daily(new_totals(), rows, today)
+        meta = {'asOf': today.isoformat(), 'currency': currency, 'ratesVersion': version,
+                'totalGroups': group_counts.get(user_id, 0),
+                'groupNames': {str(group_id): group_names[group_id] for group_id in totals['groups']}}
+        results[user_id] = (totals, meta)
+    return results
+
+
+def _save_summaries(cursor, results, today, rates):
+    summaries = {}
+    params = []
+    for user_id, (totals, meta) in sorted(results.items()):
+        names = {int(group_id): name for group_id, name in meta['groupNames'].items()}
+        summaries[user_id] = render_summary(
+            totals, names, meta['totalGroups'], today, currency=meta['currency'],
+            rate=rates[meta['currency']], rates_version=meta['ratesVersion'])
+        params.append((user_id, today, json.dumps(summaries[user_id]), dump_totals(totals, meta)))
+    cursor.executemany(UPSERT_SUMMARY_QUERY, params)
+    return summaries
+
+
+def refresh_user_stats(cursor, user_ids):
+    """
+    Rebuilds the summaries of user_ids from all their daily rows, e.g. after
+    a membership change; debt writes go through record_stats_change().
+    5-6 queries in total (plus FX rates, when stale).
+    """
+    user_ids = sorted({int(user_id) for user_id in user_ids})
+    if not user_ids:
+        return {}
+    rates, version = rate_cache.get(cursor)
+    users, today = _lock_summaries(cursor, user_ids)
+    if not users:
+        return {}
+    return _save_summaries(cursor, _rebuild_summaries(cursor, users, today, rates, version), today, rates)
+
+
+def _current_totals(user, today, rates, version):
+    """(totals, meta) stored for a locked user if they can take deltas, else None."""
+    if not user['Totals'] or user['AsOf'] != today:
+        return None
+    totals, meta = load_totals(user['Totals'])
+    if meta.get('currency') != resolve_currency(rates, user['Currency']) or meta.get('ratesVersion') != version:
+        return None
+    return totals, meta
+
+
+def record_stats_change(cursor, before=(), after=()):
+    """
+    Applies a debt change to user_stats_daily and to the running totals of
+    the users involved. Only their summary rows and the daily keys the change
+    touches are locked; a user whose totals are from an earlier day or stale
+    FX rates is rebuilt from the daily rows instead.
+    """
+    user_ids = sorted({int(debt[column]) for debt in [*before, *after]
+                       for column in ('FromUserID', 'ToUserID')})
+    if not user_ids:
+        return
+    rates, version = rate_cache.get(cursor)
+    users, today = _lock_summaries(cursor, user_ids)
+
+    merged = {}
+    for key, values in list(stats_deltas(before, -1, today).items()) + list(stats_deltas(after, 1, today).items()):
+        row = merged.setdefault(key, [0] * len(DAILY_COLUMNS))
+        for index, value in enumerate(values):
+            row[index] += value
+    deltas = {key: row for key, row in merged.items() if any(row)}
+    if not deltas:
+        return
+    cursor.executemany(UPSERT_DAILY_QUERY, [
+        key + tuple(values) for key, values in sorted(deltas.items())
+    ])
+
+    # The deltas in FX_BASE_CURRENCY, as daily rows per user
+    delta_rows = {}
+    for (user_id, day, group_id, currency), values in deltas.items():
+        row = {'Day': day, 'GroupID': group_id}
+        for column, value in zip(DAILY_COLUMNS, values):
+            row[column] = value if column in COUNT_COLUMNS else Decimal(value) / rates[currency]
+        delta_rows.setdefault(user_id, []).append(row)
+
+    results = {}
+    stale = {}
+    for user_id, rows in delta_rows.items():
+        user = users.get(user_id)
+        if user is None:
+            continue
+        current = _current_totals(user, today, rates, version)
+        if current is None:
+            stale[user_id] = user
+            continue
+        results[user_id] = (fold_daily(current[0], rows, today), current[1])
+
+    # Groups the totals have not seen yet need a name
+    new_group_ids = sorted({
+        row['GroupID'] for user_id, (totals, meta) in results.items() for row in delta_rows[user_id]
+        if str(row['GroupID']) not in meta['groupNames']
+    })
+    names = _group_names(cursor, new_group_ids)
+    for totals, meta in results.values():
+        for group_id in totals['groups']:
+            meta['groupNames'].setdefault(str(group_id), names.get(group_id))
+
+    if stale:
+        results.update(_rebuild_summaries(cursor, stale, today, rates, version))
+    _save_summaries(cursor, results, today, rates)
+
+
+def get_user_stats(connection, user_id):
+    """
+    The user's summary, or None for an unknown user. A summary that is
+    missing, from an earlier day or built with stale FX rates is rebuilt and
+    committed first, so this read path can write (once per user and day).
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT s.AsOf, s.Summary, s.Totals, u.Currency, CURRENT_DATE() AS Today
+            FROM users u
+            LEFT JOIN user_stats s ON s.UserID = u.UserID
+            WHERE u.UserID = %s
+        """, (user_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        if row['Totals'] and row['AsOf'] == row['Today']:
+            summary = json.loads(row['Summary'])
+            rates, version = rate_cache.get(cursor)
+            if (summary.get('currency') == resolve_currency(rates, row['Currency'])
+                    and summary.get('ratesVersion') == version):
+                return summary
+
+        summary = refresh_user_stats(cursor, [user_id]).get(int(user_id))
+        connection.commit()
+        return summary
+    finally:
+        cursor.close()
+
+
+def rebuild(connection):
+    """Recomputes user_stats_daily from debts, then every user's summary."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("DELETE FROM user_stats_daily")
+        cursor.execute(f"""
+            INSERT INTO user_stats_daily (UserID, Day, GroupID, Currency, {', '.join(DAILY_COLUMNS)})
+            {DAILY_FROM_DEBTS_QUERY}
+        """)
+        connection.commit()
+
+        rebuilt = 0
+        last_user_id = 0
+        while True:
+            cursor.execute("""
+                SELECT UserID FROM users
+                WHERE UserID > %s
+                ORDER BY UserID
+                LIMIT %s
+            """, (last_user_id, REBUILD_BATCH_SIZE))
+            user_ids = [row['UserID'] for row in cursor.fetchall()]
+            if not user_ids:
+                return rebuilt
+            refresh_user_stats(cursor, user_ids)
+            connection.commit()
+            rebuilt += len(user_ids)
+            last_user_id = user_ids[-1]
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    from backend.database_config import get_db_connection
+
+    parser = argparse.ArgumentParser(description='Rebuild precomputed dashboard stats')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args(argv)
+
+    connection = get_db_connection()
+    try:
+        rebuilt = rebuild(connection)
+    finally:
+        connection.close()
+
+    print(f'{rebuilt} user summaries rebuilt')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,7 @@ import React from 'react';
 import { Link, useNavigate, useLocation } from 'react-router-dom';
 import './Navbar.css';
 import NotificationBell from './NotificationBell';
+import axiosInstance from '../utils/axios';
 import ProfileButton from './ProfileButton';
 
 const Navbar = () => {
@@ -13,7 +14,12 @@ const Navbar = () => {
     return null;
   }
 
-  const handleLogout = () => {
+  const handleLogout = async () => {
+    try {
+      await axiosInstance.post('/users/logout');
+    } catch (err) {
+      // Token zaten geçersizse yine de çıkış yap
+    }
     localStorage.removeItem('token');
     localStorage.removeItem('user_id');
     navigate('/login');
@@ -21,8 +21,18 @@ const NotificationBell = () => {
   useEffect(() => {
     if (userId) {
       fetchNotifications();
-      const interval = setInterval(fetchNotifications, 30000);
-      return () => clearInterval(interval);
+
+      // Sunucu yeni bildirimleri anında gönderir; EventSource yoksa polling
+      if (typeof EventSource === 'undefined') {
+        const interval = setInterval(fetchNotifications, 30000);
+        return () => clearInterval(interval);
+      }
+
+      const source = new EventSource(
+        `${axiosInstance.defaults.baseURL}/notifications/stream?userId=${userId}`
+      );
+      source.addEventListener('notification', fetchNotifications);
+      return () => source.close();
     }
   }, [fetchNotifications, userId]);
 
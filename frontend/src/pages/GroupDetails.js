@@ -1,10 +1,18 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import './GroupDetails.css';
 import Dialog from '../components/Dialog';
 import { FaBalanceScale, FaTrash } from 'react-icons/fa';
 
+// Sunucunun izin verdiği en büyük sayfa
+const DEBT_PAGE_SIZE = 500;
+
+// Tutarı kendi para biriminde biçimlendir
+const formatMoney = (amount, currency) =>
+  new Intl.NumberFormat('en-US', { style: 'currency', currency: currency || 'USD' })
+    .format(parseFloat(amount));
+
 const GroupDetails = () => {
   const { groupId } = useParams();
   const navigate = useNavigate();
@@ -21,27 +29,60 @@ const GroupDetails = () => {
     splitEqually: true
   });
   const [debtSummary, setDebtSummary] = useState([]);
+  const [currency, setCurrency] = useState('USD');
   const [debtRelations, setDebtRelations] = useState([]);
   const [showDialog, setShowDialog] = useState(false);
   const [showDeleteDialog, setShowDeleteDialog] = useState(false);
   const [debtToDelete, setDebtToDelete] = useState(null);
   const [showDeleteModal, setShowDeleteModal] = useState(false);
 
+  const loadGroup = useCallback(async () => {
+    // Grup, üyeler ve borçların ilk sayfası tek istekte
+    const response = await axios.get(`http://localhost:5005/groups/${groupId}/overview`, {
+      params: { limit: DEBT_PAGE_SIZE }
+    });
+    const { data } = response;
+    setGroup(data.group);
+    setMembers(data.members);
+
+    // Borçlar sayfalı döner; X-Next-Cursor bitene kadar kalan sayfaları al,
+    // yoksa özet ve borç ilişkileri sadece ilk sayfadan hesaplanır
+    const allDebts = [...data.debts];
+    let cursor = response.headers['x-next-cursor'];
+    while (cursor) {
+      const page = await axios.get(`http://localhost:5005/groups/${groupId}/debts`, {
+        params: { after: cursor, limit: DEBT_PAGE_SIZE }
+      });
+      allDebts.push(...page.data);
+      cursor = page.headers['x-next-cursor'];
+    }
+
+    // Borçlar sadece kullanıcı ID'si taşır; isimleri üyelerden çöz
+    const names = {};
+    [...data.members, ...data.otherUsers].forEach(user => {
+      names[user.UserID] = user.Name;
+    });
+    setDebts(allDebts.map(debt => ({
+      ...debt,
+      FromUserName: names[debt.FromUserID] || debt.FromUserName,
+      ToUserName: names[debt.ToUserID] || debt.ToUserName
+    })));
+
+    // Borçlar farklı para birimlerinde olabilir; bakiyeler sunucuda
+    // raporlama para birimine çevrilmiş olarak gelir
+    setCurrency(data.currency);
+    setDebtSummary(data.balances.map(balance => ({
+      name: names[balance.userId],
+      totalOwed: balance.owes,      // başkalarına olan borç
+      totalOwes: balance.receives,  // başkalarından alacak
+      netBalance: balance.balance   // pozitif = alacaklı, negatif = borçlu
+    })));
+  }, [groupId]);
+
   useEffect(() => {
     const fetchGroupDetails = async () => {
       try {
-        // Grup bilgilerini al
-        const groupResponse = await axios.get(`http://localhost:5005/groups/${groupId}`);
-        setGroup(groupResponse.data);
-
-        // Grup üyelerini al
-        const membersResponse = await axios.get(`http://localhost:5005/groups/${groupId}/members`);
-        setMembers(membersResponse.data);
-
-        // Grup borçlarını al
-        const debtsResponse = await axios.get(`http://localhost:5005/groups/${groupId}/debts`);
-        setDebts(debtsResponse.data);
-
+        await loadGroup();
         setLoading(false);
       } catch (err) {
         setError(err.response?.data?.error || 'Failed to fetch group details');
@@ -50,42 +91,7 @@ const GroupDetails = () => {
     };
 
     fetchGroupDetails();
-  }, [groupId]);
-
-  useEffect(() => {
-    // Borç özetini hesapla
-    const calculateDebtSummary = () => {
-      const summary = {};
-      
-      // Her üye için boş özet oluştur
-      members.forEach(member => {
-        summary[member.UserID] = {
-          name: member.Name,
-          totalOwed: 0,    // başkalarına olan borç
-          totalOwes: 0     // başkalarından alacak
-        };
-      });
-
-      // Borçları hesapla
-      debts.forEach(debt => {
-        const amount = parseFloat(debt.Amount);
-        summary[debt.FromUserID].totalOwed += amount;  // borçlu
-        summary[debt.ToUserID].totalOwes += amount;    // alacaklı
-      });
-
-      // Array'e çevir ve net borç durumunu hesapla
-      const summaryArray = Object.values(summary).map(item => ({
-        ...item,
-        netBalance: item.totalOwes - item.totalOwed // pozitif = alacaklı, negatif = borçlu
-      }));
-
-      setDebtSummary(summaryArray);
-    };
-
-    if (members.length > 0 && debts.length > 0) {
-      calculateDebtSummary();
-    }
-  }, [members, debts]);
+  }, [loadGroup]);
 
   useEffect(() => {
     // Borç ilişkilerini hesapla
@@ -94,11 +100,13 @@ const GroupDetails = () => {
       
       debts.forEach(debt => {
         if (debt.Status !== 'paid') {  // Sadece ödenmemiş borçları göster
-          const key = `${debt.FromUserID}-${debt.ToUserID}`;
+          // Farklı para birimleri toplanmaz
+          const key = `${debt.FromUserID}-${debt.ToUserID}-${debt.Currency}`;
           if (!relations[key]) {
             relations[key] = {
               fromUser: debt.FromUserName,
               toUser: debt.ToUserName,
+              currency: debt.Currency,
               totalAmount: 0,
               debtId: debt.DebtID,  // İlk borç ID'sini sakla
               status: debt.Status
@@ -121,28 +129,21 @@ const GroupDetails = () => {
   const handleAddExpense = async (e) => {
     e.preventDefault();
     try {
-      const amount = parseFloat(newExpense.amount);
-      const splitAmount = amount / (members.length);
-      
-      // Ödemeyi yapan kişi hariç herkese borç ekle
-      const debtPromises = members
-        .filter(member => member.UserID !== parseInt(newExpense.paidByUserId))
-        .map(member => {
-          return axios.post(`http://localhost:5005/groups/${groupId}/debts`, {
-            fromUserId: member.UserID,
-            toUserId: newExpense.paidByUserId,
-            amount: splitAmount.toFixed(2),
-            description: newExpense.description,
-            status: 'pending'
-          });
-        });
-
-      await Promise.all(debtPromises);
+      // Ödemeyi yapan kişi hariç herkese borç ekle (tek istekte)
+      await axios.post(`http://localhost:5005/groups/${groupId}/expenses/split`, {
+        paidByUserId: newExpense.paidByUserId,
+        amount: newExpense.amount,
+        currency,
+        description: newExpense.description,
+        split: {
+          mode: 'equal',
+          userIds: members.map(member => member.UserID)
+        }
+      });
       
       setShowAddDebtModal(false);
       // Borçları yeniden yükle
-      const debtsResponse = await axios.get(`http://localhost:5005/groups/${groupId}/debts`);
-      setDebts(debtsResponse.data);
+      await loadGroup();
       
       // Formu sıfırla
       setNewExpense({
@@ -175,8 +176,7 @@ const GroupDetails = () => {
     try {
       await axios.put(`http://localhost:5005/groups/${groupId}/debts/${debtId}/mark-paid`);
       // Borçları yeniden yükle
-      const debtsResponse = await axios.get(`http://localhost:5005/groups/${groupId}/debts`);
-      setDebts(debtsResponse.data);
+      await loadGroup();
     } catch (err) {
       setError(err.response?.data?.error || 'Failed to mark debt as paid');
     }
@@ -215,17 +215,17 @@ const GroupDetails = () => {
                   <div className="summary-header">
                     <span className="member-name">{member.name}</span>
                     <span className={`net-balance ${member.netBalance >= 0 ? 'positive' : 'negative'}`}>
-                      {member.netBalance >= 0 ? '+' : ''}{member.netBalance.toFixed(2)}$
+                      {member.netBalance >= 0 ? '+' : ''}{formatMoney(member.netBalance, currency)}
                     </span>
                   </div>
                   <div className="summary-details">
                     <div className="summary-row">
                       <span>Owes:</span>
-                      <span className="negative">-{member.totalOwed.toFixed(2)}$</span>
+                      <span className="negative">-{formatMoney(member.totalOwed, currency)}</span>
                     </div>
                     <div className="summary-row">
                       <span>Receives:</span>
-                      <span className="positive">+{member.totalOwes.toFixed(2)}$</span>
+                      <span className="positive">+{formatMoney(member.totalOwes, currency)}</span>
                     </div>
                   </div>
                 </div>
@@ -248,7 +248,7 @@ const GroupDetails = () => {
                 {debts.map(debt => (
                   <div key={debt.DebtID} className={`debt-card ${debt.Status === 'paid' ? 'paid' : ''}`}>
                     <div className="debt-amount-section">
-                      <span className="debt-amount">${parseFloat(debt.Amount).toFixed(2)}</span>
+                      <span className="debt-amount">{formatMoney(debt.Amount, debt.Currency)}</span>
                       {debt.Status === 'paid' && <span className="paid-badge">PAID</span>}
                     </div>
                     <div className="debt-info-section">
@@ -304,7 +304,7 @@ const GroupDetails = () => {
                     <span className="creditor">{relation.toUser}</span>
                   </div>
                   <div className="relation-amount">
-                    ${relation.totalAmount.toFixed(2)}
+                    {formatMoney(relation.totalAmount, relation.currency)}
                   </div>
                   <div className="relation-actions">
                     <button 
@@ -356,7 +356,7 @@ const GroupDetails = () => {
               </div>
 
               <div className="form-group">
-                <label>Total Amount ($)</label>
+                <label>Total Amount ({currency})</label>
                 <input 
                   type="number"
                   step="0.01"
@@ -366,7 +366,7 @@ const GroupDetails = () => {
                 />
                 {newExpense.amount && (
                   <div className="split-info">
-                    Each person will pay: ${(parseFloat(newExpense.amount) / members.length).toFixed(2)}
+                    Each person will pay: {formatMoney(parseFloat(newExpense.amount) / members.length, currency)}
                   </div>
                 )}
               </div>
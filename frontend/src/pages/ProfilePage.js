@@ -70,6 +70,8 @@ const ProfilePage = () => {
       );
 
       if (response.status === 200) {
+        // Eski token'lar iptal edildi, yenisini sakla
+        localStorage.setItem('token', response.data.token);
         setMessage({ text: 'Password updated successfully', type: 'success' });
         setIsChangingPassword(false);
         setPasswordForm({
@@ -1,3 +1,7 @@
+-- Schema version 1, for setting a database up by hand.
+-- Prefer `python -m backend.migrations upgrade`, which creates this schema
+-- and applies every later migration (backend/migrations) on top of it.
+
 CREATE TABLE users (
     UserID INT AUTO_INCREMENT PRIMARY KEY,
     Name VARCHAR(100) NOT NULL,
@@ -52,11 +56,66 @@ CREATE TABLE debts (
     Status VARCHAR(20) NOT NULL,
     GroupID INT NOT NULL,
     Description TEXT,
+    CreatedDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (FromUserID) REFERENCES users(UserID),
     FOREIGN KEY (ToUserID) REFERENCES users(UserID),
     FOREIGN KEY (GroupID) REFERENCES groupsaldo(GroupID)
 );
 
+CREATE TABLE balance_ledger (
+    GroupID INT NOT NULL,
+    UserID INT NOT NULL,
+    CounterpartyID INT NOT NULL,
+    DebtCount INT NOT NULL DEFAULT 0,
+    OpenCount INT NOT NULL DEFAULT 0,
+    TotalAmount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    Balance DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (GroupID, UserID, CounterpartyID),
+    INDEX idx_ledger_user (UserID)
+);
+
+CREATE TABLE user_stats_daily (
+    UserID INT NOT NULL,
+    Day DATE NOT NULL,
+    GroupID INT NOT NULL,
+    DebtCount INT NOT NULL DEFAULT 0,
+    OpenCount INT NOT NULL DEFAULT 0,
+    OwedAmount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    OwingAmount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    OpenOwed DECIMAL(14,2) NOT NULL DEFAULT 0,
+    OpenOwing DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (UserID, Day, GroupID),
+    INDEX idx_stats_daily_group (GroupID)
+);
+
+CREATE TABLE user_stats (
+    UserID INT PRIMARY KEY,
+    AsOf DATE NOT NULL,
+    Summary JSON NOT NULL,
+    FOREIGN KEY (UserID) REFERENCES users(UserID)
+);
+
+CREATE TABLE notification_outbox (
+    OutboxID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    EventType VARCHAR(20) NOT NULL,
+    Payload JSON NOT NULL,
+    CreatedDate TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3)
+);
+
+CREATE TABLE notification_state (
+    UserID INT PRIMARY KEY,
+    Version INT UNSIGNED NOT NULL DEFAULT 0,
+    UnreadCount INT NOT NULL DEFAULT 0,
+    LastChanged TIMESTAMP NULL,
+    FOREIGN KEY (UserID) REFERENCES users(UserID)
+);
+
+-- Seed notification_state for databases that already have notifications
+INSERT INTO notification_state (UserID, Version, UnreadCount, LastChanged)
+SELECT UserID, COUNT(*), SUM(IsRead = 0), UTC_TIMESTAMP()
+FROM notifications
+GROUP BY UserID;
+
 CREATE INDEX idx_user_email ON users(Email);
 CREATE INDEX idx_notifications_user ON notifications(UserID, IsRead);
 CREATE INDEX idx_expense_date ON expenses(Date);